@@ -0,0 +1,160 @@
+"""Interest accrual schedules.
+
+Each deposit's gross interest is spread evenly over the days of its term,
+exactly as ``calculate_interest_in_period`` prorates it, and stored as
+``DepositAccrual`` rows of one month (or one day). Row amounts are rounded
+on the running total, so a schedule always adds up to the deposit's gross
+interest. Interest for a period, interest earned to date and timelines are
+then range queries over the schedule rather than Python loops.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+from .models import DepositAccrual
+from .perf import timed
+
+
+ACCRUAL_PLACES = Decimal('0.000001')
+# Every running total is rounded to ACCRUAL_PLACES, so whole buckets of a
+# period sum to within one place of exact proration (half a place at each
+# end), and each of the at most two partially covered buckets adds less than
+# one more. A period's accrued interest is therefore within this of
+# ``gross * overlap / days``.
+ACCRUAL_ERROR = 3 * ACCRUAL_PLACES
+MONTH = 'month'
+DAY = 'day'
+
+
+def granularity():
+    return getattr(settings, 'DEPOSIT_ACCRUAL_GRANULARITY', MONTH)
+
+
+def _buckets(start, end, step):
+    """``(bucket_start, bucket_end)`` pairs covering ``[start, end)``."""
+    cursor = start
+    while cursor < end:
+        if step == DAY:
+            following = cursor + timedelta(days=1)
+        elif cursor.month == 12:
+            following = date(cursor.year + 1, 1, 1)
+        else:
+            following = date(cursor.year, cursor.month + 1, 1)
+        following = min(following, end)
+        yield cursor, following
+        cursor = following
+
+
+def build_accruals(deposit, step=None):
+    """Unsaved schedule rows for one deposit."""
+    total_days = deposit.days
+    if total_days <= 0:
+        return []
+    gross = deposit.gross_interest_native()
+    rows = []
+    elapsed = 0
+    accrued = Decimal('0')
+    for bucket_start, bucket_end in _buckets(deposit.start_date, deposit.end_date, step or granularity()):
+        days = (bucket_end - bucket_start).days
+        elapsed += days
+        running = (gross * elapsed / total_days).quantize(ACCRUAL_PLACES)
+        rows.append(DepositAccrual(deposit=deposit, start=bucket_start, end=bucket_end, days=days, amount=running - accrued))
+        accrued = running
+    return rows
+
+
+def create_accruals(deposits, batch_size=2000):
+    """Write schedules for saved deposits that do not have one yet."""
+    step = granularity()
+    rows = [row for deposit in deposits for row in build_accruals(deposit, step)]
+    return len(DepositAccrual.objects.bulk_create(rows, batch_size=batch_size))
+
+
+@timed()
+def regenerate_accruals(deposits, batch_size=2000):
+    """Replace the schedules of ``deposits`` (a list of saved deposits)."""
+    deposits = list(deposits)
+    with transaction.atomic():
+        DepositAccrual.objects.filter(deposit__in=[deposit.pk for deposit in deposits]).delete()
+        return create_accruals(deposits, batch_size)
+
+
+def rebuild_accruals(deposits, chunk_size=500):
+    """Regenerate schedules for a queryset of deposits, a chunk at a time.
+    Returns the number of deposits processed."""
+    processed = 0
+    chunk = []
+    for deposit in deposits.iterator(chunk_size=chunk_size):
+        chunk.append(deposit)
+        if len(chunk) >= chunk_size:
+            regenerate_accruals(chunk)
+            processed += len(chunk)
+            chunk = []
+    if chunk:
+        regenerate_accruals(chunk)
+        processed += len(chunk)
+    return processed
+
+
+def _overlap(row_start, row_end, period_start, period_end):
+    return max(0, (min(row_end, period_end) - max(row_start, period_start)).days)
+
+
+def accrued_in_period(deposit, period_start, period_end):
+    """Unrounded interest accrued by ``deposit`` on the days
+    ``period_start <= day < period_end``, or None if it has no schedule."""
+    return accrued_in_periods([deposit], period_start, period_end).get(deposit.pk)
+
+
+def accrued_in_periods(deposits, period_start, period_end):
+    """``accrued_in_period`` for many deposits in one query, keyed by deposit
+    pk. Deposits without schedule rows in the period are left out."""
+    rows = DepositAccrual.objects.filter(
+        deposit__in=deposits, start__lt=period_end, end__gt=period_start,
+    ).values_list('deposit_id', 'start', 'end', 'days', 'amount')
+    totals = {}
+    for deposit_id, start, end, days, amount in rows:
+        overlap = _overlap(start, end, period_start, period_end)
+        share = amount if overlap == days else amount * overlap / days
+        totals[deposit_id] = totals.get(deposit_id, 0) + share
+    return totals
+
+
+def interest_to_date(deposits, on=None):
+    """Interest earned before ``on`` (default today) per currency, for a
+    deposit queryset. Whole buckets are summed in the database; only the
+    bucket containing ``on`` is prorated."""
+    on = on or date.today()
+    accruals = DepositAccrual.objects.filter(deposit__in=deposits)
+    totals = defaultdict(lambda: Decimal('0'))
+    whole = accruals.filter(end__lte=on).values('deposit__currency').annotate(total=Sum('amount')).order_by()
+    for row in whole:
+        # SQLite sums decimals as floats
+        totals[row['deposit__currency']] += Decimal(row['total']).quantize(ACCRUAL_PLACES)
+    partial = accruals.filter(start__lt=on, end__gt=on).values_list('deposit__currency', 'start', 'days', 'amount')
+    for currency, start, days, amount in partial:
+        totals[currency] += amount * (on - start).days / days
+    return {currency: total.quantize(Decimal('0.01')) for currency, total in totals.items()}
+
+
+def accrual_timeline(deposits, start, end):
+    """Interest accrued per calendar month and currency between ``start``
+    and ``end``, as ``[{'month': date, 'AUD': Decimal, ...}, ...]``."""
+    rows = (
+        DepositAccrual.objects
+        .filter(deposit__in=deposits, start__gte=start, start__lt=end)
+        .annotate(month=TruncMonth('start'))
+        .values('month', 'deposit__currency')
+        .annotate(total=Sum('amount'))
+        .order_by('month')
+    )
+    timeline = {}
+    for row in rows:
+        month = timeline.setdefault(row['month'], {'month': row['month']})
+        month[row['deposit__currency']] = Decimal(row['total']).quantize(Decimal('0.01'))
+    return list(timeline.values())
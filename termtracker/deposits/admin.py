@@ -1,14 +1,165 @@
-from django.contrib import admin
-from .models import Deposit, Pension, TaxProfile  # <-- include Pension if you want to manage it too
+from datetime import timedelta
+from decimal import Decimal
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .models import Deposit, DepositAccrual, FxRate, Job, Pension, TaxProfile  # <-- include Pension if you want to manage it too
+from .pagination import CachedCountPaginator
+
+
+class BulkChangeForm(ActionForm):
+    """Values for the bulk actions, entered next to the action menu.
+
+    Taken as text and validated by the action against ``VALUES``: if the
+    action form itself is invalid the admin only says "No action selected".
+    """
+    annual_rate = forms.CharField(label="Rate %:", required=False, widget=forms.TextInput(attrs={'size': 6}))
+    aud_to_gbp = forms.CharField(
+        label="1 AUD in GBP (blank: FX table):", required=False, widget=forms.TextInput(attrs={'size': 10}),
+    )
+
+    VALUES = {
+        'annual_rate': forms.DecimalField(min_value=0, max_digits=5, decimal_places=2),
+        'aud_to_gbp': forms.DecimalField(min_value=Decimal('0.000001'), max_digits=12, decimal_places=6),
+    }
+
+
+class MaturityFilter(admin.SimpleListFilter):
+    title = 'maturity'
+    parameter_name = 'maturity'
+    WINDOWS = {'30': 30, '90': 90, '365': 365}
+
+    def lookups(self, request, model_admin):
+        choices = [('matured', 'Matured'), ('30', 'Within 30 days'), ('90', 'Within 90 days'),
+                   ('365', 'Within a year'), ('later', 'Later')]
+        if model_admin.model._meta.get_field('end_date').null:
+            choices.append(('open', 'Open-ended'))
+        return choices
+
+    def queryset(self, request, queryset):
+        today = timezone.localdate()
+        value = self.value()
+        if value == 'matured':
+            return queryset.filter(end_date__lt=today)
+        if value in self.WINDOWS:
+            return queryset.filter(end_date__gte=today, end_date__lte=today + timedelta(days=self.WINDOWS[value]))
+        if value == 'later':
+            return queryset.filter(end_date__gt=today + timedelta(days=365))
+        if value == 'open':
+            return queryset.filter(end_date__isnull=True)
+        return queryset
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with millions of rows: users joined in
+    the page query, no exact total on every page, users picked by search
+    instead of a full <select>, and ordering served by the maturity indexes."""
+    list_select_related = ('user',)
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    autocomplete_fields = ('user',)
+    ordering = ('end_date', 'id')
+    action_form = BulkChangeForm
+
+    def _posted(self, request, field):
+        """The cleaned value of a bulk action field, or None (with an error
+        message) when it is missing or invalid."""
+        try:
+            return self.action_form.VALUES[field].clean(request.POST.get(field, '').strip())
+        except ValidationError as error:
+            label = self.action_form.base_fields[field].label.split(' (')[0].rstrip(':')
+            self.message_user(request, f"{label}: {' '.join(error.messages)}", messages.ERROR)
+            return None
+
 
 @admin.register(Deposit)
-class DepositAdmin(admin.ModelAdmin):
+class DepositAdmin(LargeTableAdmin):
     list_display = ('name', 'user', 'principal', 'currency', 'start_date', 'end_date', 'annual_rate')
+    list_filter = ('currency', 'compounding', MaturityFilter)
+    actions = ('set_annual_rate', 'revalue_fx')
+
+    def _bulk_update(self, queryset, accruals_changed, **values):
+        """Apply ``values`` with one UPDATE, clear the cached interest and
+        queue the background rebuild (``update()`` skips ``Deposit.save()``)."""
+        if accruals_changed:
+            # Accruals are in the deposit's own currency, so only rate changes
+            # invalidate them; periods fall back to prorating until rebuilt
+            DepositAccrual.objects.filter(deposit__in=queryset.values('pk')).delete()
+        updated = queryset.update(
+            **values, **dict.fromkeys(Deposit.INTEREST_CACHE_FIELDS), updated_at=timezone.now(),
+        )
+        from .jobs import enqueue
+
+        enqueue('rebuild_interest_cache', unique=True, stale=True)
+        if accruals_changed:
+            enqueue('rebuild_accruals', unique=True, missing=True)
+        return updated
+
+    @admin.action(description="Set annual rate of selected deposits")
+    def set_annual_rate(self, request, queryset):
+        rate = self._posted(request, 'annual_rate')
+        if rate is None:
+            return
+        updated = self._bulk_update(queryset, True, annual_rate=rate)
+        self.message_user(request, f"Set the rate of {updated} deposit(s) to {rate}%; interest is being recalculated.")
+
+    @admin.action(description="Revalue FX of selected deposits")
+    def revalue_fx(self, request, queryset):
+        if request.POST.get('aud_to_gbp', '').strip():
+            aud_to_gbp = self._posted(request, 'aud_to_gbp')
+            if aud_to_gbp is None:
+                return
+            gbp_to_aud = (1 / aud_to_gbp).quantize(Decimal('0.000001'))
+        else:
+            from .fx import get_rates
+            from .interest import FX_SCALE
+
+            rates = get_rates()
+            (aud_to_gbp,), (found,) = rates.factors(Deposit.AUD, Deposit.GBP)
+            (gbp_to_aud,), _ = rates.factors(Deposit.GBP, Deposit.AUD)
+            if not found:
+                self.message_user(request, "The FX table has no AUD/GBP rate; enter one.", messages.ERROR)
+                return
+            aud_to_gbp, gbp_to_aud = (
+                (Decimal(int(factor)) / FX_SCALE).quantize(Decimal('0.000001')) for factor in (aud_to_gbp, gbp_to_aud)
+            )
+        updated = self._bulk_update(queryset, False, fx_aud_to_gbp=aud_to_gbp, fx_gbp_to_aud=gbp_to_aud)
+        self.message_user(
+            request, f"Revalued {updated} deposit(s) at 1 AUD = {aud_to_gbp} GBP; interest is being recalculated.",
+        )
+
 
 @admin.register(Pension)
-class PensionAdmin(admin.ModelAdmin):
+class PensionAdmin(LargeTableAdmin):
     list_display = ('name', 'user', 'monthly_amount', 'currency', 'start_date', 'end_date')
+    list_filter = ('currency', MaturityFilter)
+    actions = ('set_annual_rate',)
+
+    @admin.action(description="Set annual rate of selected pensions")
+    def set_annual_rate(self, request, queryset):
+        rate = self._posted(request, 'annual_rate')
+        if rate is None:
+            return
+        updated = queryset.update(annual_rate=rate, updated_at=timezone.now())
+        self.message_user(request, f"Set the rate of {updated} pension(s) to {rate}%.")
+
 
 @admin.register(TaxProfile)
 class TaxProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'country', 'marginal_rate')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+
+@admin.register(FxRate)
+class FxRateAdmin(admin.ModelAdmin):
+    list_display = ('base', 'quote', 'date', 'rate', 'updated_at')
+    list_filter = ('base', 'quote')
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'attempts', 'max_attempts', 'run_after', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
@@ -0,0 +1,170 @@
+"""Read-only JSON API.
+
+Every endpoint sends a strong ETag built from the latest ``updated_at`` and
+row count of the data it depends on (plus the user's tax profile settings,
+and the valuation date of views that depend on today's date).
+``condition`` compares it with ``If-None-Match`` and answers 304 before the
+view body, and therefore any interest maths, runs.
+"""
+import functools
+import hashlib
+from datetime import date, timedelta
+
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from . import fx
+from .accruals import accrual_timeline, interest_to_date
+from .exports import deposit_records, pension_record
+from .models import Deposit, Pension, SnapshotState
+from .pagination import keyset_paginate
+from .profiles import get_tax_profiles
+from .snapshots import snapshot_series
+from .utils import TAX_YEARS, calculate_tax_obligations, summarize_deposits
+
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+HISTORY_POINTS = 366
+HISTORY_MAX_POINTS = 5000
+
+
+def api_login_required(view):
+    """Like ``login_required`` but answers 401 JSON instead of redirecting."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'detail': 'Authentication required.'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _table_state(model, user):
+    state = model.objects.filter(user=user).aggregate(count=Count('pk'), latest=Max('updated_at'))
+    return f"{model.__name__}:{state['count']}:{state['latest'].isoformat() if state['latest'] else ''}"
+
+
+def _profiles_state(user):
+    return 'TaxProfile:' + ';'.join(
+        f"{profile.country},{profile.marginal_rate},{profile.tax_threshold}" for profile in get_tax_profiles(user)
+    )
+
+
+def _etag(*models, extra=None):
+    """ETag function over the given models' state for the requesting user
+    and the version of the exchange rate table. ``extra(request)`` returns
+    further parts, such as the dates a response is valued at."""
+    def etag_func(request, *args, **kwargs):
+        parts = [request.get_full_path()]
+        parts += [_table_state(model, request.user) for model in models]
+        parts.append(_profiles_state(request.user))
+        parts.append('FxRate:' + fx.rates_version())
+        if extra is not None:
+            parts += extra(request)
+        return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+    return etag_func
+
+
+def _valuation_date(request):
+    # For views that convert or accrue as of today
+    return [date.today().isoformat()]
+
+
+def _page_size(request):
+    try:
+        return max(1, min(int(request.GET.get('limit', API_PAGE_SIZE)), API_MAX_PAGE_SIZE))
+    except ValueError:
+        return API_PAGE_SIZE
+
+
+@require_GET
+@api_login_required
+@condition(etag_func=_etag(Deposit, extra=_valuation_date))
+def deposits(request):
+    """Deposits with computed interest and estimated tax, one keyset page at a time."""
+    profile_au, profile_uk = get_tax_profiles(request.user)
+    page = keyset_paginate(Deposit.objects.filter(user=request.user), request.GET.get('after'), _page_size(request))
+    return JsonResponse({
+        'results': list(deposit_records(page.object_list, profile_au, profile_uk, fx.get_rates())),
+        'next': page.next_cursor,
+    })
+
+
+@require_GET
+@api_login_required
+@condition(etag_func=_etag(Pension))
+def pensions(request):
+    """Pensions with annual amounts and estimated tax, one keyset page at a time."""
+    profile_au, profile_uk = get_tax_profiles(request.user)
+    page = keyset_paginate(Pension.objects.filter(user=request.user), request.GET.get('after'), _page_size(request))
+    return JsonResponse({
+        'results': [pension_record(pension, profile_au, profile_uk) for pension in page],
+        'next': page.next_cursor,
+    })
+
+
+@require_GET
+@api_login_required
+@condition(etag_func=_etag(Deposit, extra=_valuation_date))
+def dashboard(request):
+    """The dashboard summary totals."""
+    profile_au, profile_uk = get_tax_profiles(request.user)
+    deposits = Deposit.objects.filter(user=request.user)
+    return JsonResponse(summarize_deposits(deposits, profile_au, profile_uk, fx.get_rates()))
+
+
+@require_GET
+@api_login_required
+@condition(etag_func=_etag(Deposit, Pension))
+def tax_obligations(request, year):
+    """UK and Australian tax obligations for one tax year."""
+    if year not in TAX_YEARS:
+        return JsonResponse({'detail': f'Tax year must be between {TAX_YEARS[0]} and {TAX_YEARS[-1]}.'}, status=404)
+    profile_au, profile_uk = get_tax_profiles(request.user)
+    deposits = Deposit.objects.filter(user=request.user)
+    return JsonResponse({'year': year, **calculate_tax_obligations(deposits, year, profile_au, profile_uk)})
+
+
+def _date_param(request, name, default):
+    try:
+        return date.fromisoformat(request.GET[name])
+    except (KeyError, ValueError):
+        return default
+
+
+@require_GET
+@api_login_required
+@condition(etag_func=_etag(Deposit, extra=_valuation_date))
+def accruals(request):
+    """Interest earned to date and monthly accrued interest per currency
+    between ``from`` and ``to`` (default: a year either side of today)."""
+    today = date.today()
+    start = _date_param(request, 'from', today - timedelta(days=365))
+    end = _date_param(request, 'to', today + timedelta(days=365))
+    deposits = Deposit.objects.filter(user=request.user)
+    return JsonResponse({
+        'to_date': interest_to_date(deposits, today),
+        'timeline': accrual_timeline(deposits, start, end),
+    })
+
+
+def _history_window(request):
+    end = _date_param(request, 'to', date.today())
+    return _date_param(request, 'from', end - timedelta(days=365)), end
+
+
+@require_GET
+@api_login_required
+@condition(etag_func=_etag(SnapshotState, extra=lambda request: [d.isoformat() for d in _history_window(request)]))
+def portfolio_history(request):
+    """Daily principal and accrued interest per currency between ``from`` and
+    ``to`` (default: the last year), from the stored snapshots. Windows with
+    more than ``points`` days return every ``step``-th day."""
+    start, end = _history_window(request)
+    try:
+        points = max(1, min(int(request.GET.get('points', HISTORY_POINTS)), HISTORY_MAX_POINTS))
+    except ValueError:
+        points = HISTORY_POINTS
+    rows, step = snapshot_series(request.user, start, end, points)
+    return JsonResponse({'from': start, 'to': end, 'step': step, 'series': rows})
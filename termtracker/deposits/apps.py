@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DepositsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'deposits'
+
+    def ready(self):
+        from . import profiles  # noqa: F401  (connects the TaxProfile cache signals)
@@ -0,0 +1,159 @@
+"""Async versions of the dashboard, tax obligations and list pages.
+
+Used instead of the views in ``views.py`` when ``ASYNC_VIEWS`` is on and
+the site is served by an ASGI server. Independent queries run at the same
+time on a pool of threads that each hold a database connection, and the
+interest maths runs on a second small pool so it never blocks the event
+loop. They render the same templates with the same context as the sync
+views.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db import connections
+from django.shortcuts import render
+from django.utils import timezone
+
+from . import fx
+from .forms import DepositFilterForm, MaturityFilterForm
+from .interest import LazyBatch
+from .models import Deposit, Pension
+from .pagination import keyset_paginate
+from .profiles import get_tax_profiles
+from .utils import calculate_tax_obligations_for_years, deposits_in_tax_years, summarize_deposits
+from .views import DASHBOARD_CARD_CACHE_SECONDS, DASHBOARD_PAGE_SIZE, LIST_PAGE_SIZE, _next_page_query, _selected_year
+
+
+_pools = {}
+
+
+def _pool(name, setting, default):
+    if name not in _pools:
+        _pools[name] = ThreadPoolExecutor(
+            max_workers=getattr(settings, setting, default), thread_name_prefix=f'deposits-{name}',
+        )
+    return _pools[name]
+
+
+async def _run(pool, func, *args, **kwargs):
+    """Run ``func`` on ``pool``, keeping the request's context (performance
+    record) so queries and ``@timed`` functions are still counted."""
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(pool, call)
+
+
+def _keep_connections(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # Each pool thread keeps its connection between requests, as with
+        # CONN_MAX_AGE=None; only a broken one is dropped
+        for connection in connections.all(initialized_only=True):
+            if connection.errors_occurred:
+                connection.close_if_unusable_or_obsolete()
+
+
+def _db(func):
+    """``func`` as a coroutine function run on the database pool, so that
+    several queries can be awaited together."""
+    async def call(*args, **kwargs):
+        pool = _pool('db', 'ASYNC_DB_WORKERS', 8)
+        return await _run(pool, _keep_connections, func, *args, **kwargs)
+    return call
+
+
+async def _compute(func, *args):
+    """Run CPU-bound ``func`` on the compute pool."""
+    return await _run(_pool('compute', 'ASYNC_COMPUTE_WORKERS', 4), func, *args)
+
+
+@login_required
+async def dashboard(request):
+    """Async ``views.dashboard``."""
+    user = await request.auser()
+    deposits = Deposit.objects.filter(user=user)
+
+    (profile_au, profile_uk), rates = await asyncio.gather(_db(get_tax_profiles)(user), _db(fx.get_rates)())
+
+    # The summary's count sizes the paginator, so no separate COUNT query
+    summary = await _db(summarize_deposits)(deposits, profile_au, profile_uk, rates)
+    paginator = Paginator(deposits.order_by('end_date', 'pk'), DASHBOARD_PAGE_SIZE)
+    paginator.count = summary['total_deposits']
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page_deposits = await _db(list)(page_obj.object_list)
+    page_obj.object_list = page_deposits
+
+    # Rendering computes the page's interest only if a card misses the cache
+    return await sync_to_async(render)(request, 'dashboard.html', {
+        'deposits': page_deposits,
+        'page_obj': page_obj,
+        'interest': LazyBatch(page_deposits, (profile_au, profile_uk), rates=rates),
+        'profile_au': profile_au,
+        'profile_uk': profile_uk,
+        'card_cache_seconds': DASHBOARD_CARD_CACHE_SECONDS,
+        'rates_key': f"{rates.version}@{date.today().isoformat()}",
+        **summary,
+    })
+
+
+@login_required
+async def tax_obligations(request):
+    """Async ``views.tax_obligations``."""
+    user = await request.auser()
+    current_year = timezone.now().year
+    available_years = list(range(current_year - 2, current_year + 3))  # prev 2 + current + next 2
+    selected_year = _selected_year(request, current_year)
+    years = available_years + [selected_year]
+
+    deposits = deposits_in_tax_years(Deposit.objects.filter(user=user), years)
+    (profile_au, profile_uk), deposits, pensions = await asyncio.gather(
+        _db(get_tax_profiles)(user),
+        _db(list)(deposits),
+        _db(list)(Pension.objects.filter(user=user)),
+    )
+
+    obligations_by_year = await _compute(
+        calculate_tax_obligations_for_years, deposits, years, profile_au, profile_uk, pensions,
+    )
+    return await sync_to_async(render)(request, 'tax_obligations.html', {
+        'tax_data': obligations_by_year[selected_year],
+        'year_comparison': [(year, obligations_by_year[year]) for year in available_years],
+        'pensions': pensions,
+        'available_years': available_years,
+        'selected_year': selected_year,
+        'profile_au': profile_au,
+        'profile_uk': profile_uk,
+    })
+
+
+async def _list_page(request, model, form_class, template, name):
+    user = await request.auser()
+    filter_form = form_class(request.GET)
+    queryset = filter_form.filter(model.objects.filter(user=user))
+    page = await _db(keyset_paginate)(queryset, request.GET.get('after'), LIST_PAGE_SIZE)
+    return await sync_to_async(render)(request, template, {
+        name: page,
+        'page': page,
+        'filter_form': filter_form,
+        'next_query': _next_page_query(request, page),
+    })
+
+
+@login_required
+async def deposit_list(request):
+    """Async ``views.deposit_list``."""
+    return await _list_page(request, Deposit, DepositFilterForm, 'deposits/deposit_list.html', 'deposits')
+
+
+@login_required
+async def pension_list(request):
+    """Async ``views.pension_list``."""
+    return await _list_page(request, Pension, MaturityFilterForm, 'pensions/pension_list.html', 'pensions')
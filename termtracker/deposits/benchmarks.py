@@ -0,0 +1,393 @@
+"""Latency and query-count benchmarks for the deposits app.
+
+Each benchmark is run a number of times against one user's data; the
+results are plain dicts so they can be written out as JSON and compared
+between commits.
+"""
+import asyncio
+import contextlib
+import math
+import random
+import tempfile
+import threading
+import time
+import types
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, close_old_connections, connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, include, path, reverse
+
+from . import compounding
+from .db import atomic_write
+from .models import Deposit
+from .profiles import get_tax_profiles
+from .utils import calculate_tax_obligations
+
+
+# Budgets a run must stay within: p95 wall time in milliseconds and the
+# number of SQL queries issued by one call.
+DEFAULT_BUDGETS = {
+    'dashboard': {'p95_ms': 500, 'queries': 10},
+    'tax_obligations': {'p95_ms': 500, 'queries': 10},
+    'deposit_list': {'p95_ms': 1000, 'queries': 10},
+    'calculate_tax_obligations': {'p95_ms': 250, 'queries': 3},
+}
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def measure(func, repeat=5, warmup=1):
+    """Time ``func`` and count the queries it issues."""
+    for _ in range(warmup):
+        func()
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = len(captured)
+    return {
+        'runs': repeat,
+        'min_ms': round(min(timings), 3),
+        'p50_ms': round(_percentile(timings, 50), 3),
+        'p95_ms': round(_percentile(timings, 95), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': queries,
+    }
+
+
+def _view(client, url_name, query=''):
+    url = reverse(url_name) + query
+
+    def request():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+    return request
+
+
+def run_benchmarks(user, repeat=5, warmup=1, year=None):
+    """Run every benchmark for ``user`` and return the results by name."""
+    year = year or date.today().year
+    client = Client()
+    client.force_login(user)
+    profile_au, profile_uk = get_tax_profiles(user)
+
+    def tax_calculation():
+        calculate_tax_obligations(Deposit.objects.filter(user=user), year, profile_au, profile_uk)
+
+    benchmarks = {
+        'dashboard': _view(client, 'dashboard'),
+        'tax_obligations': _view(client, 'tax_obligations', f'?year={year}'),
+        'deposit_list': _view(client, 'deposit_list'),
+    }
+    results = {}
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        for name, func in benchmarks.items():
+            results[name] = measure(func, repeat, warmup)
+    results['calculate_tax_obligations'] = measure(tax_calculation, repeat, warmup)
+    return results
+
+
+CONCURRENT_VIEWS = ('dashboard', 'tax_obligations', 'deposit_list', 'pension_list')
+
+
+def _swapped_urlconf(page_views):
+    """A root URLconf serving the pages in ``CONCURRENT_VIEWS`` from the
+    ``page_views`` module and everything else as configured."""
+    from . import urls as deposit_urls
+
+    deposit_patterns = [
+        path(str(pattern.pattern), getattr(page_views, pattern.name), name=pattern.name)
+        if pattern.name in CONCURRENT_VIEWS else pattern
+        for pattern in deposit_urls.urlpatterns
+    ]
+    urlpatterns = []
+    for pattern in import_module(settings.ROOT_URLCONF).urlpatterns:
+        if isinstance(pattern, URLResolver) and pattern.urlconf_module is deposit_urls:
+            pattern = path(str(pattern.pattern), include(deposit_patterns))
+        urlpatterns.append(pattern)
+    module = types.ModuleType(f'{page_views.__name__}_urls')
+    module.urlpatterns = urlpatterns
+    return module
+
+
+async def _load(user_clients, urls, total):
+    """Issue ``total`` GETs spread over the clients, one request in flight
+    per client; returns (wall seconds, per-request milliseconds)."""
+    queue = asyncio.Queue()
+    for index in range(total):
+        queue.put_nowait(urls[index % len(urls)])
+    timings = []
+
+    async def worker(client):
+        while not queue.empty():
+            url = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {url} returned {response.status_code}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(client) for client in user_clients))
+    return time.perf_counter() - started, timings
+
+
+@contextlib.contextmanager
+def _db_latency(ms):
+    """Add ``ms`` of round-trip time to every query, as a database on
+    another host would. SQLite on local disk has none, which hides the
+    waits the async views overlap."""
+    if not ms:
+        yield
+        return
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(ms / 1000)
+        return execute(sql, params, many, context)
+
+    def install(sender=None, connection=None, **kwargs):
+        connection.execute_wrappers.append(delay)
+
+    for existing in connections.all(initialized_only=True):
+        install(connection=existing)
+    connection_created.connect(install)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(install)
+        for existing in connections.all(initialized_only=True):
+            if delay in existing.execute_wrappers:
+                existing.execute_wrappers.remove(delay)
+
+
+def run_concurrency_benchmark(user, concurrency=16, total=200, views=CONCURRENT_VIEWS, db_latency_ms=0):
+    """Serve ``views`` through Django's ASGI handler to ``concurrency``
+    simultaneous clients, once with the sync views and once with
+    ``deposits.async_views``, and report throughput and latency of each."""
+    from . import async_views, views as sync_views
+
+    year = date.today().year
+    results = {}
+    for mode, page_views in (('sync', sync_views), ('async', async_views)):
+        with override_settings(ALLOWED_HOSTS=['testserver'], ROOT_URLCONF=_swapped_urlconf(page_views)), \
+                _db_latency(db_latency_ms):
+            urls = [reverse(name) + (f'?year={year}' if name == 'tax_obligations' else '') for name in views]
+            clients = []
+            for _ in range(concurrency):
+                client = AsyncClient()
+                client.force_login(user)
+                clients.append(client)
+            asyncio.run(_load(clients, urls, len(urls)))  # warm up caches and connections
+            wall, timings = asyncio.run(_load(clients, urls, total))
+        results[mode] = {
+            'requests': total,
+            'concurrency': concurrency,
+            'requests_per_s': round(total / wall, 2),
+            'p50_ms': round(_percentile(timings, 50), 3),
+            'p95_ms': round(_percentile(timings, 95), 3),
+            'max_ms': round(max(timings), 3),
+        }
+    results['speedup'] = round(results['async']['requests_per_s'] / results['sync']['requests_per_s'], 2)
+    return results
+
+
+@contextlib.contextmanager
+def _scratch_database(config):
+    """Point the default connection at a new, migrated SQLite file with the
+    given settings for the duration of the block."""
+    original = connections.settings[DEFAULT_DB_ALIAS]
+    with tempfile.TemporaryDirectory() as directory:
+        config = {**config, 'NAME': Path(directory) / 'bench.sqlite3'}
+        connections.settings[DEFAULT_DB_ALIAS] = connections.configure_settings({DEFAULT_DB_ALIAS: config})[DEFAULT_DB_ALIAS]
+        connections[DEFAULT_DB_ALIAS].close()
+        del connections[DEFAULT_DB_ALIAS]
+        try:
+            call_command('migrate', verbosity=0)
+            yield
+        finally:
+            connections[DEFAULT_DB_ALIAS].close()
+            del connections[DEFAULT_DB_ALIAS]
+            connections.settings[DEFAULT_DB_ALIAS] = original
+
+
+def _write_mix(user, writer, number):
+    """One user action: create a deposit, then edit it, each its own
+    transaction like the create and edit views."""
+    deposit = Deposit(
+        user=user, name=f"Bench {number}", principal=Decimal('10000.00'), annual_rate=Decimal('4.50'),
+        start_date=date(2025, 1, 1), end_date=date(2026, 1, 1) + timedelta(days=number % 365),
+        compounding=Deposit.MONTHLY, currency=Deposit.AUD,
+    )
+    writer(deposit.save)
+    deposit.annual_rate = Decimal('4.75')
+    writer(deposit.save)
+
+
+def _plain_atomic(func):
+    with transaction.atomic():
+        return func()
+
+
+def run_write_benchmark(writers=8, actions=50, readers=2):
+    """Create and edit deposits from ``writers`` threads (``actions`` each)
+    while ``readers`` threads list deposits, against a scratch database
+    with Django's default SQLite settings and again with the configured
+    ones. Returns writes per second, latency and failures per mode."""
+    modes = {
+        'default': ({'ENGINE': 'django.db.backends.sqlite3'}, _plain_atomic),
+        'tuned': (settings.DATABASES[DEFAULT_DB_ALIAS], atomic_write),
+    }
+    results = {}
+    for mode, (config, writer) in modes.items():
+        with _scratch_database(config):
+            user = get_user_model().objects.create(username='bench')
+            close_old_connections()
+            results[mode] = _hammer(user, writer, writers, actions, readers)
+    results['speedup'] = (
+        round(results['tuned']['writes_per_s'] / results['default']['writes_per_s'], 2)
+        if results['default']['writes_per_s'] else None
+    )
+    return results
+
+
+def _hammer(user, writer, writers, actions, readers):
+    timings = []
+    failures = []
+    done = threading.Event()
+
+    def write(index):
+        try:
+            for number in range(actions):
+                started = time.perf_counter()
+                try:
+                    _write_mix(user, writer, index * actions + number)
+                except OperationalError as error:
+                    failures.append(str(error))
+                else:
+                    timings.append((time.perf_counter() - started) * 1000 / 2)
+                finally:
+                    # End of "request": the connection is closed unless
+                    # CONN_MAX_AGE keeps it
+                    close_old_connections()
+        finally:
+            connections.close_all()
+
+    def read():
+        try:
+            while not done.is_set():
+                list(Deposit.objects.filter(user=user).order_by('-pk')[:50])
+                close_old_connections()
+        finally:
+            connections.close_all()
+
+    reader_threads = [threading.Thread(target=read) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=write, args=(index,)) for index in range(writers)]
+    for thread in reader_threads:
+        thread.start()
+    started = time.perf_counter()
+    for thread in writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    done.set()
+    for thread in reader_threads:
+        thread.join()
+    return {
+        'writes': len(timings) * 2,
+        'failed_actions': len(failures),
+        'errors': sorted(set(failures)),
+        'writes_per_s': round(len(timings) * 2 / wall, 1),
+        'p50_ms': round(_percentile(timings, 50), 3) if timings else None,
+        'p95_ms': round(_percentile(timings, 95), 3) if timings else None,
+    }
+
+
+def _decimal_power_interest(principal, annual_rate, periods, days):
+    """The plain ``Decimal`` formula the compounding kernel replaces."""
+    r = annual_rate / Decimal('100')
+    n = Decimal(periods)
+    t = Decimal(days) / Decimal('365')
+    return (principal * (1 + r / n) ** (n * t) - principal).quantize(Decimal('0.01'))
+
+
+def run_compounding_benchmark(count=5000, seed=1, rates=40, repeat=3):
+    """Time compound interest on ``count`` random deposits with the plain
+    ``Decimal`` power and with ``compounding.compound_interest``, with its
+    factor cache cold and warm, and count results that differ."""
+    rng = random.Random(seed)
+    rate_pool = [Decimal(rng.randint(50, 650)) / 100 for _ in range(rates)]
+    cases = [
+        (Decimal(rng.randint(100000, 25000000)) / 100, rng.choice(rate_pool), rng.choice([1, 12]),
+         rng.choice([90, 180, 365, 730, 1095, 1825]) + rng.randint(-5, 5))
+        for _ in range(count)
+    ]
+
+    def run(func, clear=False):
+        timings = []
+        for _ in range(repeat):
+            if clear:
+                compounding.growth_factor.cache_clear()
+                compounding._log_base.cache_clear()
+            started = time.perf_counter()
+            results = [func(*case) for case in cases]
+            timings.append((time.perf_counter() - started) * 1e6 / count)
+        return results, round(min(timings), 3)
+
+    expected, decimal_us = run(_decimal_power_interest)
+    cold, cold_us = run(compounding.compound_interest, clear=True)
+    warm, warm_us = run(compounding.compound_interest)
+    return {
+        'deposits': count,
+        'decimal_power_us': decimal_us,
+        'kernel_cold_us': cold_us,
+        'kernel_warm_us': warm_us,
+        'speedup_cold': round(decimal_us / cold_us, 2),
+        'speedup_warm': round(decimal_us / warm_us, 2),
+        'mismatches': sum(a != b for a, b in zip(expected, cold)) + sum(a != b for a, b in zip(expected, warm)),
+    }
+
+
+def check_budgets(results, budgets):
+    """List the budget violations in ``results``."""
+    failures = []
+    for name, budget in budgets.items():
+        result = results.get(name)
+        if result is None:
+            continue
+        for metric, limit in budget.items():
+            if result[metric] > limit:
+                failures.append(f"{name}: {metric} {result[metric]} exceeds budget {limit}")
+    return failures
+
+
+def compare(results, baseline, max_regression):
+    """List benchmarks whose p50 or query count regressed against a baseline
+    run by more than ``max_regression`` percent."""
+    failures = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'queries'):
+            before, after = previous[metric], result[metric]
+            if before and (after - before) / before * 100 > max_regression:
+                failures.append(f"{name}: {metric} regressed from {before} to {after}")
+    return failures
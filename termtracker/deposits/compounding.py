@@ -0,0 +1,62 @@
+"""Compound growth factors without fractional ``Decimal`` powers.
+
+A deposit compounding ``n`` times a year for ``days`` days grows by
+``(1 + r/n) ** (n * days / 365)``. The exponent is split into whole
+periods ``q`` and a remainder ``k / 365``:
+
+* ``(1 + r/n) ** q`` is computed exactly as a ratio of integers
+  (Python's ``pow`` squares its way there);
+* ``(1 + r/n) ** (k / 365)`` is ``exp(k / 365 * ln(1 + r/n))``, with the
+  logarithm cached per (rate, n).
+
+Both parts are carried to ``PRECISION`` significant digits, well past the
+28 the plain ``Decimal`` power works to, so amounts round to the same cent.
+Finished factors are kept in an LRU cache keyed by (rate, n, days), since
+a portfolio repeats the same few rates and terms.
+"""
+from decimal import Decimal, localcontext
+from functools import lru_cache
+
+
+PRECISION = 50
+DAYS_PER_YEAR = 365
+FACTOR_CACHE_SIZE = 65536
+
+
+def _base(annual_rate, periods):
+    """``1 + annual_rate / 100 / periods`` as an integer ratio."""
+    numerator, denominator = Decimal(annual_rate).as_integer_ratio()
+    denominator *= 100 * periods
+    return denominator + numerator, denominator
+
+
+@lru_cache(maxsize=1024)
+def _log_base(annual_rate, periods):
+    numerator, denominator = _base(annual_rate, periods)
+    with localcontext(prec=PRECISION):
+        return (Decimal(numerator) / Decimal(denominator)).ln()
+
+
+@lru_cache(maxsize=FACTOR_CACHE_SIZE)
+def growth_factor(annual_rate, periods, days):
+    """``(1 + annual_rate/100/periods) ** (periods * days / 365)`` to
+    ``PRECISION`` digits. ``annual_rate`` is a percentage."""
+    whole, remainder = divmod(periods * days, DAYS_PER_YEAR)
+    numerator, denominator = _base(annual_rate, periods)
+    with localcontext(prec=PRECISION):
+        if whole >= 0:
+            factor = Decimal(numerator ** whole) / Decimal(denominator ** whole)
+        else:
+            factor = Decimal(denominator ** -whole) / Decimal(numerator ** -whole)
+        if remainder:
+            factor *= (_log_base(annual_rate, periods) * remainder / DAYS_PER_YEAR).exp()
+        return factor
+
+
+def compound_interest(principal, annual_rate, periods, days, places=Decimal('0.01')):
+    """Interest on ``principal`` compounding ``periods`` times a year over
+    ``days`` days, rounded half-even to ``places``."""
+    factor = growth_factor(annual_rate or Decimal('0'), periods, days)
+    with localcontext(prec=PRECISION):
+        interest = principal * factor - principal
+    return interest.quantize(places)
@@ -0,0 +1,51 @@
+"""Write transactions that survive SQLite lock contention.
+
+SQLite allows one writer at a time. With ``transaction_mode`` IMMEDIATE
+(see ``DATABASES`` in settings) a transaction takes the write lock when it
+begins, waiting up to the busy timeout. If the lock is still held after
+that, it fails with "database is locked" before any work is done, so it
+is safe to retry the whole transaction after a short back-off.
+"""
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, transaction
+
+from .perf import timed
+
+
+BUSY_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def is_busy_error(error):
+    return isinstance(error, OperationalError) and any(text in str(error).lower() for text in BUSY_MESSAGES)
+
+
+@timed()
+def atomic_write(func, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Call ``func`` in ``transaction.atomic()``, retrying it when the
+    database is locked. Inside an enclosing transaction there is nothing
+    to retry on its own, so ``func`` is just called."""
+    if transaction.get_connection(using).in_atomic_block:
+        return func(*args, **kwargs)
+    attempts = getattr(settings, 'DB_BUSY_RETRIES', 5)
+    delay = getattr(settings, 'DB_BUSY_RETRY_DELAY', 0.05)
+    for attempt in range(attempts + 1):
+        try:
+            with transaction.atomic(using=using):
+                return func(*args, **kwargs)
+        except OperationalError as error:
+            if attempt == attempts or not is_busy_error(error):
+                raise
+        # Jittered exponential back-off so waiting writers do not retry in step
+        time.sleep(delay * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def retry_on_busy(func):
+    """Decorator form of ``atomic_write``."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return atomic_write(func, *args, **kwargs)
+    return wrapper
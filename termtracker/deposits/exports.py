@@ -0,0 +1,123 @@
+"""Streaming CSV and newline-delimited JSON exports.
+
+Rows are generated from ``queryset.iterator()`` a chunk at a time and
+serialised as they are produced, so an export never holds the whole
+portfolio in memory or in the ORM result cache.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .interest import InterestBatch
+from .models import Deposit
+from .utils import calculate_tax_obligations_for_years
+
+
+DEPOSIT_FIELDS = [
+    'id', 'name', 'currency', 'principal', 'annual_rate', 'compounding', 'start_date', 'end_date',
+    'interest_native', 'interest_aud', 'interest_gbp', 'estimated_tax_au', 'estimated_tax_uk',
+]
+PENSION_FIELDS = [
+    'id', 'name', 'currency', 'monthly_amount', 'tax_paid', 'start_date', 'end_date',
+    'annual_amount', 'annual_tax_paid', 'estimated_tax',
+]
+TAX_FIELDS = [
+    'year', 'country', 'tax_year_start', 'tax_year_end', 'total_interest', 'total_pension',
+    'total_tax_paid', 'total_income', 'threshold', 'taxable_income', 'tax_owed',
+]
+
+
+def _chunks(queryset, chunk_size):
+    chunk = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def deposit_records(deposits, profile_au, profile_uk, rates=None):
+    """Deposits with their computed interest, conversions and estimated tax."""
+    batch = InterestBatch(deposits, rates=rates)
+    columns = zip(
+        batch.gross_interest_native(),
+        batch.interest_in(Deposit.AUD),
+        batch.interest_in(Deposit.GBP),
+        batch.estimated_tax(profile_au),
+        batch.estimated_tax(profile_uk),
+    )
+    for deposit, (native, aud, gbp, tax_au, tax_uk) in zip(batch.deposits, columns):
+        yield {
+            'id': deposit.pk,
+            'name': deposit.name,
+            'currency': deposit.currency,
+            'principal': deposit.principal,
+            'annual_rate': deposit.annual_rate,
+            'compounding': deposit.compounding,
+            'start_date': deposit.start_date,
+            'end_date': deposit.end_date,
+            'interest_native': native,
+            'interest_aud': aud,
+            'interest_gbp': gbp,
+            'estimated_tax_au': tax_au,
+            'estimated_tax_uk': tax_uk,
+        }
+
+
+def pension_record(pension, profile_au, profile_uk):
+    """A pension with its annual amounts and estimated tax."""
+    profile = profile_au if pension.currency == Deposit.AUD else profile_uk
+    return {
+        'id': pension.pk,
+        'name': pension.name,
+        'currency': pension.currency,
+        'monthly_amount': pension.monthly_amount,
+        'tax_paid': pension.tax_paid,
+        'start_date': pension.start_date,
+        'end_date': pension.end_date,
+        'annual_amount': pension.annual_amount(),
+        'annual_tax_paid': pension.annual_tax_paid(),
+        'estimated_tax': pension.estimated_tax(profile),
+    }
+
+
+def deposit_rows(deposits, profile_au, profile_uk, rates=None, chunk_size=2000):
+    """Stream ``deposit_records`` over a queryset, one chunk at a time."""
+    for chunk in _chunks(deposits.order_by('pk'), chunk_size):
+        yield from deposit_records(chunk, profile_au, profile_uk, rates)
+
+
+def pension_rows(pensions, profile_au, profile_uk, chunk_size=2000):
+    """Stream ``pension_record`` over a queryset."""
+    for pension in pensions.order_by('pk').iterator(chunk_size=chunk_size):
+        yield pension_record(pension, profile_au, profile_uk)
+
+
+def tax_rows(deposits, years, profile_au, profile_uk):
+    """One row per year and country of ``calculate_tax_obligations`` output."""
+    obligations = calculate_tax_obligations_for_years(deposits, years, profile_au, profile_uk)
+    for year, data in obligations.items():
+        for country in ('uk', 'au'):
+            yield {'year': year, 'country': country, **data[country]}
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(fieldnames, rows):
+    writer = csv.DictWriter(_Echo(), fieldnames=fieldnames)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
@@ -1,8 +1,11 @@
 # deposits/forms.py
+from decimal import Decimal
+
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import Deposit, Pension
+from .utils import TAX_YEARS
 
 
 class BootstrapFormMixin:
@@ -50,3 +53,121 @@ class PensionForm(BootstrapFormMixin, forms.ModelForm):
             "currency",
             "notes",
         ]
+
+
+class ImportForm(BootstrapFormMixin, forms.Form):
+    KIND_CHOICES = [
+        ("deposits", "Deposits"),
+        ("pensions", "Pensions"),
+    ]
+
+    kind = forms.ChoiceField(choices=KIND_CHOICES)
+    file = forms.FileField(help_text="CSV with a header row naming the form fields.")
+    dry_run = forms.BooleanField(required=False, help_text="Validate only, without saving.")
+
+
+class MaturityFilterForm(BootstrapFormMixin, forms.Form):
+    """Server-side filters for the paginated deposit and pension lists."""
+    currency = forms.ChoiceField(choices=[("", "All currencies")] + Deposit.CURRENCY_CHOICES, required=False)
+    matures_from = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+    matures_to = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+
+    def filter(self, queryset):
+        if not self.is_valid():
+            return queryset
+        data = self.cleaned_data
+        if data["currency"]:
+            queryset = queryset.filter(currency=data["currency"])
+        if data["matures_from"]:
+            queryset = queryset.filter(end_date__gte=data["matures_from"])
+        if data["matures_to"]:
+            queryset = queryset.filter(end_date__lte=data["matures_to"])
+        return queryset
+
+
+class DepositFilterForm(MaturityFilterForm):
+    compounding = forms.ChoiceField(choices=[("", "Any compounding")] + Deposit.COMPOUNDING_CHOICES, required=False)
+
+    def filter(self, queryset):
+        queryset = super().filter(queryset)
+        if self.is_valid() and self.cleaned_data["compounding"]:
+            queryset = queryset.filter(compounding=self.cleaned_data["compounding"])
+        return queryset
+
+
+class ProjectionForm(BootstrapFormMixin, forms.Form):
+    """Settings for the Monte Carlo projection page."""
+    years = forms.IntegerField(min_value=1, max_value=10, initial=5)
+    paths = forms.IntegerField(min_value=100, max_value=20000, initial=10000)
+    seed = forms.IntegerField(required=False, min_value=0, help_text="Leave blank for a different run each time.")
+    rate_volatility = forms.DecimalField(min_value=0, max_value=10, decimal_places=2, initial=1, label="Rate volatility (% a year)")
+    fx_volatility = forms.DecimalField(min_value=0, max_value=50, decimal_places=2, initial=10, label="FX volatility (% a year)")
+
+
+class TaxYearRangeForm(forms.Form):
+    """Tax years of the tax export, read from its ``from`` and ``to`` query parameters."""
+    MAX_YEARS = 50
+
+    from_year = forms.IntegerField(min_value=TAX_YEARS[0], max_value=TAX_YEARS[-1])
+    to_year = forms.IntegerField(min_value=TAX_YEARS[0], max_value=TAX_YEARS[-1])
+
+    def clean(self):
+        cleaned_data = super().clean()
+        first, last = cleaned_data.get("from_year"), cleaned_data.get("to_year")
+        if first is not None and last is not None:
+            if last < first:
+                raise forms.ValidationError("'to' must not be before 'from'.")
+            if last - first >= self.MAX_YEARS:
+                raise forms.ValidationError(f"At most {self.MAX_YEARS} tax years can be exported at once.")
+        return cleaned_data
+
+    def years(self):
+        return range(self.cleaned_data["from_year"], self.cleaned_data["to_year"] + 1)
+
+
+LADDER_OFFERS = """3, 4.10, MONTHLY
+6, 4.60, ANNUAL
+9, 4.50, ANNUAL
+12, 5.00, ANNUAL, 0, 60000
+24, 4.80, MONTHLY, 20000
+36, 4.70, SIMPLE"""
+
+
+class LadderForm(BootstrapFormMixin, forms.Form):
+    """Inputs of the term-deposit ladder optimizer."""
+    amount = forms.DecimalField(min_value=1, max_digits=12, decimal_places=2, initial=200000)
+    currency = forms.ChoiceField(choices=Deposit.CURRENCY_CHOICES, initial=Deposit.AUD)
+    min_per_quarter = forms.DecimalField(min_value=0, max_digits=12, decimal_places=2, initial=25000,
+                                         label="Minimum maturing each quarter")
+    quarters = forms.IntegerField(min_value=0, max_value=40, initial=4, label="For the first (quarters)")
+    offers = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 6}), initial=LADDER_OFFERS,
+        help_text="One offer per line: term in months, rate %, compounding (SIMPLE, MONTHLY or ANNUAL), "
+                  "and optionally the minimum and maximum amount.",
+    )
+
+    def clean_offers(self):
+        from .ladder import Offer
+
+        offers = []
+        compoundings = {value for value, _ in Deposit.COMPOUNDING_CHOICES}
+        for number, line in enumerate(self.cleaned_data['offers'].splitlines(), start=1):
+            fields = [field.strip() for field in line.split(',')]
+            if not any(fields):
+                continue
+            try:
+                term, rate, compounding, *limits = fields
+                compounding = compounding.upper()
+                if compounding not in compoundings or len(limits) > 2:
+                    raise ValueError
+                min_amount = Decimal(limits[0]) if limits and limits[0] else Decimal('0')
+                max_amount = Decimal(limits[1]) if len(limits) > 1 and limits[1] else None
+                offer = Offer(int(term), Decimal(rate), compounding, min_amount, max_amount)
+            except (ValueError, ArithmeticError):
+                raise forms.ValidationError(f"Line {number}: expected months, rate, compounding[, min[, max]].")
+            if offer.term_months < 1 or not 0 <= offer.annual_rate < 100:
+                raise forms.ValidationError(f"Line {number}: the term must be at least a month and the rate under 100%.")
+            offers.append(offer)
+        if not offers:
+            raise forms.ValidationError("Enter at least one offer.")
+        return offers
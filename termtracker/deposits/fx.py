@@ -0,0 +1,184 @@
+"""Exchange rates from the ``FxRate`` table.
+
+``get_rates()`` loads every rate series once and keeps it in memory until the
+table changes: each call costs a single count/max(updated_at) query, and the
+series are only reloaded when that version moves. ``FxRates`` looks rates up
+as of a date (the latest rate on or before it), inverts pairs that are only
+stored one way round, and crosses through a third currency when there is no
+direct quote, so any number of currencies can be converted into any other.
+
+Rates are handled as integers scaled by ``FX_SCALE`` so conversions round to
+cents exactly like ``Decimal.quantize``.
+"""
+import csv
+import threading
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.db.models import Count, Max
+
+from .interest import FX_SCALE, _divide_half_even
+from .models import FxRate
+
+
+_lock = threading.Lock()
+_cached = None          # (version, FxRates)
+
+
+def _ordinals(on, size):
+    if on is None:
+        on = date.today()
+    if isinstance(on, date):
+        return np.full(size, on.toordinal(), dtype=np.int64)
+    return np.array([d.toordinal() for d in on], dtype=np.int64)
+
+
+class FxRates:
+    """In-memory rate series keyed by ``(base, quote)``."""
+
+    def __init__(self, rows=(), version=''):
+        self.version = version
+        series = {}
+        for base, quote, on, rate in rows:
+            series.setdefault((base, quote), []).append((on.toordinal(), int(Decimal(rate) * FX_SCALE)))
+        self.series = {}
+        for pair, points in series.items():
+            points.sort()
+            self.series[pair] = (
+                np.array([p[0] for p in points], dtype=np.int64),
+                np.array([p[1] for p in points], dtype=np.int64),
+            )
+        self.currencies = sorted({c for pair in self.series for c in pair})
+
+    def __bool__(self):
+        return bool(self.series)
+
+    def _direct(self, base, quote, ordinals):
+        if (base, quote) in self.series:
+            dates, rates = self.series[(base, quote)]
+            index = np.searchsorted(dates, ordinals, side='right') - 1
+            found = index >= 0
+            return np.where(found, rates[np.maximum(index, 0)], 0), found
+        if (quote, base) in self.series:
+            factors, found = self._direct(quote, base, ordinals)
+            inverse = _divide_half_even(FX_SCALE * FX_SCALE, np.where(found, factors, 1))
+            return np.where(found, inverse, 0), found
+        return None
+
+    def factors(self, base, quote, on=None, size=1):
+        """Scaled rates converting ``base`` into ``quote`` as of ``on``.
+
+        ``on`` is a date or a sequence of dates. Returns the factors and a
+        mask of the entries that have a rate; the others are 0.
+        """
+        return self._factors(base, quote, _ordinals(on, size))
+
+    def _factors(self, base, quote, ordinals):
+        if base == quote:
+            return np.full(len(ordinals), FX_SCALE, dtype=np.int64), np.ones(len(ordinals), dtype=bool)
+        direct = self._direct(base, quote, ordinals)
+        if direct is not None:
+            return direct
+        factors = np.zeros(len(ordinals), dtype=np.int64)
+        found = np.zeros(len(ordinals), dtype=bool)
+        for pivot in self.currencies:
+            if pivot in (base, quote):
+                continue
+            first, second = self._direct(base, pivot, ordinals), self._direct(pivot, quote, ordinals)
+            if first is None or second is None:
+                continue
+            crossed = _divide_half_even(first[0].astype(object) * second[0], FX_SCALE).astype(np.int64)
+            fill = first[1] & second[1] & ~found
+            factors[fill] = crossed[fill]
+            found |= fill
+            if found.all():
+                break
+        return factors, found
+
+    def conversion_factors(self, currencies, target, on=None):
+        """Per-row factors converting rows in ``currencies`` into ``target``."""
+        currencies = np.asarray(currencies, dtype=object)
+        ordinals = _ordinals(on, len(currencies))
+        factors = np.zeros(len(currencies), dtype=np.int64)
+        found = np.zeros(len(currencies), dtype=bool)
+        for currency in set(currencies):
+            rows = currencies == currency
+            factors[rows], found[rows] = self._factors(currency, target, ordinals[rows])
+        return factors, found
+
+    def convert_cents(self, cents, currencies, target, on=None):
+        """Convert integer cent amounts, rounding half-even.
+
+        Returns the converted cents and the mask of rows that had a rate.
+        """
+        cents = np.asarray(cents, dtype=np.int64)
+        factors, found = self.conversion_factors(currencies, target, on)
+        converted = _divide_half_even(cents.astype(object) * factors, FX_SCALE).astype(np.int64)
+        return converted, found
+
+    def convert(self, amount, base, quote, on=None):
+        """Convert a single Decimal amount, or return None without a rate."""
+        factors, found = self.factors(base, quote, on)
+        if not found[0]:
+            return None
+        cents = int(Decimal(amount).scaleb(2).to_integral_value())
+        return Decimal(int(_divide_half_even(cents * int(factors[0]), FX_SCALE))).scaleb(-2)
+
+
+def rates_version():
+    """A cheap fingerprint of the rate table, changing whenever it does."""
+    state = FxRate.objects.aggregate(count=Count('pk'), latest=Max('updated_at'))
+    return f"{state['count']}:{state['latest'].isoformat() if state['latest'] else ''}"
+
+
+def load_rates(version=''):
+    rows = FxRate.objects.order_by('base', 'quote', 'date').values_list('base', 'quote', 'date', 'rate')
+    return FxRates(rows.iterator(), version)
+
+
+def get_rates():
+    """The current rates, reloaded only when the table has changed."""
+    global _cached
+    version = rates_version()
+    with _lock:
+        if _cached is None or _cached[0] != version:
+            _cached = (version, load_rates(version))
+        return _cached[1]
+
+
+def import_rates(stream, batch_size=1000):
+    """Load ``base,quote,date,rate`` rows from a CSV stream.
+
+    Existing rates for the same pair and date are overwritten. Returns the
+    number of rows written and a list of ``(line, message)`` for rejected rows.
+    """
+    written = 0
+    errors = []
+    batch = []
+    for line, row in enumerate(csv.DictReader(stream), start=2):
+        try:
+            base, quote = row['base'].strip().upper(), row['quote'].strip().upper()
+            rate = Decimal(row['rate'].strip())
+            if len(base) != 3 or len(quote) != 3 or base == quote or rate <= 0:
+                raise ValueError("expected two different 3-letter currencies and a positive rate")
+            batch.append(FxRate(base=base, quote=quote, date=date.fromisoformat(row['date'].strip()), rate=rate))
+        except (AttributeError, KeyError, ValueError, InvalidOperation) as exc:
+            errors.append((line, str(exc) or exc.__class__.__name__))
+            continue
+        if len(batch) >= batch_size:
+            written += _write_rates(batch)
+            batch = []
+    if batch:
+        written += _write_rates(batch)
+    return written, errors
+
+
+def _write_rates(batch):
+    FxRate.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['base', 'quote', 'date'],
+        update_fields=['rate', 'updated_at'],
+    )
+    return len(batch)
@@ -0,0 +1,94 @@
+"""Streaming CSV import of deposits and pensions.
+
+Rows are read one at a time, validated with the same model forms the web
+pages use, and written with ``bulk_create`` in fixed-size batches, so memory
+use does not depend on the size of the file.
+"""
+import csv
+
+from .accruals import create_accruals
+from .db import retry_on_busy
+from .forms import DepositForm, PensionForm
+from .interest import fill_interest_cache
+from .jobs import enqueue
+from .models import Deposit
+
+
+IMPORT_FORMS = {
+    'deposits': DepositForm,
+    'pensions': PensionForm,
+}
+
+
+class ImportResult:
+    """Outcome of an import: counts plus the errors of rejected rows."""
+
+    def __init__(self, kind, dry_run, max_errors):
+        self.kind = kind
+        self.dry_run = dry_run
+        self.max_errors = max_errors
+        self.rows = 0
+        self.valid = 0
+        self.created = 0
+        self.error_count = 0
+        self.job = None  # background job finishing the import, if any
+        self.errors = []  # (line number, {field: [messages]}), at most max_errors
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, errors))
+
+    @property
+    def errors_truncated(self):
+        return self.error_count > len(self.errors)
+
+
+def import_csv(stream, user, kind, dry_run=False, batch_size=500, max_errors=1000, defer_accruals=False):
+    """Import deposits or pensions for ``user`` from a CSV text stream.
+
+    The header row must name the form fields (e.g. ``name,principal,...``).
+    Invalid rows are skipped and reported; valid rows are inserted in
+    batches, each in its own transaction. With ``dry_run`` nothing is
+    written. With ``defer_accruals`` the accrual schedules of imported
+    deposits are left to a background job.
+    """
+    form_class = IMPORT_FORMS[kind]
+    result = ImportResult(kind, dry_run, max_errors)
+    reader = csv.DictReader(stream)
+    pending = []
+
+    for line, row in enumerate(reader, start=2):
+        result.rows += 1
+        form = form_class(data={key.strip(): value for key, value in row.items() if key})
+        if not form.is_valid():
+            result.add_error(line, {field: list(messages) for field, messages in form.errors.items()})
+            continue
+        result.valid += 1
+        if dry_run:
+            continue
+        instance = form.save(commit=False)
+        instance.user = user
+        pending.append(instance)
+        if len(pending) >= batch_size:
+            result.created += _write_batch(form_class._meta.model, pending, not defer_accruals)
+            pending = []
+
+    if pending:
+        result.created += _write_batch(form_class._meta.model, pending, not defer_accruals)
+    if defer_accruals and result.created and form_class._meta.model is Deposit:
+        result.job = enqueue('rebuild_accruals', unique=True, user_id=user.pk, missing=True)
+    return result
+
+
+@retry_on_busy
+def _write_batch(model, instances, accruals=True):
+    if model is Deposit:
+        # bulk_create skips Deposit.save(), so fill the interest cache
+        # and write the accrual schedules here
+        fill_interest_cache(instances)
+        created = Deposit.objects.bulk_create(instances)
+        if accruals:
+            create_accruals(created)
+        return len(created)
+    return len(model.objects.bulk_create(instances))
@@ -0,0 +1,274 @@
+"""Vectorized interest engine.
+
+``InterestBatch`` computes gross interest, currency conversions and estimated
+tax for a whole set of deposits in one NumPy pass. Every value is rounded to
+cents exactly like the scalar ``Deposit`` methods: conversions and tax are done
+in integer fixed-point arithmetic, and the few float results that land too
+close to a half-cent to be trusted are recomputed with ``Decimal``.
+"""
+from decimal import Decimal
+
+import numpy as np
+
+from .models import Deposit
+from .perf import timed
+
+
+CENT = Decimal('0.01')
+FX_SCALE = 10 ** 8      # exchange rates have up to 8 decimal places
+RATE_SCALE = 10 ** 2    # rate fields have 2 decimal places
+
+
+def _round_cents(values):
+    """Round float cent amounts half-to-even.
+
+    Returns the rounded integers and a mask of entries whose fractional part
+    is so close to .5 that float error could flip the rounding.
+    """
+    rounded = np.rint(values).astype(np.int64)
+    distance = np.abs(values - np.floor(values) - 0.5)
+    ambiguous = distance < (1e-6 + np.abs(values) * 1e-12)
+    return rounded, ambiguous
+
+
+def _divide_half_even(numerator, denominator):
+    """Integer division rounding half-to-even, matching ``Decimal.quantize``."""
+    quotient = numerator // denominator
+    remainder = numerator % denominator
+    twice = remainder * 2
+    round_up = (twice > denominator) | ((twice == denominator) & (quotient % 2 == 1))
+    return quotient + round_up
+
+
+def _fixed_point(values, scale):
+    """Convert Decimals to integers scaled by ``scale``."""
+    return np.array([int(Decimal(v or 0) * scale) for v in values], dtype=np.int64)
+
+
+def _multiply_scaled(cents, factors, scale):
+    """Compute ``cents * factors / scale`` rounded half-even, without overflow."""
+    if len(cents) and int(np.abs(cents).max()) * int(np.abs(factors).max()) >= 2 ** 62:
+        cents = cents.astype(object)
+        factors = factors.astype(object)
+    return _divide_half_even(cents * factors, scale).astype(np.int64)
+
+
+def _to_decimal(cents) -> Decimal:
+    return Decimal(int(cents)).scaleb(-2)
+
+
+class InterestBatch:
+    """Interest figures for a list of deposits, computed together.
+
+    With ``rates`` (an ``fx.FxRates``) conversions use the central rate
+    table as of ``on`` (default today); rows without a table rate keep
+    using their own ``fx_*`` fields.
+    """
+
+    @timed()
+    def __init__(self, deposits, use_cached=True, rates=None, on=None):
+        self.deposits = list(deposits)
+        self.use_cached = use_cached
+        self.rates = rates
+        self.on = on
+        rows = self.deposits
+        self.currency = np.array([d.currency for d in rows], dtype=object)
+        self.compounding = np.array([d.compounding for d in rows], dtype=object)
+        self.principal = np.array([float(d.principal) for d in rows], dtype=np.float64)
+        self.principal_cents = _fixed_point([d.principal for d in rows], 100)
+        self.rate = np.array([float(d.annual_rate or 0) for d in rows], dtype=np.float64) / 100
+        self.start = np.array([d.start_date.toordinal() for d in rows], dtype=np.int64)
+        self.end = np.array([d.end_date.toordinal() for d in rows], dtype=np.int64)
+        self.fx_aud_to_gbp = _fixed_point([d.fx_aud_to_gbp for d in rows], FX_SCALE)
+        self.fx_gbp_to_aud = _fixed_point([d.fx_gbp_to_aud for d in rows], FX_SCALE)
+        self.gross_cents = self._gross_cents()
+
+    def __len__(self):
+        return len(self.deposits)
+
+    def _gross_cents(self):
+        # Rows with a fresh cached value never redo the compounding maths
+        cached = [d._memo().get('native') if self.use_cached else None for d in self.deposits]
+        missing = np.array([value is None for value in cached], dtype=bool)
+        cents = np.array([int(value * 100) if value is not None else 0 for value in cached], dtype=np.int64)
+        if missing.any():
+            cents[missing] = self._compute_gross_cents(missing)
+        return cents
+
+    def _compute_gross_cents(self, rows):
+        years = (self.end[rows] - self.start[rows]) / 365.0
+        rate = self.rate[rows]
+        simple = self.compounding[rows] == Deposit.SIMPLE
+        periods = np.where(self.compounding[rows] == Deposit.MONTHLY, 12.0, 1.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            growth = np.expm1(periods * years * np.log1p(rate / periods))
+        gross = np.where(simple, rate * years, growth) * self.principal[rows] * 100
+        cents, ambiguous = _round_cents(gross)
+        indices = np.flatnonzero(rows)
+        for i in np.flatnonzero(ambiguous | ~np.isfinite(gross)):
+            cents[i] = int(self.deposits[indices[i]]._compute_gross_interest() * 100)
+        return cents
+
+    def _conversion_factors(self, target):
+        gbp_to_aud = (self.currency == Deposit.GBP) & (target == Deposit.AUD)
+        aud_to_gbp = (self.currency == Deposit.AUD) & (target == Deposit.GBP)
+        factors = np.full(len(self), FX_SCALE, dtype=np.int64)
+        factors[gbp_to_aud] = self.fx_gbp_to_aud[gbp_to_aud]
+        factors[aud_to_gbp] = self.fx_aud_to_gbp[aud_to_gbp]
+        if self.rates:
+            table, found = self.rates.conversion_factors(self.currency, target, self.on)
+            factors[found] = table[found]
+        return factors
+
+    def interest_in_cents(self, target):
+        return _multiply_scaled(self.gross_cents, self._conversion_factors(target), FX_SCALE)
+
+    def estimated_tax_cents(self, profile):
+        interest = self.interest_in_cents(Deposit.AUD if profile.country == 'AU' else Deposit.GBP)
+        rate = int(Decimal(profile.marginal_rate or 0) * RATE_SCALE)
+        return _multiply_scaled(interest, np.full(len(self), rate, dtype=np.int64), RATE_SCALE * 100)
+
+    def _prorate(self, rows, period_start, period_end):
+        """Interest of ``rows`` prorated into periods given as day ordinals,
+        as ``calculate_interest_in_period`` does for a single deposit."""
+        start, end = self.start[rows], self.end[rows]
+        overlap = np.minimum(end, period_end) - np.maximum(start, period_start)
+        total = end - start
+        active = (end >= period_start) & (start <= period_end) & (overlap > 0) & (total > 0)
+        gross = self.gross_cents[rows]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            prorated = np.where(active, gross * overlap / np.where(total > 0, total, 1), 0.0)
+        cents, ambiguous = _round_cents(prorated)
+        cents[~active] = 0
+        for i in np.flatnonzero(ambiguous & active):
+            share = Decimal(int(overlap[i])) / Decimal(int(total[i]))
+            cents[i] = int((share * _to_decimal(gross[i])).quantize(CENT) * 100)
+        return cents
+
+    def interest_in_period_cents(self, period_start, period_end):
+        """Interest prorated into a period, as ``calculate_interest_in_period``."""
+        rows = np.arange(len(self))
+        return self._prorate(rows, period_start.toordinal(), period_end.toordinal())
+
+    def interest_by_period(self, periods, currency):
+        """Total prorated interest of ``currency`` deposits in each period.
+
+        ``periods`` is a list of ``(start, end)`` dates in ascending,
+        non-overlapping order. Each deposit is located between the period
+        boundaries with a binary search, so only the (deposit, period) pairs
+        that actually overlap are evaluated.
+        """
+        starts = np.array([start.toordinal() for start, _ in periods], dtype=np.int64)
+        ends = np.array([end.toordinal() for _, end in periods], dtype=np.int64)
+        rows = np.flatnonzero(self.currency == currency)
+        first = np.searchsorted(ends, self.start[rows], side='left')
+        last = np.searchsorted(starts, self.end[rows], side='right') - 1
+        counts = np.maximum(last - first + 1, 0)
+
+        # Expand to one entry per overlapping (deposit, period) pair
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_periods = np.repeat(first, counts) + offsets
+        pair_rows = np.repeat(rows, counts)
+        cents = self._prorate(pair_rows, starts[pair_periods], ends[pair_periods])
+
+        totals = np.zeros(len(periods), dtype=np.int64)
+        np.add.at(totals, pair_periods, cents)
+        return [_to_decimal(total) for total in totals]
+
+    def gross_interest_native(self):
+        return [_to_decimal(c) for c in self.gross_cents]
+
+    def interest_in(self, target):
+        return [_to_decimal(c) for c in self.interest_in_cents(target)]
+
+    def estimated_tax(self, profile):
+        return [_to_decimal(c) for c in self.estimated_tax_cents(profile)]
+
+    def total_principal(self, currency) -> Decimal:
+        return _to_decimal(self.principal_cents[self.currency == currency].sum())
+
+    def total_interest_native(self) -> Decimal:
+        return _to_decimal(self.gross_cents.sum())
+
+    def total_interest_in(self, target) -> Decimal:
+        return _to_decimal(self.interest_in_cents(target).sum())
+
+    def total_estimated_tax(self, profile) -> Decimal:
+        return _to_decimal(self.estimated_tax_cents(profile).sum())
+
+    def total_interest_in_period(self, period_start, period_end, currency) -> Decimal:
+        cents = self.interest_in_period_cents(period_start, period_end)
+        return _to_decimal(cents[self.currency == currency].sum())
+
+    def prime(self, *profiles):
+        """Seed each deposit's memo with the batch results so the scalar
+        methods and template filters read them instead of recomputing.
+        Primed deposits also remember the batch's ``rates``."""
+        version = self.rates.version if self.rates else None
+        native = self.gross_interest_native()
+        converted = {target: self.interest_in(target) for target in (Deposit.AUD, Deposit.GBP)}
+        taxes = {('tax', p.country, p.marginal_rate, version): self.estimated_tax(p) for p in profiles}
+        for i, deposit in enumerate(self.deposits):
+            memo = deposit._memo()
+            memo['native'] = native[i]
+            memo['rates'] = self.rates
+            for target, values in converted.items():
+                memo[target, version] = values[i]
+            for key, values in taxes.items():
+                memo[key] = values[i]
+        return self
+
+
+class LazyBatch:
+    """An ``InterestBatch`` over ``deposits`` that is only built, and primed
+    for ``profiles``, the first time ``prime()`` is called. Pages whose
+    cards all come from the fragment cache never do the interest maths."""
+
+    def __init__(self, deposits, profiles=(), **options):
+        self.deposits = deposits
+        self.profiles = profiles
+        self.options = options
+        self.batch = None
+
+    def prime(self):
+        if self.batch is None:
+            self.batch = InterestBatch(self.deposits, **self.options).prime(*self.profiles)
+        return self.batch
+
+
+@timed()
+def refresh_interest_cache(deposits, batch_size=1000):
+    """Recompute and store the cached interest fields for ``deposits``.
+
+    Used after writes that bypass ``Deposit.save()`` (``update()``,
+    ``bulk_create()``) and to backfill existing rows. Returns the number of
+    rows updated.
+    """
+    if hasattr(deposits, 'iterator'):
+        deposits = deposits.iterator(chunk_size=batch_size)
+    updated = 0
+    chunk = []
+    for deposit in deposits:
+        chunk.append(deposit)
+        if len(chunk) >= batch_size:
+            updated += _store_interest(chunk)
+            chunk = []
+    if chunk:
+        updated += _store_interest(chunk)
+    return updated
+
+
+def fill_interest_cache(deposits):
+    """Set the cached interest fields on unsaved or about-to-be bulk-written
+    deposits without touching the database."""
+    batch = InterestBatch(deposits, use_cached=False)
+    columns = zip(batch.gross_interest_native(), batch.interest_in(Deposit.AUD), batch.interest_in(Deposit.GBP))
+    for deposit, (native, aud, gbp) in zip(batch.deposits, columns):
+        deposit.interest_native, deposit.interest_aud, deposit.interest_gbp = native, aud, gbp
+    return batch.deposits
+
+
+def _store_interest(chunk):
+    fill_interest_cache(chunk)
+    Deposit.objects.bulk_update(chunk, Deposit.INTEREST_CACHE_FIELDS)
+    return len(chunk)
@@ -0,0 +1,187 @@
+"""Background jobs stored in the project database.
+
+Work that is too slow for a request is recorded as a ``Job`` row with
+``enqueue`` and picked up by ``manage.py run_worker``. The worker claims
+due jobs with a conditional ``UPDATE`` (``SELECT ... FOR UPDATE SKIP
+LOCKED`` on databases that have it), so any number of workers can share
+one queue, and runs them on a process pool. A job that raises is retried
+with exponential back-off until it has used ``max_attempts``; the last
+error is kept on the row.
+
+Job functions are registered with ``@job('name')`` and take the payload
+as keyword arguments; their return value (anything JSON serialisable) is
+stored as the result.
+"""
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .db import atomic_write
+from .models import Deposit, Job
+
+
+JOBS = {}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def job(name):
+    """Register the decorated function as the job ``name``."""
+    def decorator(func):
+        JOBS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, unique=False, delay=0, **payload):
+    """Queue a job. With ``unique``, an identical job already waiting to run
+    is returned instead of adding another."""
+    if kind not in JOBS:
+        raise ValueError(f"Unknown job {kind!r}")
+    if unique:
+        waiting = Job.objects.filter(kind=kind, payload=payload, status=Job.QUEUED).first()
+        if waiting is not None:
+            return waiting
+    return Job.objects.create(
+        kind=kind,
+        payload=payload,
+        max_attempts=_setting('JOB_MAX_ATTEMPTS', 3),
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(worker, limit=1):
+    """Mark up to ``limit`` due jobs as running for ``worker`` and return them."""
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_after__lte=now).order_by('run_after', 'id')
+    claimed = {
+        'status': Job.RUNNING, 'worker': worker, 'started_at': now, 'finished_at': None,
+        'attempts': F('attempts') + 1,
+    }
+
+    def locked():
+        ids = list(due.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+        Job.objects.filter(id__in=ids).update(**claimed)
+        return ids
+
+    def conditional():
+        # No row locks (SQLite): whoever flips queued -> running owns the job
+        ids = []
+        for job_id in due.values_list('id', flat=True)[:limit * 2]:
+            if atomic_write(Job.objects.filter(id=job_id, status=Job.QUEUED).update, **claimed):
+                ids.append(job_id)
+                if len(ids) == limit:
+                    break
+        return ids
+
+    if connection.features.has_select_for_update_skip_locked:
+        ids = atomic_write(locked)
+    else:
+        ids = conditional()
+    return list(Job.objects.filter(id__in=ids).order_by('run_after', 'id'))
+
+
+def execute(job_id):
+    """Run one claimed job in a worker process and return its result."""
+    try:
+        claimed = Job.objects.get(pk=job_id)
+        return JOBS[claimed.kind](**claimed.payload)
+    finally:
+        close_old_connections()
+
+
+def finish(job_id, result=None, error=None):
+    """Record the outcome of a run: done, queued again for a retry, or failed."""
+    claimed = Job.objects.get(pk=job_id)
+    claimed.finished_at = timezone.now()
+    claimed.worker = ''
+    if error is None:
+        claimed.status, claimed.result, claimed.error = Job.DONE, result, ''
+    elif claimed.attempts < claimed.max_attempts:
+        delay = _setting('JOB_RETRY_DELAY', 30) * 2 ** (claimed.attempts - 1)
+        claimed.status, claimed.error = Job.QUEUED, error
+        claimed.run_after = claimed.finished_at + timedelta(seconds=delay)
+    else:
+        claimed.status, claimed.error = Job.FAILED, error
+    atomic_write(claimed.save)
+    return claimed
+
+
+def format_error(error):
+    return ''.join(traceback.format_exception(error)).strip()
+
+
+def requeue_stale(older_than=None):
+    """Put jobs back in the queue whose worker stopped while running them."""
+    older_than = older_than or _setting('JOB_STALE_SECONDS', 60 * 60)
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    return Job.objects.filter(status=Job.RUNNING, started_at__lt=cutoff).update(
+        status=Job.QUEUED, worker='', run_after=timezone.now(),
+    )
+
+
+def queue_stats():
+    """Job counts per kind, each a list in ``Job.STATUS_CHOICES`` order, and
+    the totals, for the status page."""
+    statuses = [status for status, _ in Job.STATUS_CHOICES]
+    totals = [0] * len(statuses)
+    by_kind = {}
+    rows = Job.objects.values('kind', 'status').annotate(count=Count('id')).order_by('kind')
+    for row in rows:
+        column = statuses.index(row['status'])
+        by_kind.setdefault(row['kind'], [0] * len(statuses))[column] = row['count']
+        totals[column] += row['count']
+    return {'totals': totals, 'by_kind': by_kind}
+
+
+def _deposits(user_id=None, deposit_ids=None, missing_accruals=False, stale_interest=False):
+    deposits = Deposit.objects.order_by('pk')
+    if user_id is not None:
+        deposits = deposits.filter(user_id=user_id)
+    if deposit_ids is not None:
+        deposits = deposits.filter(pk__in=deposit_ids)
+    if missing_accruals:
+        deposits = deposits.filter(accruals__isnull=True)
+    if stale_interest:
+        deposits = deposits.filter(interest_native__isnull=True)
+    return deposits
+
+
+@job('rebuild_interest_cache')
+def rebuild_interest_cache(user_id=None, deposit_ids=None, stale=False):
+    """Recompute the stored interest fields of a user's (or the given)
+    deposits; with ``stale``, only those whose cached values were cleared."""
+    from .interest import refresh_interest_cache
+
+    return {'deposits': refresh_interest_cache(_deposits(user_id, deposit_ids, stale_interest=stale))}
+
+
+@job('rebuild_accruals')
+def rebuild_accruals(user_id=None, deposit_ids=None, missing=False):
+    """Regenerate the accrual schedules of a user's (or the given) deposits."""
+    from .accruals import rebuild_accruals as rebuild
+
+    return {'deposits': rebuild(_deposits(user_id, deposit_ids, missing))}
+
+
+@job('take_snapshots')
+def take_snapshots(on=None, since=None):
+    """Bring every user's daily portfolio snapshots up to ``on`` (ISO date,
+    default today)."""
+    from datetime import date
+
+    from .snapshots import take_snapshots as snapshot
+
+    return snapshot(on and date.fromisoformat(on), since and date.fromisoformat(since))
@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from deposits.benchmarks import run_compounding_benchmark
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark the compounding kernel against the plain Decimal power and check they agree."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=5000, help="Random deposits to price.")
+        parser.add_argument('--rates', type=int, default=40, help="Distinct interest rates among them.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        results = run_compounding_benchmark(options['count'], options['seed'], options['rates'])
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(f"{results['deposits']} deposits, microseconds per deposit:")
+            self.stdout.write(f"  Decimal power   {results['decimal_power_us']:>9.2f}")
+            self.stdout.write(
+                f"  kernel (cold)   {results['kernel_cold_us']:>9.2f}  ({results['speedup_cold']}x)"
+            )
+            self.stdout.write(
+                f"  kernel (warm)   {results['kernel_warm_us']:>9.2f}  ({results['speedup_warm']}x)"
+            )
+        if results['mismatches']:
+            raise CommandError(f"{results['mismatches']} results differ from the Decimal power.")
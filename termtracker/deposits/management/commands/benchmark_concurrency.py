@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from deposits.benchmarks import CONCURRENT_VIEWS, run_concurrency_benchmark
+
+from .run_benchmarks import Command as RunBenchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput of the sync and async dashboard, tax obligations and list views "
+        "served through the ASGI handler to many concurrent clients."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help="User to benchmark (default: the user with most deposits).")
+        parser.add_argument('--concurrency', type=int, default=16, help="Simultaneous clients.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per mode.")
+        parser.add_argument('--views', default=','.join(CONCURRENT_VIEWS),
+                            help="Comma-separated URL names to request in turn.")
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help="Milliseconds added to every query to model a database on another host.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        user = RunBenchmarks()._user(options['username'])
+        views = [name.strip() for name in options['views'].split(',') if name.strip()]
+        results = run_concurrency_benchmark(
+            user, options['concurrency'], options['requests'], views, options['db_latency'],
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        header = f"{'mode':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"
+        self.stdout.write(f"{user.username}: {options['requests']} requests, {options['concurrency']} clients")
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for mode in ('sync', 'async'):
+            stats = results[mode]
+            self.stdout.write(
+                f"{mode:<8}{stats['requests_per_s']:>10.1f}{stats['p50_ms']:>10.1f}"
+                f"{stats['p95_ms']:>10.1f}{stats['max_ms']:>10.1f}"
+            )
+        self.stdout.write(f"async/sync throughput: {results['speedup']}x")
@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from deposits.benchmarks import run_write_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent write throughput on a scratch SQLite database with Django's default "
+        "settings and with the tuned settings (WAL, pragmas, persistent connections, retries)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help="Threads creating and editing deposits.")
+        parser.add_argument('--actions', type=int, default=50, help="Create-and-edit actions per writer.")
+        parser.add_argument('--readers', type=int, default=2, help="Threads listing deposits meanwhile.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        results = run_write_benchmark(options['writers'], options['actions'], options['readers'])
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        header = f"{'mode':<10}{'writes':>8}{'failed':>8}{'writes/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for mode in ('default', 'tuned'):
+            stats = results[mode]
+            self.stdout.write(
+                f"{mode:<10}{stats['writes']:>8}{stats['failed_actions']:>8}{stats['writes_per_s']:>10.1f}"
+                f"{stats['p50_ms'] or 0:>10.1f}{stats['p95_ms'] or 0:>10.1f}"
+            )
+            for error in stats['errors']:
+                self.stdout.write(f"    {mode}: {error}")
+        self.stdout.write(f"tuned/default writes per second: {results['speedup']}x")
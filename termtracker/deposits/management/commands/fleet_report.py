@@ -0,0 +1,73 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+
+def _init_process():
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = (
+        "Write one row per user with total principal, interest, tax-year income and estimated AU/UK tax, "
+        "computed in parallel over id-range shards of users."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Report file: .csv, or .npz for integer-cent columns.")
+        parser.add_argument('--format', choices=['csv', 'npz'], help="Default: from the output file's suffix.")
+        parser.add_argument('--year', type=int, help="Tax year to report (default: current year).")
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--shards', type=int, help="Id-range shards (default: 4 per process).")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched per query round trip.")
+
+    def handle(self, *args, **options):
+        # Imported here, not at module level: pool processes import this
+        # module for _init_process before Django is set up
+        from deposits.reports import AMOUNT_FIELDS, FORMATS, merge_parts, report_shard, shard_bounds
+
+        output = Path(options['output'])
+        fmt = options['format'] or output.suffix.lstrip('.').lower()
+        if fmt not in FORMATS:
+            raise CommandError(f"Unknown report format {fmt!r}; use --format csv or npz.")
+        year = options['year'] or timezone.now().year
+        processes = max(1, options['processes'])
+        bounds = shard_bounds(options['shards'] or processes * 4)
+        # Each pool process opens its own connection; do not hand ours over
+        connections.close_all()
+
+        started = time.perf_counter()
+        users = 0
+        totals = dict.fromkeys(AMOUNT_FIELDS, 0)
+        with tempfile.TemporaryDirectory() as directory:
+            parts = [Path(directory) / f'part-{index:05d}.{fmt}' for index in range(len(bounds))]
+            pool = ProcessPoolExecutor(
+                processes, mp_context=multiprocessing.get_context('spawn'), initializer=_init_process,
+            )
+            with pool:
+                futures = [
+                    pool.submit(report_shard, first, last, year, str(part), fmt, options['chunk_size'])
+                    for (first, last), part in zip(bounds, parts)
+                ]
+                for future in as_completed(futures):
+                    count, shard_totals = future.result()
+                    users += count
+                    for field, cents in shard_totals.items():
+                        totals[field] += cents
+            merge_parts(parts, output, fmt)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{users} users in {len(bounds)} shards on {processes} processes: {elapsed:.1f} s -> {output}"
+        )
+        for field, cents in totals.items():
+            self.stdout.write(f"  {field:<22}{Decimal(cents).scaleb(-2):>20,}")
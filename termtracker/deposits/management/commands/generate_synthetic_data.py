@@ -0,0 +1,107 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from deposits.accruals import create_accruals
+from deposits.interest import fill_interest_cache
+from deposits.models import Deposit, Pension, TaxProfile
+
+
+AU_RATES = [Decimal('19'), Decimal('32.5'), Decimal('37'), Decimal('45')]
+UK_RATES = [Decimal('20'), Decimal('40'), Decimal('45')]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate reproducible synthetic users, deposits, pensions and tax profiles "
+        "for load testing and benchmarks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--deposits-per-user', type=int, default=500)
+        parser.add_argument('--pensions-per-user', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default='synthetic', help="Username prefix for generated users.")
+        parser.add_argument('--password', default='synthetic', help="Password set on every generated user.")
+        parser.add_argument('--start-date', type=date.fromisoformat, default=date(2020, 1, 1),
+                            help="Earliest deposit start date (ISO format).")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        User = get_user_model()
+        password = make_password(options['password'])
+        batch_size = options['batch_size']
+        deposits_created = pensions_created = 0
+
+        for index in range(options['users']):
+            with transaction.atomic():
+                user = User.objects.create(
+                    username=f"{options['prefix']}_{options['seed']}_{index}",
+                    password=password,
+                )
+                # The user's default profiles already exist; give them random rates
+                TaxProfile.objects.bulk_create([
+                    TaxProfile(user=user, country=TaxProfile.AU, marginal_rate=rng.choice(AU_RATES),
+                               tax_threshold=Decimal('18500'), tax_threshold_currency='AUD'),
+                    TaxProfile(user=user, country=TaxProfile.GB, marginal_rate=rng.choice(UK_RATES),
+                               tax_threshold=Decimal('12900'), tax_threshold_currency='GBP'),
+                ], update_conflicts=True, unique_fields=['user', 'country'], update_fields=['marginal_rate'])
+
+                chunk = []
+                for number in range(options['deposits_per_user']):
+                    chunk.append(self._deposit(rng, user, number, options['start_date']))
+                    if len(chunk) >= batch_size:
+                        deposits_created += self._write_deposits(chunk)
+                        chunk = []
+                if chunk:
+                    deposits_created += self._write_deposits(chunk)
+
+                pensions = [self._pension(rng, user, number, options['start_date'])
+                            for number in range(options['pensions_per_user'])]
+                pensions_created += len(Pension.objects.bulk_create(pensions, batch_size=batch_size))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {options['users']} users, {deposits_created} deposits and {pensions_created} pensions."
+        ))
+
+    def _deposit(self, rng, user, number, earliest):
+        start = earliest + timedelta(days=rng.randint(0, 5 * 365))
+        currency = rng.choice([Deposit.AUD, Deposit.GBP])
+        return Deposit(
+            user=user,
+            name=f"Deposit {number + 1}",
+            principal=Decimal(rng.randint(1000, 250000)).quantize(Decimal('0.01')),
+            annual_rate=Decimal(rng.randint(50, 650)) / Decimal('100'),
+            start_date=start,
+            end_date=start + timedelta(days=rng.choice([90, 180, 365, 730, 1095, 1825])),
+            compounding=rng.choice([Deposit.SIMPLE, Deposit.MONTHLY, Deposit.ANNUAL]),
+            currency=currency,
+        )
+
+    def _pension(self, rng, user, number, earliest):
+        start = earliest + timedelta(days=rng.randint(0, 5 * 365))
+        monthly = Decimal(rng.randint(200, 4000))
+        return Pension(
+            user=user,
+            name=f"Pension {number + 1}",
+            monthly_amount=monthly,
+            tax_paid=(monthly * Decimal('0.15')).quantize(Decimal('0.01')),
+            start_date=start,
+            end_date=None if rng.random() < 0.7 else start + timedelta(days=rng.randint(365, 15 * 365)),
+            currency=rng.choice([Deposit.AUD, Deposit.GBP]),
+        )
+
+    def _write_deposits(self, chunk):
+        # bulk_create skips Deposit.save(), so the interest cache and
+        # accrual schedules are written here
+        fill_interest_cache(chunk)
+        created = Deposit.objects.bulk_create(chunk)
+        create_accruals(created)
+        return len(created)
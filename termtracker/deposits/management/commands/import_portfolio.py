@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from deposits.importers import IMPORT_FORMS, import_csv
+
+
+class Command(BaseCommand):
+    help = "Import deposits or pensions for a user from a CSV file, streaming it in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with a header row naming the form fields.")
+        parser.add_argument('--user', required=True, help="Username that will own the imported rows.")
+        parser.add_argument('--kind', choices=sorted(IMPORT_FORMS), default='deposits')
+        parser.add_argument('--dry-run', action='store_true', help="Validate every row without saving.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-errors', type=int, default=1000, help="Maximum number of row errors to list.")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']!r} does not exist.")
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+            result = import_csv(
+                stream, user, options['kind'],
+                dry_run=options['dry_run'],
+                batch_size=options['batch_size'],
+                max_errors=options['max_errors'],
+            )
+
+        for line, errors in result.errors:
+            for field, messages in errors.items():
+                self.stderr.write(f"line {line}: {field}: {' '.join(messages)}")
+        if result.errors_truncated:
+            self.stderr.write(f"... {result.error_count - len(result.errors)} more rejected rows not listed")
+
+        if result.dry_run:
+            summary = f"Dry run: {result.valid} of {result.rows} rows valid, {result.error_count} rejected."
+        else:
+            summary = f"Imported {result.created} of {result.rows} rows, {result.error_count} rejected."
+        self.stdout.write(self.style.SUCCESS(summary) if not result.error_count else self.style.WARNING(summary))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from deposits.fx import import_rates
+
+
+class Command(BaseCommand):
+    help = "Load exchange rates from a CSV file with base,quote,date,rate columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file; rate is the price of one unit of base in quote.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+            written, errors = import_rates(stream, batch_size=options['batch_size'])
+
+        for line, message in errors:
+            self.stderr.write(f"line {line}: {message}")
+        summary = f"Loaded {written} rates, {len(errors)} rejected."
+        self.stdout.write(self.style.SUCCESS(summary) if not errors else self.style.WARNING(summary))
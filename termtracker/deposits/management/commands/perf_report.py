@@ -0,0 +1,44 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from deposits.perf import read_records, summarize
+
+
+def _percent(rate):
+    return '-' if rate is None else f"{rate * 100:.1f}"
+
+
+class Command(BaseCommand):
+    help = "Print p50/p95/p99 latency per view from the recorded request metrics."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=float, help="Only include requests from the last N minutes.")
+        parser.add_argument('--json', action='store_true', help="Print the full summary as JSON.")
+        parser.add_argument('--functions', action='store_true', help="Also list timed hot functions per view.")
+
+    def handle(self, *args, **options):
+        since = time.time() - options['minutes'] * 60 if options['minutes'] else None
+        summary = summarize(read_records(since))
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        if not summary:
+            self.stdout.write("No request metrics recorded.")
+            return
+
+        header = f"{'view':<24}{'requests':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'db ms':>9}{'tmpl ms':>9}{'cache %':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for view, stats in summary.items():
+            self.stdout.write(
+                f"{view:<24}{stats['requests']:>9}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+                f"{stats['p99_ms']:>10.1f}{stats['avg_queries']:>9.1f}{stats['avg_db_ms']:>9.1f}"
+                f"{stats['avg_template_ms']:>9.1f}{_percent(stats['cache_hit_rate']):>9}"
+            )
+            if options['functions']:
+                for label, timing in stats['functions'].items():
+                    self.stdout.write(
+                        f"    {label}: {timing['calls_per_request']} calls, {timing['avg_ms']} ms/request"
+                    )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from deposits.accruals import rebuild_accruals
+from deposits.models import Deposit
+
+
+class Command(BaseCommand):
+    help = "Regenerate the interest accrual schedule of each deposit."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only rebuild deposits for this user id.")
+        parser.add_argument('--missing', action='store_true', help="Only build schedules for deposits without one.")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        deposits = Deposit.objects.order_by('pk')
+        if options['user']:
+            deposits = deposits.filter(user_id=options['user'])
+        if options['missing']:
+            deposits = deposits.filter(accruals__isnull=True)
+        processed = rebuild_accruals(deposits, chunk_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt accrual schedules for {processed} deposits."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from deposits.interest import refresh_interest_cache
+from deposits.models import Deposit
+
+
+class Command(BaseCommand):
+    help = "Recompute the cached interest values stored on each deposit."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only rebuild deposits for this user id.")
+        parser.add_argument('--missing', action='store_true', help="Only fill rows with no cached value.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deposits = Deposit.objects.order_by('pk')
+        if options['user']:
+            deposits = deposits.filter(user_id=options['user'])
+        if options['missing']:
+            deposits = deposits.filter(interest_native__isnull=True)
+        updated = refresh_interest_cache(deposits, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt interest cache for {updated} deposits."))
@@ -0,0 +1,74 @@
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+
+from deposits.benchmarks import DEFAULT_BUDGETS, check_budgets, compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the dashboard, tax obligations, deposit list and tax calculation for one user, "
+        "write the results as JSON and fail when a budget is exceeded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help="User to benchmark (default: the user with most deposits).")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--year', type=int, help="Tax year to calculate (default: current year).")
+        parser.add_argument('--output', default='-', help="File to write JSON results to ('-' for stdout).")
+        parser.add_argument('--budgets', help="JSON file overriding the default budgets.")
+        parser.add_argument('--baseline', help="JSON results from a previous run to compare against.")
+        parser.add_argument('--max-regression', type=float, default=20.0,
+                            help="Allowed regression against --baseline, in percent.")
+
+    def handle(self, *args, **options):
+        user = self._user(options['username'])
+        results = run_benchmarks(user, options['repeat'], options['warmup'], options['year'])
+
+        budgets = dict(DEFAULT_BUDGETS)
+        if options['budgets']:
+            with open(options['budgets']) as handle:
+                budgets.update(json.load(handle))
+        failures = check_budgets(results, budgets)
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)
+            failures += compare(results, baseline['results'], options['max_regression'])
+
+        report = {
+            'timestamp': timezone.now().isoformat(),
+            'user': user.username,
+            'deposits': user.deposit_set.count(),
+            'pensions': user.pension_set.count(),
+            'results': results,
+            'budgets': budgets,
+            'failures': failures,
+        }
+        payload = json.dumps(report, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(payload)
+        else:
+            with open(options['output'], 'w') as handle:
+                handle.write(payload + '\n')
+
+        if failures:
+            for failure in failures:
+                sys.stderr.write(failure + '\n')
+            raise CommandError(f"{len(failures)} benchmark budget(s) exceeded.")
+
+    def _user(self, username):
+        User = get_user_model()
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"User {username!r} does not exist.")
+        user = User.objects.annotate(deposit_count=Count('deposit')).order_by('-deposit_count').first()
+        if user is None:
+            raise CommandError("No users found; run generate_synthetic_data first.")
+        return user
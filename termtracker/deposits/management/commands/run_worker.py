@@ -0,0 +1,100 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _init_process():
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (interest cache and accrual rebuilds) on a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=getattr(settings, 'JOB_WORKER_PROCESSES', 2),
+                            help="Jobs run at the same time, each in its own process.")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds between checks of an idle queue.")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due.")
+        parser.add_argument('--max-jobs', type=int, help="Exit after this many jobs.")
+
+    def handle(self, *args, **options):
+        # Imported here, not at module level: pool processes import this
+        # module for _init_process before Django is set up
+        from deposits import jobs
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        worker = jobs.worker_name()
+        requeued = jobs.requeue_stale()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s).")
+        self.stdout.write(f"Worker {worker} running up to {options['processes']} job(s) at a time.")
+
+        pool = self._pool(options['processes'])
+        running = {}
+        processed = 0
+        try:
+            while True:
+                free = options['processes'] - len(running)
+                if options['max_jobs']:
+                    free = min(free, options['max_jobs'] - processed - len(running))
+                if not self.stopping and free > 0:
+                    for job in jobs.claim(worker, free):
+                        running[pool.submit(jobs.execute, job.pk)] = job
+                        self.stdout.write(f"Started {job} (attempt {job.attempts}/{job.max_attempts}).")
+
+                if not running:
+                    if self.stopping or options['once'] or free <= 0:
+                        break
+                    connections.close_all()
+                    time.sleep(options['poll'])
+                    continue
+
+                done, _ = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        outcome = jobs.finish(job.pk, result=future.result())
+                    except Exception as error:
+                        broken = broken or isinstance(error, BrokenProcessPool)
+                        outcome = jobs.finish(job.pk, error=jobs.format_error(error))
+                    processed += 1
+                    self._report(outcome)
+                if broken:
+                    # A process died (e.g. killed for memory); every job
+                    # still on the pool is lost with it, so start afresh
+                    pool.shutdown(cancel_futures=True)
+                    pool = self._pool(options['processes'])
+        finally:
+            pool.shutdown(wait=True)
+
+    def _pool(self, processes):
+        # Fresh interpreters rather than forks: no database connection or
+        # lock is inherited from this process
+        return ProcessPoolExecutor(
+            processes, mp_context=multiprocessing.get_context('spawn'), initializer=_init_process,
+        )
+
+    def _report(self, job):
+        if job.status == job.DONE:
+            self.stdout.write(self.style.SUCCESS(f"Finished {job}: {job.result}"))
+        elif job.status == job.QUEUED:
+            self.stdout.write(self.style.WARNING(f"{job} failed, retrying after {job.run_after:%H:%M:%S}."))
+        else:
+            self.stdout.write(self.style.ERROR(f"{job} failed after {job.attempts} attempts."))
+
+    def _stop(self, signum, frame):
+        if self.stopping:
+            raise KeyboardInterrupt
+        self.stopping = True
+        self.stdout.write("Stopping after the running jobs finish (signal again to abort).")
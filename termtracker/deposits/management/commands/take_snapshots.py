@@ -0,0 +1,30 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from deposits import jobs
+from deposits.snapshots import take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Write each user's daily portfolio snapshots up to today (run once a day, e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help="Snapshot up to this day instead of today.")
+        parser.add_argument('--since', type=date.fromisoformat,
+                            help="Backfill from this day for users whose history starts later.")
+        parser.add_argument('--queue', action='store_true', help="Queue a background job instead of running now.")
+
+    def handle(self, *args, **options):
+        on, since = options['date'], options['since']
+        if options['queue']:
+            job = jobs.enqueue(
+                'take_snapshots', unique=True, on=on and on.isoformat(), since=since and since.isoformat(),
+            )
+            self.stdout.write(f"Queued {job}.")
+            return
+        result = take_snapshots(on, since)
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshots: {result['new']} new, {result['extended']} extended and "
+            f"{result['recomputed']} recomputed users; {result['rows']} rows written."
+        ))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deposits', '0004_pension_tax_paid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deposit',
+            name='interest_aud',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='deposit',
+            name='interest_gbp',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='deposit',
+            name='interest_native',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=14, null=True),
+        ),
+    ]
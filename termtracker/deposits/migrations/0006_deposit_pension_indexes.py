@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deposits', '0005_deposit_interest_cache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['user', 'currency', 'start_date', 'end_date'], name='deposit_user_ccy_dates_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pension',
+            index=models.Index(fields=['user', 'currency'], name='pension_user_ccy_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deposits', '0006_deposit_pension_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pension',
+            name='pension_user_ccy_idx',
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['user', 'end_date', 'id'], name='deposit_user_maturity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['user', 'currency', 'end_date', 'id'], name='deposit_user_ccy_maturity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['user', 'compounding', 'end_date', 'id'], name='deposit_user_comp_maturity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pension',
+            index=models.Index(fields=['user', 'end_date', 'id'], name='pension_user_maturity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pension',
+            index=models.Index(fields=['user', 'currency', 'end_date', 'id'], name='pension_user_ccy_maturity_idx'),
+        ),
+    ]
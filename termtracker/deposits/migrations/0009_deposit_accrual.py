@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deposits', '0008_fxrate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepositAccrual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateField()),
+                ('end', models.DateField()),
+                ('days', models.PositiveIntegerField()),
+                ('amount', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('deposit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accruals', to='deposits.deposit')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['deposit', 'start'], name='accrual_deposit_start_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deposits', '0010_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['end_date', 'id'], name='deposit_maturity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['currency', 'end_date', 'id'], name='deposit_ccy_maturity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['compounding', 'end_date', 'id'], name='deposit_comp_maturity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pension',
+            index=models.Index(fields=['end_date', 'id'], name='pension_maturity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pension',
+            index=models.Index(fields=['currency', 'end_date', 'id'], name='pension_ccy_maturity_idx'),
+        ),
+    ]
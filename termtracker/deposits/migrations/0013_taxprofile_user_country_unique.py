@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def delete_duplicate_profiles(apps, schema_editor):
+    # The oldest profile per user and country is the one the app has been using
+    TaxProfile = apps.get_model('deposits', 'TaxProfile')
+    kept = TaxProfile.objects.values('user', 'country').annotate(first=Min('pk')).values('first')
+    TaxProfile.objects.exclude(pk__in=kept).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deposits', '0012_portfolio_snapshots'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_profiles, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='taxprofile',
+            constraint=models.UniqueConstraint(fields=('user', 'country'), name='taxprofile_user_country_unique'),
+        ),
+    ]
@@ -3,6 +3,17 @@ from django.db import models
 from decimal import Decimal
 from datetime import date
 from django.utils import timezone
+from .compounding import compound_interest
+from .perf import timed
+
+
+class DepositQuerySet(models.QuerySet):
+    def overlapping(self, period_start, period_end, currency=None):
+        """Deposits whose term overlaps the period, filtered in SQL."""
+        deposits = self.filter(end_date__gte=period_start, start_date__lte=period_end)
+        if currency is not None:
+            deposits = deposits.filter(currency=currency)
+        return deposits
 
 
 class Deposit(models.Model):
@@ -36,6 +47,33 @@ class Deposit(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Cached gross_interest_native() and its conversions at the deposit's own
+    # fx_* rates (the fallback when the FxRate table has no rate), refreshed on save
+    interest_native = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, editable=False)
+    interest_aud = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, editable=False)
+    interest_gbp = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, editable=False)
+
+    INTEREST_INPUT_FIELDS = (
+        'principal', 'annual_rate', 'start_date', 'end_date', 'compounding',
+        'currency', 'fx_aud_to_gbp', 'fx_gbp_to_aud',
+    )
+    INTEREST_CACHE_FIELDS = ('interest_native', 'interest_aud', 'interest_gbp')
+
+    objects = DepositQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'currency', 'start_date', 'end_date'], name='deposit_user_ccy_dates_idx'),
+            # Keyset pagination and list filters, ordered by (end_date, id)
+            models.Index(fields=['user', 'end_date', 'id'], name='deposit_user_maturity_idx'),
+            models.Index(fields=['user', 'currency', 'end_date', 'id'], name='deposit_user_ccy_maturity_idx'),
+            models.Index(fields=['user', 'compounding', 'end_date', 'id'], name='deposit_user_comp_maturity_idx'),
+            # Admin changelist filters across all users, same ordering
+            models.Index(fields=['end_date', 'id'], name='deposit_maturity_idx'),
+            models.Index(fields=['currency', 'end_date', 'id'], name='deposit_ccy_maturity_idx'),
+            models.Index(fields=['compounding', 'end_date', 'id'], name='deposit_comp_maturity_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.currency})"
 
@@ -49,21 +87,38 @@ class Deposit(models.Model):
     def _rate_decimal(self) -> Decimal:
         return (self.annual_rate or Decimal('0')) / Decimal('100')
 
-    def gross_interest_native(self) -> Decimal:
+    @timed()
+    def _compute_gross_interest(self) -> Decimal:
         P = self.principal
-        r = self._rate_decimal()
-        t = self._term_years()
 
         if self.compounding == self.SIMPLE:
+            r = self._rate_decimal()
+            t = self._term_years()
             return (P * r * t).quantize(Decimal('0.01'))
-        elif self.compounding == self.MONTHLY:
-            n = Decimal('12')
-            A = (P * (1 + r / n) ** (n * t))
-            return (A - P).quantize(Decimal('0.01'))
-        else:
-            n = Decimal('1')
-            A = (P * (1 + r / n) ** (n * t))
-            return (A - P).quantize(Decimal('0.01'))
+        # P * (1 + r/n) ** (n*t) - P, without a fractional Decimal power
+        n = 12 if self.compounding == self.MONTHLY else 1
+        return compound_interest(P, self.annual_rate, n, self.days)
+
+    def _interest_inputs(self) -> tuple:
+        return tuple(getattr(self, field) for field in self.INTEREST_INPUT_FIELDS)
+
+    def _memo(self) -> dict:
+        """Values derived from the interest inputs, kept for this instance's
+        lifetime (one request) and dropped as soon as any input changes."""
+        inputs = self._interest_inputs()
+        memo = self.__dict__.get('_interest_memo')
+        if memo is None or memo['inputs'] != inputs:
+            memo = {'inputs': inputs}
+            if self.interest_native is not None and inputs == self.__dict__.get('_loaded_inputs'):
+                memo['native'] = self.interest_native
+            self._interest_memo = memo
+        return memo
+
+    def gross_interest_native(self) -> Decimal:
+        memo = self._memo()
+        if 'native' not in memo:
+            memo['native'] = self._compute_gross_interest()
+        return memo['native']
 
     def principal_in(self, target: str) -> Decimal:
         if target == self.currency:
@@ -74,20 +129,92 @@ class Deposit(models.Model):
             return (self.principal * self.fx_aud_to_gbp).quantize(Decimal('0.01'))
         return self.principal
 
-    def interest_in(self, target: str) -> Decimal:
+    def _row_conversion(self, target: str) -> Decimal:
+        """Gross interest converted at this deposit's own ``fx_*`` rates."""
         gross = self.gross_interest_native()
-        if target == self.currency:
-            return gross
         if self.currency == self.GBP and target == self.AUD:
             return (gross * self.fx_gbp_to_aud).quantize(Decimal('0.01'))
         if self.currency == self.AUD and target == self.GBP:
             return (gross * self.fx_aud_to_gbp).quantize(Decimal('0.01'))
         return gross
 
-    def estimated_tax(self, profile: 'TaxProfile') -> Decimal:
-        interest = self.interest_in(self.AUD if profile.country == 'AU' else self.GBP)
-        rate = (profile.marginal_rate or Decimal('0')) / Decimal('100')
-        return (interest * rate).quantize(Decimal('0.01'))
+    def _rates_key(self, memo, rates):
+        # Deposits primed by an InterestBatch keep using the batch's rates
+        if rates is None:
+            rates = memo.get('rates')
+        return rates, (rates.version if rates else None)
+
+    def interest_in(self, target: str, rates=None) -> Decimal:
+        """Gross interest in ``target`` at the rate of ``rates`` (an
+        ``fx.FxRates``) as of today, or at the deposit's own rates when
+        there is no table rate for the pair."""
+        memo = self._memo()
+        rates, version = self._rates_key(memo, rates)
+        key = (target, version)
+        if key in memo:
+            return memo[key]
+        converted = None
+        if rates and target != self.currency:
+            converted = rates.convert(self.gross_interest_native(), self.currency, target)
+        if converted is None:
+            converted = self._row_conversion(target)
+        memo[key] = converted
+        return converted
+
+    def estimated_tax(self, profile: 'TaxProfile', rates=None) -> Decimal:
+        memo = self._memo()
+        rates, version = self._rates_key(memo, rates)
+        key = ('tax', profile.country, profile.marginal_rate, version)
+        if key not in memo:
+            interest = self.interest_in(self.AUD if profile.country == 'AU' else self.GBP, rates)
+            rate = (profile.marginal_rate or Decimal('0')) / Decimal('100')
+            memo[key] = (interest * rate).quantize(Decimal('0.01'))
+        return memo[key]
+
+    def refresh_interest_cache(self):
+        """Recompute the stored interest values from the current inputs."""
+        self.interest_native = self.gross_interest_native()
+        self.interest_aud = self._row_conversion(self.AUD)
+        self.interest_gbp = self._row_conversion(self.GBP)
+
+    def save(self, *args, **kwargs):
+        # Only redo the interest maths when one of its inputs has changed
+        changed = self.interest_native is None or self._interest_inputs() != self.__dict__.get('_loaded_inputs')
+        if changed:
+            self.refresh_interest_cache()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.INTEREST_CACHE_FIELDS}
+        super().save(*args, **kwargs)
+        self._loaded_inputs = self._interest_inputs()
+        if changed:
+            from .accruals import regenerate_accruals
+            regenerate_accruals([self])
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not instance.get_deferred_fields():
+            instance._loaded_inputs = instance._interest_inputs()
+        return instance
+
+
+class DepositAccrual(models.Model):
+    """Interest a deposit accrues over ``[start, end)``, one row per month or
+    day (``DEPOSIT_ACCRUAL_GRANULARITY``). Built by ``deposits.accruals``."""
+    deposit = models.ForeignKey(Deposit, on_delete=models.CASCADE, related_name='accruals')
+    start = models.DateField()
+    end = models.DateField()
+    days = models.PositiveIntegerField()
+    amount = models.DecimalField(max_digits=18, decimal_places=6)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deposit', 'start'], name='accrual_deposit_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.deposit_id} {self.start}..{self.end}: {self.amount}"
 
 
 class Pension(models.Model):
@@ -103,6 +230,16 @@ class Pension(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'end_date', 'id'], name='pension_user_maturity_idx'),
+            # Also serves plain (user, currency) lookups
+            models.Index(fields=['user', 'currency', 'end_date', 'id'], name='pension_user_ccy_maturity_idx'),
+            # Admin changelist filters across all users
+            models.Index(fields=['end_date', 'id'], name='pension_maturity_idx'),
+            models.Index(fields=['currency', 'end_date', 'id'], name='pension_ccy_maturity_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.currency})"
 
@@ -118,6 +255,23 @@ class Pension(models.Model):
         return (amount * rate).quantize(Decimal('0.01'))
 
 
+class FxRate(models.Model):
+    """Exchange rate: one unit of ``base`` costs ``rate`` units of ``quote`` on ``date``."""
+    base = models.CharField(max_length=3)
+    quote = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=18, decimal_places=8)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['base', 'quote', 'date'], name='fxrate_pair_date_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.base}/{self.quote} {self.date}: {self.rate}"
+
+
 class TaxProfile(models.Model):
     AU = 'AU'
     GB = 'GB'
@@ -134,6 +288,11 @@ class TaxProfile(models.Model):
     tax_threshold = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     tax_threshold_currency = models.CharField(max_length=3, default='AUD')
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'country'], name='taxprofile_user_country_unique'),
+        ]
+
     def save(self, *args, **kwargs):
         # Set default thresholds based on country
         if self.country == self.AU and self.tax_threshold == 0:
@@ -146,3 +305,68 @@ class TaxProfile(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.country}"
+
+
+class Job(models.Model):
+    """A unit of background work for ``manage.py run_worker`` (see jobs.py)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's claim query: next queued jobs that are due, oldest first
+            models.Index(fields=['status', 'run_after', 'id'], name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class PortfolioSnapshot(models.Model):
+    """A user's deposit portfolio at the start of one day (see snapshots.py):
+    principal of the deposits running that day and the interest they have
+    accrued so far, in each currency."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    date = models.DateField()
+    principal_aud = models.DecimalField(max_digits=14, decimal_places=2)
+    principal_gbp = models.DecimalField(max_digits=14, decimal_places=2)
+    interest_aud = models.DecimalField(max_digits=14, decimal_places=2)
+    interest_gbp = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            # Also the index for a user's date-range queries
+            models.UniqueConstraint(fields=['user', 'date'], name='snapshot_user_date_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.date}"
+
+
+class SnapshotState(models.Model):
+    """The state of a user's deposits when their snapshots were last written,
+    so unchanged users are only extended, never recomputed."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True)
+    deposits_version = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
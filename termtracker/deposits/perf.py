@@ -0,0 +1,390 @@
+"""Per-request performance instrumentation.
+
+``PerformanceMiddleware`` records wall time, query count and database time
+for every request, tagged with the URL name. Template render time, cache
+hits and misses and the time spent in functions decorated with ``timed``
+are added to the same record. Records are appended as JSON lines to
+``PERF_METRICS_FILE`` so the staff endpoint and the ``perf_report`` command
+can summarise them from any process. Requests only queue their record; one
+writer thread per process appends the queue to the file in batches, so no
+response waits on the file lock or the disk.
+"""
+import atexit
+import cProfile
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import math
+import os
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: records are only serialised within a process
+    fcntl = None
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates
+
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('perf_record', default=None)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def metrics_file() -> Path:
+    return Path(_setting('PERF_METRICS_FILE', Path(settings.BASE_DIR) / 'var' / 'perf' / 'metrics.jsonl'))
+
+
+def timed(name=None):
+    """Decorator adding a function's call count and time to the current
+    request's record. Outside a request it costs one context lookup."""
+    def decorator(func):
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            record = _current.get()
+            if record is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats = record['functions'].setdefault(label, [0, 0.0])
+                stats[0] += 1
+                stats[1] += (time.perf_counter() - started) * 1000
+        return wrapper
+    return decorator
+
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        record = _current.get()
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            if record is not None:
+                record['template_ms'] += (time.perf_counter() - started) * 1000
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Django template backend that reports render time to the current record."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
+
+
+_cache_lock = threading.Lock()
+_cache_counts = {'hits': 0, 'misses': 0}
+_MISSING = object()
+
+
+def _count_cache(hits, misses):
+    with _cache_lock:
+        _cache_counts['hits'] += hits
+        _cache_counts['misses'] += misses
+    record = _current.get()
+    if record is not None:
+        record['cache_hits'] += hits
+        record['cache_misses'] += misses
+
+
+def cache_stats():
+    """Cache hits and misses counted by this process since it started."""
+    with _cache_lock:
+        hits, misses = _cache_counts['hits'], _cache_counts['misses']
+    lookups = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / lookups, 4) if lookups else None}
+
+
+class InstrumentedLocMemCache(LocMemCache):
+    """Local-memory cache that counts hits and misses per process and per request."""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            _count_cache(0, 1)
+            return default
+        _count_cache(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        _count_cache(len(found), len(keys) - len(found))
+        return found
+
+
+def _count_query(execute, sql, params, many, context):
+    record = _current.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record['db_queries'] += 1
+        record['db_ms'] += (time.perf_counter() - started) * 1000
+
+
+def _install_query_counter(sender=None, connection=None, **kwargs):
+    # Installed on every connection, so queries run from worker threads
+    # (async views, sync_to_async) are counted against the request too
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+connection_created.connect(_install_query_counter)
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = _setting('PERF_METRICS_ENABLED', True)
+        self.profile_dir = _setting('PERF_PROFILE_DIR', None)
+        self.profile_rate = _setting('PERF_PROFILE_SAMPLE_RATE', 0.0)
+        self.slow_ms = _setting('PERF_SLOW_REQUEST_MS', 500)
+        for connection in connections.all(initialized_only=True):
+            _install_query_counter(connection=connection)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _new_record():
+        return {
+            'functions': {},
+            'template_ms': 0.0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'db_queries': 0,
+            'db_ms': 0.0,
+        }
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        record = self._new_record()
+        token = _current.set(record)
+        profiler = None
+        if self.profile_dir and self.profile_rate and random.random() < self.profile_rate:
+            profiler = cProfile.Profile()
+
+        started = time.perf_counter()
+        try:
+            if profiler is not None:
+                response = profiler.runcall(self.get_response, request)
+            else:
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        queue_record(self._finish(request, response, record, started, profiler))
+        return response
+
+    async def __acall__(self, request):
+        # cProfile only sees the calling thread, so async requests are not profiled
+        if not self.enabled:
+            return await self.get_response(request)
+
+        record = self._new_record()
+        token = _current.set(record)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        queue_record(self._finish(request, response, record, started))
+        return response
+
+    def _finish(self, request, response, record, started, profiler=None):
+        """Complete ``record`` with the request's outcome, ready to append."""
+        wall_ms = (time.perf_counter() - started) * 1000
+        match = request.resolver_match
+        record.update({
+            'ts': time.time(),
+            'view': match.url_name if match and match.url_name else 'unresolved',
+            'method': request.method,
+            'status': response.status_code,
+            'wall_ms': wall_ms,
+        })
+        if profiler is not None and wall_ms >= self.slow_ms:
+            self._save_profile(profiler, record)
+        return record
+
+    def _save_profile(self, profiler, record):
+        directory = Path(self.profile_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        filename = f"{record['view']}-{int(record['ts'])}-{int(record['wall_ms'])}ms.prof"
+        profiler.dump_stats(directory / filename)
+
+
+_append_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _locked(path):
+    """Hold an exclusive lock on ``path`` (a lock file next to the metrics)
+    across threads and, where ``fcntl`` exists, across processes."""
+    with _append_lock, open(path, 'a') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def append_records(records):
+    """Append request records, rotating the file once it grows too big.
+
+    The size check, rotation and write happen under one lock, so concurrent
+    workers neither rotate twice nor write to a file being rotated away.
+    """
+    path = metrics_file()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    max_bytes = _setting('PERF_METRICS_MAX_BYTES', 20 * 1024 * 1024)
+    lines = ''.join(json.dumps(record) + '\n' for record in records)
+    with _locked(path.with_suffix(path.suffix + '.lock')):
+        try:
+            if path.stat().st_size > max_bytes:
+                os.replace(path, path.with_suffix(path.suffix + '.1'))
+        except FileNotFoundError:
+            pass
+        with open(path, 'a') as handle:
+            handle.write(lines)
+
+
+def append_record(record):
+    append_records([record])
+
+
+WRITE_BATCH = 500       # most records appended per write
+_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def queue_record(record):
+    """Hand ``record`` to this process's writer thread and return at once."""
+    global _writer
+    if _writer is None or not _writer.is_alive():
+        with _writer_lock:
+            # Also restarts the writer in a forked worker, where it is not running
+            if _writer is None or not _writer.is_alive():
+                _writer = threading.Thread(target=_write_queued, name='perf-writer', daemon=True)
+                _writer.start()
+    _queue.put(record)
+
+
+def _write_queued():
+    while True:
+        records = [_queue.get()]
+        while len(records) < WRITE_BATCH:
+            try:
+                records.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            append_records(records)
+        except Exception:
+            logger.exception("Could not write %d performance records", len(records))
+        finally:
+            for _ in records:
+                _queue.task_done()
+
+
+def flush_records():
+    """Wait until every queued record has been written."""
+    _queue.join()
+
+
+atexit.register(flush_records)
+
+
+def read_records(since=None):
+    """Load the recorded requests, optionally only those after ``since``
+    (a Unix timestamp)."""
+    path = metrics_file()
+    if not path.exists():
+        return []
+    records = []
+    with open(path) as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if since is None or record['ts'] >= since:
+                records.append(record)
+    return records
+
+
+def _percentile(ordered, pct):
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(records):
+    """Per-view latency percentiles and average database/template cost."""
+    by_view = defaultdict(list)
+    for record in records:
+        by_view[record['view']].append(record)
+
+    summary = {}
+    for view, rows in sorted(by_view.items()):
+        wall = sorted(row['wall_ms'] for row in rows)
+        functions = defaultdict(lambda: [0, 0.0])
+        for row in rows:
+            for label, (calls, ms) in row['functions'].items():
+                functions[label][0] += calls
+                functions[label][1] += ms
+        hits = sum(row.get('cache_hits', 0) for row in rows)
+        misses = sum(row.get('cache_misses', 0) for row in rows)
+        summary[view] = {
+            'requests': len(rows),
+            'p50_ms': round(_percentile(wall, 50), 3),
+            'p95_ms': round(_percentile(wall, 95), 3),
+            'p99_ms': round(_percentile(wall, 99), 3),
+            'avg_queries': round(sum(row['db_queries'] for row in rows) / len(rows), 2),
+            'avg_db_ms': round(sum(row['db_ms'] for row in rows) / len(rows), 3),
+            'avg_template_ms': round(sum(row['template_ms'] for row in rows) / len(rows), 3),
+            'cache_hits': hits,
+            'cache_misses': misses,
+            'cache_hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+            'functions': {
+                label: {'calls_per_request': round(calls / len(rows), 2), 'avg_ms': round(ms / len(rows), 3)}
+                for label, (calls, ms) in sorted(functions.items())
+            },
+        }
+    return summary
@@ -0,0 +1,79 @@
+"""Per-user tax profile lookup.
+
+Every user has one Australian and one UK ``TaxProfile``. They are created
+together when the user is created (or, for older accounts, on first use) and then
+read with a single query whose result is kept in the ``TAX_PROFILE_CACHE``
+cache until a profile is saved or deleted. That cache is shared by every
+process, so an invalidation in one of them is seen by all the others.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import TaxProfile
+
+
+DEFAULT_PROFILES = {
+    # Same scale as the stored fields, so fresh and reloaded profiles give
+    # identical cache keys and ETags
+    TaxProfile.AU: {
+        'marginal_rate': Decimal('30.00'), 'tax_threshold': Decimal('18500.00'), 'tax_threshold_currency': 'AUD',
+    },
+    TaxProfile.GB: {
+        'marginal_rate': Decimal('20.00'), 'tax_threshold': Decimal('12900.00'), 'tax_threshold_currency': 'GBP',
+    },
+}
+
+
+def _cache():
+    return caches[getattr(settings, 'TAX_PROFILE_CACHE', 'default')]
+
+
+def _cache_key(user_id):
+    return f'tax-profiles:{user_id}'
+
+
+def create_tax_profiles(user):
+    """Create whichever of the user's default profiles are missing, in one
+    insert. Profiles that already exist, including ones a concurrent request
+    has just created, are left as they are."""
+    TaxProfile.objects.bulk_create(
+        [TaxProfile(user=user, country=country, **defaults) for country, defaults in DEFAULT_PROFILES.items()],
+        ignore_conflicts=True,
+    )
+    # bulk_create sends no signals
+    _cache().delete(_cache_key(user.pk))
+
+
+def _read_tax_profiles(user):
+    return {profile.country: profile for profile in TaxProfile.objects.filter(user=user)}
+
+
+def get_tax_profiles(user):
+    """The user's ``(AU, GB)`` profiles: from the cache, else one query."""
+    key = _cache_key(user.pk)
+    profiles = _cache().get(key)
+    if profiles is None:
+        by_country = _read_tax_profiles(user)
+        if len(by_country) < len(DEFAULT_PROFILES):
+            # Accounts created before profiles were made with the user
+            create_tax_profiles(user)
+            by_country = _read_tax_profiles(user)
+        profiles = (by_country[TaxProfile.AU], by_country[TaxProfile.GB])
+        _cache().set(key, profiles, getattr(settings, 'TAX_PROFILE_CACHE_SECONDS', 300))
+    return profiles
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def _create_tax_profiles(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        create_tax_profiles(instance)
+
+
+@receiver(post_save, sender=TaxProfile)
+@receiver(post_delete, sender=TaxProfile)
+def _invalidate_tax_profiles(sender, instance, **kwargs):
+    _cache().delete(_cache_key(instance.user_id))
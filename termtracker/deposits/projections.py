@@ -0,0 +1,355 @@
+"""Monte Carlo projection of the deposit portfolio.
+
+Every active deposit is rolled over at maturity, for the same term and
+with the same compounding, at the market rate of its currency on the roll
+date plus the spread it currently earns over that market. Market rates
+follow a mean-reverting random walk per currency and exchange rates a
+lognormal walk, one monthly step at a time.
+
+Roll dates do not depend on the path, so the simulation is organised by
+roll: round ``r`` holds the ``r``-th term of every deposit still inside the
+horizon, and each round is a single (deposits x paths) array operation.
+Interest is spread over each term by days, the way
+``calculate_interest_in_period`` prorates it, and summed into tax years
+from ``get_tax_year_period`` with one matrix product per round.
+"""
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from .cashflows import PensionCashflows
+from .interest import FX_SCALE
+from .models import Deposit
+from .perf import timed
+from .utils import get_tax_year_period
+
+
+PERCENTILES = (5, 25, 50, 75, 95)
+COUNTRY_CURRENCY = {'AU': Deposit.AUD, 'GB': Deposit.GBP}
+CHUNK_PATHS = 2500
+
+
+class Scenario:
+    """Parameters of the random rate and exchange-rate paths.
+
+    Rates are annual fractions; volatilities are per year.
+    """
+
+    def __init__(self, rate_volatility=0.01, rate_reversion=0.25, fx_volatility=0.10, rate_floor=0.0):
+        self.rate_volatility = rate_volatility
+        self.rate_reversion = rate_reversion
+        self.fx_volatility = fx_volatility
+        self.rate_floor = rate_floor
+
+
+def _add_years(day, years):
+    try:
+        return day.replace(year=day.year + years)
+    except ValueError:  # 29 February
+        return day.replace(year=day.year + years, day=28)
+
+
+def _month_index(day, origin):
+    months = (day.year - origin.year) * 12 + day.month - origin.month - (day.day < origin.day)
+    return max(months, 0)
+
+
+def _overlap_days(starts, ends, period_start, period_end):
+    """Days of each ``[start, end)`` term inside a period, as ``_prorate`` counts them."""
+    return np.maximum(np.minimum(ends, period_end) - np.maximum(starts, period_start), 0)
+
+
+class _Terms:
+    """The deterministic term schedule: one entry per (deposit, roll)."""
+
+    def __init__(self, deposits, today, horizon_end):
+        rows = []
+        for index, deposit in enumerate(deposits):
+            length = deposit.days
+            start, end, roll = deposit.start_date, deposit.end_date, 0
+            while start < horizon_end:
+                rows.append((index, roll, start.toordinal(), end.toordinal(), _month_index(start, today)))
+                start, end, roll = end, end + timedelta(days=length), roll + 1
+        table = np.array(rows, dtype=np.int64).reshape(-1, 5)
+        self.deposit, self.roll, self.start, self.end, self.month = table.T
+        self.rounds = int(self.roll.max()) + 1 if len(table) else 0
+
+
+class Projection:
+    """Monte Carlo projection of ``deposits`` (already matured ones are skipped)."""
+
+    def __init__(self, deposits, profile_au, profile_uk, years=5, today=None,
+                 scenario=None, fx_rates=None, reporting_currency=Deposit.AUD):
+        self.today = today or date.today()
+        self.horizon_end = _add_years(self.today, years)
+        self.months = _month_index(self.horizon_end, self.today)
+        self.scenario = scenario or Scenario()
+        self.profiles = {'AU': profile_au, 'GB': profile_uk}
+        self.reporting_currency = reporting_currency
+
+        self.deposits = [d for d in deposits if d.end_date > self.today and d.days > 0]
+        rows = self.deposits
+        self.currencies = sorted({d.currency for d in rows} | set(COUNTRY_CURRENCY.values()))
+        self.currency = np.array([self.currencies.index(d.currency) for d in rows], dtype=np.int64)
+        self.principal = np.array([float(d.principal) for d in rows])
+        self.rate = np.array([float(d.annual_rate or 0) / 100 for d in rows])
+        self.compounding = np.array(
+            [{Deposit.SIMPLE: 0, Deposit.MONTHLY: 12}.get(d.compounding, 1) for d in rows], dtype=np.int64
+        )
+        self.years = np.array([d.days / 365.0 for d in rows])
+        self.first_interest = np.array([float(d.gross_interest_native()) for d in rows])
+
+        # Each currency's market starts at its principal-weighted deposit rate;
+        # deposits keep their spread over it when they roll
+        self.market0 = np.zeros(len(self.currencies))
+        for c in range(len(self.currencies)):
+            weights = self.principal[self.currency == c]
+            if weights.sum() > 0:
+                self.market0[c] = np.average(self.rate[self.currency == c], weights=weights)
+        self.spread = self.rate - self.market0[self.currency]
+        self.fx0 = self._initial_fx(fx_rates)
+
+        self.terms = _Terms(rows, self.today, self.horizon_end)
+        self._tax_years()
+        self._checkpoints(years)
+        self._plan()
+
+    def _initial_fx(self, fx_rates):
+        """Today's price of one unit of each currency in the reporting currency,
+        from the rate table or else the deposits' own ``fx_*`` fields."""
+        fields = {(Deposit.GBP, Deposit.AUD): 'fx_gbp_to_aud', (Deposit.AUD, Deposit.GBP): 'fx_aud_to_gbp'}
+        fx0 = np.ones(len(self.currencies))
+        for c, currency in enumerate(self.currencies):
+            if currency == self.reporting_currency:
+                continue
+            if fx_rates:
+                factors, found = fx_rates.factors(currency, self.reporting_currency, self.today)
+                if found[0]:
+                    fx0[c] = factors[0] / FX_SCALE
+                    continue
+            field = fields.get((currency, self.reporting_currency))
+            if field is not None:
+                values = [float(getattr(d, field)) for d in self.deposits if d.currency == currency]
+                fx0[c] = np.mean(values) if values else float(Deposit._meta.get_field(field).default)
+        return fx0
+
+    def _tax_years(self):
+        """Tax years of each country from the one containing today to the
+        one containing the horizon, and each term's share of days in them."""
+        self.tax_years = {}
+        terms = self.terms
+        total = (terms.end - terms.start).astype(float)
+        for country in COUNTRY_CURRENCY:
+            year = self.today.year - 1
+            while get_tax_year_period(year, country)[1] < self.today:
+                year += 1
+            periods = []
+            while get_tax_year_period(year, country)[0] <= self.horizon_end:
+                periods.append((year, *get_tax_year_period(year, country)))
+                year += 1
+            weights = np.stack([
+                _overlap_days(terms.start, terms.end, start.toordinal(), end.toordinal()) / total
+                for _, start, end in periods
+            ], axis=1) if len(total) else np.zeros((0, len(periods)))
+            self.tax_years[country] = ([year for year, _, _ in periods], weights)
+
+    def _checkpoints(self, years):
+        """Valuation dates (each anniversary of today) and, per term, whether
+        it is running on them and how far through it is."""
+        self.checkpoint_dates = [_add_years(self.today, n) for n in range(1, years + 1)]
+        points = np.array([d.toordinal() for d in self.checkpoint_dates], dtype=np.int64)
+        self.checkpoint_months = np.array([_month_index(d, self.today) for d in self.checkpoint_dates], dtype=np.int64)
+        start, end = self.terms.start[:, None], self.terms.end[:, None]
+        self.running = ((start <= points) & (points < end)).astype(float)
+        self.elapsed = self.running * (points - start) / (end - start)
+
+    def _plan(self):
+        """Weights mapping each term's opening balance and interest onto the
+        output rows, and the terms of every roll round.
+
+        Output rows are the portfolio value per (currency, checkpoint)
+        followed by the interest per (country, tax year).
+        """
+        terms = self.terms
+        checkpoints = len(self.checkpoint_dates)
+        self.income_rows = {}
+        offset = len(self.currencies) * checkpoints
+        for country in COUNTRY_CURRENCY:
+            count = len(self.tax_years[country][0])
+            self.income_rows[country] = slice(offset, offset + count)
+            offset += count
+        self.outputs = offset
+
+        term_currency = self.currency[terms.deposit]
+        opening_weights = np.zeros((len(terms.deposit), offset))
+        interest_weights = np.zeros((len(terms.deposit), offset))
+        for c, currency in enumerate(self.currencies):
+            rows = term_currency == c
+            columns = slice(c * checkpoints, (c + 1) * checkpoints)
+            opening_weights[rows, columns] = self.running[rows]
+            interest_weights[rows, columns] = self.elapsed[rows]
+        for country, currency in COUNTRY_CURRENCY.items():
+            rows = term_currency == self.currencies.index(currency)
+            interest_weights[rows, self.income_rows[country]] = self.tax_years[country][1][rows]
+
+        self.rounds = []
+        for roll in range(terms.rounds):
+            index = np.flatnonzero(terms.roll == roll)
+            # Group each compounding rule together so growth is computed on slices
+            index = index[np.argsort(self.compounding[terms.deposit[index]], kind='stable')]
+            deposits = terms.deposit[index]
+            kinds = self.compounding[deposits]
+            self.rounds.append({
+                'deposits': deposits,
+                'market_rows': self.currency[deposits] * (self.months + 1) + np.minimum(terms.month[index], self.months),
+                'spread': self.spread[deposits, None],
+                'years': self.years[deposits, None],
+                'slices': [
+                    (kind, slice(np.searchsorted(kinds, kind, 'left'), np.searchsorted(kinds, kind, 'right')))
+                    for kind in (0, 1, 12)
+                ],
+                'opening_weights': np.ascontiguousarray(opening_weights[index].T),
+                'interest_weights': np.ascontiguousarray(interest_weights[index].T),
+            })
+
+    def _market_paths(self, rng, paths):
+        """Monthly market rates, one row per (currency, month), shape
+        (currencies * (months + 1), paths)."""
+        s = self.scenario
+        dt = 1 / 12
+        shocks = rng.standard_normal((self.months, len(self.currencies), paths)) * (s.rate_volatility * np.sqrt(dt))
+        rates = np.empty((len(self.currencies), self.months + 1, paths))
+        rates[:, 0] = self.market0[:, None]
+        keep = 1 - s.rate_reversion * dt
+        for month in range(self.months):
+            rates[:, month + 1] = self.market0[:, None] + keep * (rates[:, month] - self.market0[:, None]) + shocks[month]
+        np.maximum(rates, s.rate_floor, out=rates)
+        return rates.reshape(-1, paths)
+
+    def _fx_paths(self, rng, paths):
+        """Price of each currency in the reporting currency on each
+        checkpoint, shape (currencies, checkpoints, paths)."""
+        vol = self.scenario.fx_volatility * np.sqrt(1 / 12)
+        months = np.diff(self.checkpoint_months, prepend=0)[None, :, None]
+        steps = rng.standard_normal((len(self.currencies), len(months[0]), paths)) * vol * np.sqrt(months)
+        log_fx = np.cumsum(steps - vol * vol * months / 2, axis=1)
+        log_fx[[c == self.reporting_currency for c in self.currencies]] = 0.0
+        return self.fx0[:, None, None] * np.exp(log_fx)
+
+    def _simulate_chunk(self, rng, paths):
+        market = self._market_paths(rng, paths)
+        fx = self._fx_paths(rng, paths)
+
+        # The current terms are the same on every path
+        first = self.rounds[0] if self.rounds else None
+        outputs = np.zeros((self.outputs, paths))
+        balance = np.repeat(self.principal[:, None], paths, axis=1)
+        if first is not None:
+            deposits = first['deposits']
+            outputs += (
+                first['opening_weights'] @ self.principal[deposits]
+                + first['interest_weights'] @ self.first_interest[deposits]
+            )[:, None]
+            balance[deposits] += self.first_interest[deposits, None]
+
+        for plan in self.rounds[1:]:
+            opening = balance[plan['deposits']]
+            rate = market[plan['market_rows']]
+            rate += plan['spread']
+            np.maximum(rate, 0.0, out=rate)
+            # Turn each rate into interest per unit of principal, in place
+            for kind, rows in plan['slices']:
+                growth, years = rate[rows], plan['years'][rows]
+                if kind == 0:
+                    growth *= years
+                    continue
+                if kind == 12:
+                    growth /= 12
+                    years = years * 12
+                np.log1p(growth, out=growth)
+                growth *= years
+                np.expm1(growth, out=growth)
+            interest = rate
+            interest *= opening
+            outputs += plan['opening_weights'] @ opening
+            outputs += plan['interest_weights'] @ interest
+            opening += interest
+            balance[plan['deposits']] = opening
+
+        checkpoints = len(self.checkpoint_dates)
+        value = outputs[:len(self.currencies) * checkpoints].reshape(len(self.currencies), checkpoints, paths)
+        total_value = (value * fx).sum(axis=0)
+        return total_value, {country: outputs[rows] for country, rows in self.income_rows.items()}
+
+    def _after_tax(self, country, income, pensions):
+        """After-tax income per tax year, with tax worked out as in
+        ``_country_obligations``: any tax already paid reduces what is owed.
+        ``pensions`` holds each tax year's pension income and tax paid."""
+        profile = self.profiles[country]
+        total_pension, total_tax_paid = np.array(pensions, dtype=float).reshape(-1, 2).T[:, :, None]
+        total_income = income + total_pension
+        taxable = np.maximum(total_income - float(profile.tax_threshold or 0), 0)
+        tax = taxable * float(profile.marginal_rate or 0) / 100
+        return total_income - np.maximum(tax, total_tax_paid)
+
+    @timed()
+    def run(self, paths=10000, seed=None, time_budget=1.0, pensions=()):
+        """Simulate up to ``paths`` paths in chunks, stopping early once
+        ``time_budget`` seconds have passed. Returns percentile bands."""
+        started = time.perf_counter()
+        rng = np.random.default_rng(seed)
+        cashflows = PensionCashflows(pensions)
+        pension_totals = {
+            country: cashflows.totals_by_period(
+                [get_tax_year_period(year, country) for year in self.tax_years[country][0]], currency,
+            )
+            for country, currency in COUNTRY_CURRENCY.items()
+        }
+        values, incomes = [], {country: [] for country in COUNTRY_CURRENCY}
+        done = 0
+        while done < paths:
+            chunk = min(CHUNK_PATHS, paths - done)
+            value, income = self._simulate_chunk(rng, chunk)
+            values.append(value)
+            for country in COUNTRY_CURRENCY:
+                incomes[country].append(self._after_tax(country, income[country], pension_totals[country]))
+            done += chunk
+            if time.perf_counter() - started > time_budget:
+                break
+
+        value = np.concatenate(values, axis=1)
+        bands = np.percentile(value, PERCENTILES, axis=1) if len(self.checkpoint_dates) else np.zeros((len(PERCENTILES), 0))
+        result = {
+            'paths': done,
+            'truncated': done < paths,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3),
+            'deposits': len(self.deposits),
+            'reporting_currency': self.reporting_currency,
+            'percentiles': list(PERCENTILES),
+            'value': [
+                {'date': checkpoint, 'bands': [round(float(v), 2) for v in bands[:, j]]}
+                for j, checkpoint in enumerate(self.checkpoint_dates)
+            ],
+            'after_tax_income': {},
+        }
+        for country, currency in COUNTRY_CURRENCY.items():
+            after_tax = np.concatenate(incomes[country], axis=1)
+            country_bands = np.percentile(after_tax, PERCENTILES, axis=1)
+            result['after_tax_income'][country.lower()] = {
+                'currency': currency,
+                'years': [
+                    {'year': year, 'bands': [round(float(v), 2) for v in country_bands[:, i]]}
+                    for i, year in enumerate(self.tax_years[country][0])
+                ],
+            }
+        return result
+
+
+def project_portfolio(deposits, profile_au, profile_uk, pensions=(), years=5, paths=10000, seed=None,
+                      time_budget=1.0, today=None, scenario=None, fx_rates=None):
+    """Build and run a ``Projection``; see ``Projection.run`` for the result."""
+    projection = Projection(
+        deposits, profile_au, profile_uk, years=years, today=today, scenario=scenario, fx_rates=fx_rates,
+    )
+    return projection.run(paths=paths, seed=seed, time_budget=time_budget, pensions=pensions)
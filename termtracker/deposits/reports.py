@@ -0,0 +1,173 @@
+"""Fleet-wide report: one row of totals per user.
+
+Users are split into id-range shards and each shard is reported by a
+separate process (``manage.py fleet_report``) with its own database
+connection. Within a shard, users, deposits, pensions and tax profiles are
+each read with one query, deposits streamed with ``iterator()`` in user
+order, so memory stays at one user's portfolio regardless of fleet size.
+Each shard writes a part file; the parts are merged in shard order.
+
+Amounts are exact: CSV holds the same decimal strings as the web pages and
+the columnar ``.npz`` format holds integer cents.
+"""
+import csv
+import itertools
+from collections import defaultdict
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+
+from .interest import InterestBatch
+from .models import Deposit, Pension, TaxProfile
+from .profiles import DEFAULT_PROFILES
+from .utils import calculate_tax_obligations_for_years
+
+
+FLEET_FIELDS = [
+    'user_id', 'username', 'deposits', 'pensions',
+    'principal_aud', 'principal_gbp', 'interest_aud', 'interest_gbp',
+    'tax_year', 'tax_year_interest_au', 'tax_year_interest_uk', 'pension_income_au', 'pension_income_uk',
+    'estimated_tax_au', 'estimated_tax_uk',
+]
+TEXT_FIELDS = {'username'}
+COUNT_FIELDS = {'user_id', 'deposits', 'pensions', 'tax_year'}
+AMOUNT_FIELDS = [field for field in FLEET_FIELDS if field not in TEXT_FIELDS | COUNT_FIELDS]
+FORMATS = ('csv', 'npz')
+
+
+def shard_bounds(shards):
+    """Split users into up to ``shards`` ``(first_id, last_id)`` ranges of
+    about the same number of users."""
+    ids = get_user_model().objects.order_by('pk').values_list('pk', flat=True)
+    count = ids.count()
+    if not count:
+        return []
+    shards = max(1, min(shards, count))
+    starts = [ids[count * index // shards] for index in range(shards)]
+    ends = [start - 1 for start in starts[1:]] + [ids.reverse()[0]]
+    return list(zip(starts, ends))
+
+
+def _profiles(first_id, last_id):
+    profiles = {}
+    for profile in TaxProfile.objects.filter(user_id__gte=first_id, user_id__lte=last_id):
+        profiles[profile.user_id, profile.country] = profile
+    return profiles
+
+
+def _profile(profiles, user_id, country):
+    # Reporting never writes: users without a profile get an unsaved default
+    return profiles.get((user_id, country)) or TaxProfile(user_id=user_id, country=country, **DEFAULT_PROFILES[country])
+
+
+def _user_row(user_id, username, deposits, pensions, profile_au, profile_uk, year):
+    batch = InterestBatch(deposits)
+    principal = defaultdict(lambda: Decimal('0.00'))
+    interest = defaultdict(lambda: Decimal('0.00'))
+    for deposit, gross in zip(batch.deposits, batch.gross_interest_native()):
+        principal[deposit.currency] += deposit.principal
+        interest[deposit.currency] += gross
+    obligations = calculate_tax_obligations_for_years(batch, [year], profile_au, profile_uk, pensions)[year]
+    return {
+        'user_id': user_id,
+        'username': username,
+        'deposits': len(deposits),
+        'pensions': len(pensions),
+        'principal_aud': principal[Deposit.AUD],
+        'principal_gbp': principal[Deposit.GBP],
+        'interest_aud': interest[Deposit.AUD],
+        'interest_gbp': interest[Deposit.GBP],
+        'tax_year': year,
+        'tax_year_interest_au': obligations['au']['total_interest'],
+        'tax_year_interest_uk': obligations['uk']['total_interest'],
+        'pension_income_au': obligations['au']['total_pension'],
+        'pension_income_uk': obligations['uk']['total_pension'],
+        'estimated_tax_au': obligations['au']['tax_owed'],
+        'estimated_tax_uk': obligations['uk']['tax_owed'],
+    }
+
+
+def fleet_rows(first_id, last_id, year, chunk_size=2000):
+    """Report rows for the users with ids in ``[first_id, last_id]``."""
+    users = get_user_model().objects.filter(pk__range=(first_id, last_id)).order_by('pk').values_list('pk', 'username')
+    pensions = defaultdict(list)
+    for pension in Pension.objects.filter(user_id__gte=first_id, user_id__lte=last_id).iterator(chunk_size=chunk_size):
+        pensions[pension.user_id].append(pension)
+    profiles = _profiles(first_id, last_id)
+    deposits = (
+        Deposit.objects.filter(user_id__gte=first_id, user_id__lte=last_id)
+        .order_by('user_id', 'pk')
+        .iterator(chunk_size=chunk_size)
+    )
+    by_user = itertools.groupby(deposits, key=lambda deposit: deposit.user_id)
+    pending = next(by_user, None)
+
+    for user_id, username in users.iterator(chunk_size=chunk_size):
+        user_deposits = []
+        if pending is not None and pending[0] == user_id:
+            user_deposits = list(pending[1])
+            pending = next(by_user, None)
+        yield _user_row(
+            user_id, username, user_deposits, pensions.pop(user_id, []),
+            _profile(profiles, user_id, TaxProfile.AU), _profile(profiles, user_id, TaxProfile.GB), year,
+        )
+
+
+def _columns(rows):
+    columns = {field: [] for field in FLEET_FIELDS}
+    for row in rows:
+        for field in FLEET_FIELDS:
+            value = row[field]
+            columns[field].append(int(value * 100) if field in AMOUNT_FIELDS else value)
+    return {
+        field: np.array(values, dtype=str if field in TEXT_FIELDS else np.int64)
+        for field, values in columns.items()
+    }
+
+
+def report_shard(first_id, last_id, year, path, fmt, chunk_size=2000):
+    """Write one shard's rows to ``path``; returns the number of users and
+    the shard's totals in cents. Runs in a pool process."""
+    try:
+        rows = fleet_rows(first_id, last_id, year, chunk_size)
+        totals = dict.fromkeys(AMOUNT_FIELDS, 0)
+        count = 0
+
+        def counted(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                for field in AMOUNT_FIELDS:
+                    totals[field] += int(row[field] * 100)
+                yield row
+
+        if fmt == 'csv':
+            with open(path, 'w', newline='') as handle:
+                writer = csv.DictWriter(handle, fieldnames=FLEET_FIELDS)
+                writer.writerows(counted(rows))
+        else:
+            np.savez(path, **_columns(counted(rows)))
+        return count, totals
+    finally:
+        close_old_connections()
+
+
+def merge_parts(paths, output, fmt):
+    """Concatenate shard part files, in order, into one report."""
+    if fmt == 'csv':
+        with open(output, 'w', newline='') as handle:
+            csv.writer(handle).writerow(FLEET_FIELDS)
+            for path in paths:
+                with open(path, newline='') as part:
+                    for line in part:
+                        handle.write(line)
+        return
+    parts = [np.load(path) for path in paths]
+    columns = {
+        field: np.concatenate([part[field] for part in parts]) if parts else np.array([], dtype=np.int64)
+        for field in FLEET_FIELDS
+    }
+    with open(output, 'wb') as handle:
+        np.savez_compressed(handle, **columns)
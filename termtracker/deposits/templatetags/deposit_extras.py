@@ -9,3 +9,10 @@ def interest_in(deposit, currency):
 @register.filter
 def estimated_tax(deposit, profile):
     return deposit.estimated_tax(profile)
+
+@register.simple_tag
+def prime_interest(batch):
+    """Compute the page's interest figures; used inside cached fragments so
+    the work only happens on a cache miss."""
+    batch.prime()
+    return ''
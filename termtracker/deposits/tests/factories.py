@@ -0,0 +1,92 @@
+"""Shared fixtures for the deposits tests."""
+import random
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase as DjangoTestCase
+from django.test import TransactionTestCase as DjangoTransactionTestCase
+from django.test import override_settings
+
+from deposits import fx
+from deposits.models import Deposit, Pension, TaxProfile
+from deposits.profiles import DEFAULT_PROFILES
+
+
+def make_user(username='alice'):
+    return User.objects.create_user(username, f'{username}@example.com')
+
+
+def default_profiles(user=None):
+    """Unsaved AU and UK profiles with the default settings."""
+    return tuple(
+        TaxProfile(user=user, country=country, **DEFAULT_PROFILES[country])
+        for country in (TaxProfile.AU, TaxProfile.GB)
+    )
+
+
+def random_deposit(rng, user=None, earliest=date(2020, 1, 1)):
+    """An unsaved deposit with random terms, like ``generate_synthetic_data``."""
+    start = earliest + timedelta(days=rng.randint(0, 5 * 365))
+    return Deposit(
+        user=user,
+        name=f'Deposit {rng.randint(1, 10 ** 6)}',
+        principal=Decimal(rng.randint(100, 50_000_000)) / 100,
+        annual_rate=Decimal(rng.randint(0, 1200)) / 100,
+        start_date=start,
+        end_date=start + timedelta(days=rng.choice([0, 1, 30, 90, 181, 365, 366, 730, 1095, 1826])),
+        compounding=rng.choice([Deposit.SIMPLE, Deposit.MONTHLY, Deposit.ANNUAL]),
+        currency=rng.choice([Deposit.AUD, Deposit.GBP]),
+        fx_aud_to_gbp=Decimal(rng.randint(400_000, 600_000)) / 10 ** 6,
+        fx_gbp_to_aud=Decimal(rng.randint(1_700_000, 2_100_000)) / 10 ** 6,
+    )
+
+
+def create_deposits(user, count, seed=1):
+    """Saved random deposits (through ``save()``, so with interest cache and
+    accrual schedule)."""
+    rng = random.Random(seed)
+    deposits = []
+    for _ in range(count):
+        deposit = random_deposit(rng, user)
+        deposit.save()
+        deposits.append(deposit)
+    return deposits
+
+
+def create_pension(user, **fields):
+    values = {
+        'name': 'Pension', 'monthly_amount': Decimal('1000.00'), 'tax_paid': Decimal('150.00'),
+        'currency': Deposit.AUD,
+    }
+    values.update(fields)
+    return Pension.objects.create(user=user, **values)
+
+
+# The shared cache lives on disk; tests keep theirs out of the project's var/
+SHARED_CACHE_DIR = tempfile.TemporaryDirectory()
+
+
+class _Isolated:
+    """Clear the caches between tests: primary keys are reused after each
+    test's rollback, so cached profiles or rates would leak."""
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(override_settings(CACHES={
+            **settings.CACHES, 'shared': {**settings.CACHES['shared'], 'LOCATION': SHARED_CACHE_DIR.name},
+        }))
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        fx._cached = None
+
+
+class TestCase(_Isolated, DjangoTestCase):
+    pass
+
+
+class TransactionTestCase(_Isolated, DjangoTransactionTestCase):
+    pass
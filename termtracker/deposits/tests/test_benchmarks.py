@@ -0,0 +1,88 @@
+import io
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+
+from deposits.benchmarks import DEFAULT_BUDGETS, check_budgets, compare, measure
+from deposits.models import Deposit, DepositAccrual, TaxProfile
+
+from .factories import TestCase
+
+
+def generate(**options):
+    values = {'users': 2, 'deposits_per_user': 7, 'pensions_per_user': 2, 'seed': 3, 'batch_size': 3}
+    values.update(options)
+    call_command('generate_synthetic_data', stdout=io.StringIO(), **values)
+
+
+def portfolio(user):
+    return list(
+        Deposit.objects.filter(user=user).order_by('pk')
+        .values_list('principal', 'annual_rate', 'start_date', 'end_date', 'compounding', 'currency')
+    )
+
+
+class GenerateSyntheticDataTests(TestCase):
+    def test_creates_users_with_complete_portfolios(self):
+        generate()
+        users = User.objects.filter(username__startswith='synthetic_3_').order_by('username')
+        self.assertEqual([user.username for user in users], ['synthetic_3_0', 'synthetic_3_1'])
+        for user in users:
+            self.assertEqual(TaxProfile.objects.filter(user=user).count(), 2)
+            self.assertEqual(user.pension_set.count(), 2)
+            deposits = Deposit.objects.filter(user=user)
+            self.assertEqual(deposits.count(), 7)
+            for deposit in deposits:
+                # Written with bulk_create, but cached and scheduled as if saved
+                self.assertEqual(deposit.interest_native, deposit._compute_gross_interest())
+                accrued = sum(DepositAccrual.objects.filter(deposit=deposit).values_list('amount', flat=True))
+                self.assertEqual(accrued, deposit.interest_native)
+
+    def test_seeded_runs_are_reproducible(self):
+        generate(users=1, prefix='first')
+        generate(users=1, prefix='second')
+        first, second = (User.objects.get(username=f'{prefix}_3_0') for prefix in ('first', 'second'))
+        self.assertEqual(portfolio(first), portfolio(second))
+
+
+@override_settings(PERF_METRICS_ENABLED=False)
+class BenchmarkTests(TestCase):
+    def test_measure_counts_queries(self):
+        result = measure(lambda: list(User.objects.all()), repeat=3, warmup=0)
+        self.assertEqual((result['runs'], result['queries']), (3, 1))
+        self.assertLessEqual(result['min_ms'], result['p50_ms'])
+        self.assertLessEqual(result['p95_ms'], result['max_ms'])
+
+    def test_budgets_and_regressions(self):
+        results = {'dashboard': {'p50_ms': 13, 'p95_ms': 12, 'queries': 3}}
+        self.assertEqual(
+            check_budgets(results, {'dashboard': {'p95_ms': 10, 'queries': 5}, 'deposit_list': {'queries': 1}}),
+            ['dashboard: p95_ms 12 exceeds budget 10'],
+        )
+        self.assertEqual(
+            compare(results, {'dashboard': {'p50_ms': 10, 'queries': 3}}, max_regression=20),
+            ['dashboard: p50_ms regressed from 10 to 13'],
+        )
+
+    def test_command_writes_results_and_fails_over_budget(self):
+        generate(users=1, deposits_per_user=5)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        output, budgets = Path(directory.name) / 'results.json', Path(directory.name) / 'budgets.json'
+        # Timings under the test runner say nothing; only check the plumbing
+        budgets.write_text(json.dumps({name: {'p95_ms': 10 ** 6, 'queries': 10 ** 6} for name in DEFAULT_BUDGETS}))
+
+        options = {'username': 'synthetic_3_0', 'repeat': 1, 'warmup': 0, 'year': 2023, 'output': str(output)}
+        call_command('run_benchmarks', budgets=str(budgets), **options)
+        report = json.loads(output.read_text())
+        self.assertEqual((report['deposits'], report['failures']), (5, []))
+        self.assertEqual(set(report['results']), set(DEFAULT_BUDGETS))
+
+        budgets.write_text(json.dumps({'dashboard': {'queries': 0}}))
+        with mock.patch('sys.stderr', new_callable=io.StringIO), self.assertRaises(CommandError):
+            call_command('run_benchmarks', budgets=str(budgets), **options)
@@ -0,0 +1,156 @@
+import io
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from deposits import fx
+from deposits.interest import InterestBatch
+from deposits.models import Deposit, FxRate
+from deposits.profiles import get_tax_profiles
+from deposits.utils import summarize_deposits
+
+from .factories import TestCase, create_deposits, make_user
+
+
+class FxRatesTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.rates = fx.FxRates([
+            ('AUD', 'GBP', date(2024, 1, 1), Decimal('0.50')),
+            ('AUD', 'GBP', date(2024, 6, 1), Decimal('0.52')),
+            ('USD', 'AUD', date(2024, 1, 1), Decimal('1.50')),
+        ])
+
+    def test_latest_rate_on_or_before_the_date(self):
+        self.assertIsNone(self.rates.convert(Decimal('100'), 'AUD', 'GBP', date(2023, 12, 31)))
+        self.assertEqual(self.rates.convert(Decimal('100'), 'AUD', 'GBP', date(2024, 5, 31)), Decimal('50.00'))
+        self.assertEqual(self.rates.convert(Decimal('100'), 'AUD', 'GBP', date(2025, 1, 1)), Decimal('52.00'))
+
+    def test_inverted_and_crossed_pairs(self):
+        self.assertEqual(self.rates.convert(Decimal('52'), 'GBP', 'AUD', date(2024, 7, 1)), Decimal('100.00'))
+        # USD -> AUD -> GBP
+        self.assertEqual(self.rates.convert(Decimal('10'), 'USD', 'GBP', date(2024, 7, 1)), Decimal('7.80'))
+
+    def test_convert_cents_matches_convert(self):
+        cents = [12345, 1, 999999, 50]
+        currencies = ['AUD', 'GBP', 'USD', 'AUD']
+        converted, found = self.rates.convert_cents(cents, currencies, 'GBP', date(2024, 7, 1))
+        self.assertTrue(found.all())
+        for value, amount, currency in zip(converted, cents, currencies):
+            expected = self.rates.convert(Decimal(amount).scaleb(-2), currency, 'GBP', date(2024, 7, 1))
+            self.assertEqual(Decimal(int(value)).scaleb(-2), expected)
+
+    def test_import_rates(self):
+        written, errors = fx.import_rates(io.StringIO(
+            'base,quote,date,rate\nAUD,GBP,2024-01-01,0.5\nAUD,AUD,2024-01-01,1\nAUD,GBP,2024-01-01,0.51\n'
+        ))
+        self.assertEqual(written, 2)
+        self.assertEqual([line for line, _ in errors], [3])
+        self.assertEqual(FxRate.objects.get().rate, Decimal('0.51'))
+
+
+class TableConversionTests(TestCase):
+    def test_batch_uses_table_rates_where_available(self):
+        user = make_user()
+        deposits = create_deposits(user, 40)
+        FxRate.objects.create(base='GBP', quote='AUD', date=date(2020, 1, 1), rate=Decimal('1.9'))
+        rates = fx.get_rates()
+        batch = InterestBatch(Deposit.objects.filter(user=user).order_by('pk'), rates=rates, on=date(2024, 1, 1))
+        for deposit, aud, gbp in zip(deposits, batch.interest_in(Deposit.AUD), batch.interest_in(Deposit.GBP)):
+            if deposit.currency == Deposit.GBP:
+                self.assertEqual(aud, rates.convert(deposit.gross_interest_native(), 'GBP', 'AUD', date(2024, 1, 1)))
+            else:
+                # The inverse of GBP/AUD is in the table too
+                self.assertEqual(gbp, rates.convert(deposit.gross_interest_native(), 'AUD', 'GBP', date(2024, 1, 1)))
+
+    def test_rates_reload_when_the_table_changes(self):
+        self.assertFalse(fx.get_rates())
+        FxRate.objects.create(base='GBP', quote='AUD', date=date(2020, 1, 1), rate=Decimal('1.9'))
+        self.assertEqual(fx.get_rates().convert(Decimal('1'), 'GBP', 'AUD', date(2024, 1, 1)), Decimal('1.90'))
+
+
+class ConversionRuleTests(TestCase):
+    """Cards, totals, exports and the scalar methods convert every row at the
+    table rate as of the valuation date, falling back to the row's own rates."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.deposits = create_deposits(self.user, 60, seed=3)
+        # Only GBP -> AUD has a table rate before 2024; AUD -> GBP uses its inverse
+        FxRate.objects.create(base='GBP', quote='AUD', date=date(2020, 1, 1), rate=Decimal('1.87654321'))
+
+    def _fresh(self):
+        return list(Deposit.objects.filter(user=self.user).order_by('pk'))
+
+    def test_scalar_matches_batch(self):
+        rates = fx.get_rates()
+        batch = InterestBatch(self._fresh(), rates=rates)
+        for target in (Deposit.AUD, Deposit.GBP):
+            self.assertEqual([d.interest_in(target, rates) for d in self._fresh()], batch.interest_in(target))
+
+    def test_totals_match_the_cards(self):
+        profiles = get_tax_profiles(self.user)
+        deposits = Deposit.objects.filter(user=self.user)
+        deposits.filter(pk__in=[d.pk for d in self.deposits[:7]]).update(interest_native=None)
+        rates = fx.get_rates()
+        totals = summarize_deposits(deposits, *profiles, rates, date.today())
+        for target in (Deposit.AUD, Deposit.GBP):
+            self.assertEqual(totals[f'total_interest_{target.lower()}'],
+                             sum(d.interest_in(target, rates) for d in self._fresh()))
+
+    def test_rows_without_a_table_rate_use_their_own_rates(self):
+        FxRate.objects.all().delete()
+        FxRate.objects.create(base='USD', quote='AUD', date=date(2020, 1, 1), rate=Decimal('1.5'))
+        rates = fx.get_rates()
+        totals = summarize_deposits(Deposit.objects.filter(user=self.user), *get_tax_profiles(self.user), rates)
+        for deposit in self._fresh():
+            self.assertEqual(deposit.interest_in(Deposit.AUD, rates), deposit.interest_aud)
+        self.assertEqual(totals['total_interest_gbp'], sum(d.interest_gbp for d in self._fresh()))
+
+    def test_stored_conversions_use_the_row_rates(self):
+        deposit = self._fresh()[0]
+        deposit.refresh_interest_cache()
+        other = Deposit.GBP if deposit.currency == Deposit.AUD else Deposit.AUD
+        rate = deposit.fx_aud_to_gbp if deposit.currency == Deposit.AUD else deposit.fx_gbp_to_aud
+        stored = deposit.interest_aud if other == Deposit.AUD else deposit.interest_gbp
+        self.assertEqual(stored, (deposit.gross_interest_native() * rate).quantize(Decimal('0.01')))
+
+    def test_scalar_conversions_do_not_query(self):
+        rates = fx.get_rates()
+        deposits = self._fresh()
+        profile_uk = get_tax_profiles(self.user)[1]
+        with CaptureQueriesContext(connection) as queries:
+            for deposit in deposits:
+                deposit.interest_in(Deposit.AUD, rates)
+                deposit.estimated_tax(profile_uk, rates)
+        self.assertEqual(len(queries), 0)
+
+    def test_primed_deposits_keep_the_batch_rates(self):
+        rates = fx.get_rates()
+        deposits = self._fresh()
+        batch = InterestBatch(deposits, rates=rates).prime()
+        self.assertEqual([d.interest_in(Deposit.AUD) for d in deposits], batch.interest_in(Deposit.AUD))
+
+    def test_totals_are_one_query_and_round_ties_like_the_cards(self):
+        # A rate of 1.5 puts every odd cent amount exactly on a half cent
+        FxRate.objects.create(base='GBP', quote='AUD', date=date(2021, 1, 1), rate=Decimal('1.5'))
+        rates = fx.get_rates()
+        profiles = get_tax_profiles(self.user)
+        deposits = Deposit.objects.filter(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            totals = summarize_deposits(deposits, *profiles, rates)
+        self.assertEqual(len(queries), 2)  # the aggregate, and the empty uncached batch
+        for target in (Deposit.AUD, Deposit.GBP):
+            self.assertEqual(totals[f'total_interest_{target.lower()}'],
+                             sum(d.interest_in(target, rates) for d in self._fresh()))
+
+    def test_rows_too_large_for_sql_are_converted_in_python(self):
+        rates = fx.get_rates()
+        profiles = get_tax_profiles(self.user)
+        expected = summarize_deposits(Deposit.objects.filter(user=self.user), *profiles, rates)
+        with mock.patch('deposits.utils.MAX_SQL_INTEGER', 10 ** 12):
+            self.assertEqual(summarize_deposits(Deposit.objects.filter(user=self.user), *profiles, rates), expected)
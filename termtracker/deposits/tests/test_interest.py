@@ -0,0 +1,194 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import override_settings
+
+from deposits.accruals import ACCRUAL_ERROR, accrued_in_period, build_accruals, interest_to_date, regenerate_accruals
+from deposits.benchmarks import _decimal_power_interest
+from deposits.compounding import compound_interest
+from deposits.interest import InterestBatch, refresh_interest_cache
+from deposits.models import Deposit, DepositAccrual
+from deposits.utils import calculate_interest_in_period, calculate_interest_in_periods
+
+from .factories import TestCase, create_deposits, default_profiles, make_user, random_deposit
+
+
+def prorated(deposit, period_start, period_end):
+    """``calculate_interest_in_period`` without an accrual schedule."""
+    overlap = (min(deposit.end_date, period_end) - max(deposit.start_date, period_start)).days
+    if deposit.end_date < period_start or deposit.start_date > period_end or overlap <= 0 or deposit.days <= 0:
+        return Decimal('0.00')
+    share = Decimal(overlap) / Decimal(deposit.days)
+    return (share * deposit.gross_interest_native()).quantize(Decimal('0.01'))
+
+
+class InterestBatchTests(TestCase):
+    """The vectorized engine rounds every value exactly like the scalar
+    ``Deposit`` methods."""
+
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(1)
+        self.deposits = [random_deposit(rng) for _ in range(2000)]
+        self.batch = InterestBatch(self.deposits, use_cached=False)
+
+    def test_gross_interest_matches_scalar(self):
+        self.assertEqual(
+            self.batch.gross_interest_native(),
+            [deposit._compute_gross_interest() for deposit in self.deposits],
+        )
+
+    def test_conversions_and_tax_match_scalar(self):
+        for target in (Deposit.AUD, Deposit.GBP):
+            self.assertEqual(self.batch.interest_in(target), [d.interest_in(target) for d in self.deposits])
+        for profile in default_profiles():
+            self.assertEqual(self.batch.estimated_tax(profile), [d.estimated_tax(profile) for d in self.deposits])
+            self.assertEqual(
+                self.batch.total_estimated_tax(profile), sum(d.estimated_tax(profile) for d in self.deposits),
+            )
+
+    def test_period_interest_matches_proration(self):
+        rng = random.Random(2)
+        for _ in range(20):
+            start = date(2020, 1, 1) + timedelta(days=rng.randint(0, 8 * 365))
+            end = start + timedelta(days=rng.randint(0, 500))
+            cents = self.batch.interest_in_period_cents(start, end)
+            self.assertEqual(
+                [Decimal(int(c)).scaleb(-2) for c in cents],
+                [prorated(deposit, start, end) for deposit in self.deposits],
+            )
+
+    def test_interest_by_period_matches_single_periods(self):
+        periods = [(date(year, 7, 1), date(year + 1, 6, 30)) for year in range(2019, 2031)]
+        for currency in (Deposit.AUD, Deposit.GBP):
+            self.assertEqual(
+                self.batch.interest_by_period(periods, currency),
+                [self.batch.total_interest_in_period(start, end, currency) for start, end in periods],
+            )
+
+    def test_prime_seeds_scalar_methods(self):
+        profile_au, profile_uk = default_profiles()
+        deposits = self.deposits[:50]
+        InterestBatch(deposits).prime(profile_au, profile_uk)
+        with mock.patch.object(Deposit, '_compute_gross_interest', side_effect=AssertionError):
+            for deposit in deposits:
+                deposit.interest_in(Deposit.AUD)
+                deposit.estimated_tax(profile_uk)
+
+
+class InterestCacheTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.deposit = create_deposits(self.user, 1)[0]
+
+    def test_save_stores_interest(self):
+        self.deposit.refresh_from_db()
+        self.assertEqual(self.deposit.interest_native, self.deposit._compute_gross_interest())
+        self.assertEqual(self.deposit.interest_gbp, InterestBatch([self.deposit], use_cached=False).interest_in('GBP')[0])
+
+    def test_loaded_rows_use_the_cache(self):
+        deposit = Deposit.objects.get(pk=self.deposit.pk)
+        with mock.patch.object(Deposit, '_compute_gross_interest', side_effect=AssertionError):
+            self.assertEqual(deposit.gross_interest_native(), self.deposit.interest_native)
+            self.assertEqual(InterestBatch([deposit]).gross_interest_native(), [self.deposit.interest_native])
+
+    def test_changed_inputs_are_recomputed(self):
+        deposit = Deposit.objects.get(pk=self.deposit.pk)
+        deposit.principal += 1000
+        expected = deposit._compute_gross_interest()
+        self.assertEqual(deposit.gross_interest_native(), expected)
+        deposit.save(update_fields=['principal'])
+        deposit.refresh_from_db()
+        self.assertEqual(deposit.interest_native, expected)
+
+    def test_refresh_interest_cache_fills_cleared_rows(self):
+        Deposit.objects.update(interest_native=None, interest_aud=None, interest_gbp=None)
+        self.assertEqual(refresh_interest_cache(Deposit.objects.filter(interest_native__isnull=True)), 1)
+        self.deposit.refresh_from_db()
+        self.assertEqual(self.deposit.interest_native, self.deposit._compute_gross_interest())
+
+
+class CompoundingTests(TestCase):
+    def test_matches_decimal_power(self):
+        rng = random.Random(3)
+        for _ in range(10000):
+            principal = Decimal(rng.randint(1, 99_999_999_999)) / 100
+            rate = Decimal(rng.randint(0, 2500)) / 100
+            periods = rng.choice([1, 12])
+            days = rng.randint(0, 20 * 365)
+            with self.subTest(principal=principal, rate=rate, periods=periods, days=days):
+                self.assertEqual(
+                    compound_interest(principal, rate, periods, days),
+                    _decimal_power_interest(principal, rate, periods, days),
+                )
+
+    def test_whole_years(self):
+        self.assertEqual(compound_interest(Decimal('1000.00'), Decimal('5.00'), 1, 730), Decimal('102.50'))
+        self.assertEqual(compound_interest(Decimal('1000.00'), Decimal('0'), 12, 365), Decimal('0.00'))
+
+
+class AccrualTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.deposits = create_deposits(self.user, 40, seed=4)
+
+    def test_schedule_adds_up_to_gross_interest(self):
+        for step in ('month', 'day'):
+            for deposit in self.deposits:
+                rows = build_accruals(deposit, step)
+                self.assertEqual(sum(row.days for row in rows), max(deposit.days, 0))
+                self.assertEqual(sum((row.amount for row in rows), Decimal('0')), deposit.gross_interest_native())
+
+    def _assert_periods_match_proration(self):
+        rng = random.Random(5)
+        for deposit in self.deposits:
+            for _ in range(10):
+                start = deposit.start_date + timedelta(days=rng.randint(-400, 2000))
+                end = start + timedelta(days=rng.randint(0, 800))
+                self.assertEqual(calculate_interest_in_period(deposit, start, end), prorated(deposit, start, end))
+
+    def test_period_interest_matches_proration(self):
+        self.assertTrue(DepositAccrual.objects.exists())
+        self._assert_periods_match_proration()
+
+    @override_settings(DEPOSIT_ACCRUAL_GRANULARITY='day')
+    def test_daily_schedule_matches_proration(self):
+        regenerate_accruals(self.deposits[:10])
+        self.deposits = self.deposits[:10]
+        self._assert_periods_match_proration()
+
+    def test_schedule_sums_stay_within_the_error_bound(self):
+        rng = random.Random(6)
+        for deposit in self.deposits:
+            if deposit.days <= 0:
+                continue
+            for _ in range(10):
+                start = deposit.start_date + timedelta(days=rng.randint(0, deposit.days))
+                end = start + timedelta(days=rng.randint(1, 800))
+                overlap = (min(end, deposit.end_date) - start).days
+                exact = deposit.gross_interest_native() * overlap / deposit.days
+                accrued = accrued_in_period(deposit, start, end) or Decimal('0')
+                self.assertLessEqual(abs(accrued - exact), ACCRUAL_ERROR)
+
+    def test_periods_for_many_deposits_use_one_query(self):
+        start, end = date(2023, 7, 1), date(2024, 6, 30)
+        with self.assertNumQueries(1):
+            interest = calculate_interest_in_periods(self.deposits, start, end)
+        for deposit in self.deposits:
+            self.assertEqual(interest[deposit.pk], prorated(deposit, start, end))
+
+    def test_interest_to_date(self):
+        on = date(2023, 3, 15)
+        expected = {}
+        for deposit in self.deposits:
+            if deposit.days > 0:
+                elapsed = min(max((on - deposit.start_date).days, 0), deposit.days)
+                share = deposit.gross_interest_native() * elapsed / deposit.days
+                expected[deposit.currency] = expected.get(deposit.currency, Decimal('0')) + share
+        totals = interest_to_date(Deposit.objects.filter(user=self.user), on)
+        for currency, total in expected.items():
+            self.assertAlmostEqual(totals[currency], total.quantize(Decimal('0.01')), delta=Decimal('0.01'))
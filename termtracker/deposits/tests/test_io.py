@@ -0,0 +1,231 @@
+import csv
+import io
+import json
+from datetime import date
+from unittest import mock
+from decimal import Decimal
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import reverse
+
+from deposits import api
+from deposits.importers import import_csv
+from deposits.models import Deposit, DepositAccrual, Job, Pension
+from deposits.pagination import decode_cursor, encode_cursor, keyset_paginate
+
+from .factories import TestCase, create_deposits, create_pension, make_user
+
+
+DEPOSIT_CSV = """name,principal,annual_rate,compounding,currency,start_date,end_date,notes
+Good one,10000.00,4.50,ANNUAL,AUD,2024-01-01,2025-01-01,
+Bad rate,5000.00,lots,ANNUAL,AUD,2024-01-01,2025-01-01,
+Good two,2500.50,3.25,MONTHLY,GBP,2024-03-01,2024-09-01,note
+Bad currency,100.00,1.00,SIMPLE,USD,2024-01-01,2024-06-01,
+"""
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+
+    def test_dry_run_writes_nothing(self):
+        result = import_csv(io.StringIO(DEPOSIT_CSV), self.user, 'deposits', dry_run=True)
+        self.assertEqual((result.rows, result.valid, result.created), (4, 2, 0))
+        self.assertFalse(Deposit.objects.exists())
+
+    def test_error_rows_are_reported_by_line(self):
+        result = import_csv(io.StringIO(DEPOSIT_CSV), self.user, 'deposits', batch_size=1)
+        self.assertEqual(result.created, 2)
+        self.assertEqual([line for line, _ in result.errors], [3, 5])
+        self.assertIn('annual_rate', result.errors[0][1])
+        self.assertIn('currency', result.errors[1][1])
+
+    def test_imported_deposits_match_saved_ones(self):
+        import_csv(io.StringIO(DEPOSIT_CSV), self.user, 'deposits')
+        for deposit in Deposit.objects.filter(user=self.user):
+            self.assertEqual(deposit.interest_native, deposit._compute_gross_interest())
+            accrued = sum(DepositAccrual.objects.filter(deposit=deposit).values_list('amount', flat=True))
+            self.assertEqual(accrued, deposit.interest_native)
+
+    def test_deferred_accruals_queue_a_job(self):
+        result = import_csv(io.StringIO(DEPOSIT_CSV), self.user, 'deposits', defer_accruals=True)
+        self.assertEqual(result.job.kind, 'rebuild_accruals')
+        self.assertFalse(DepositAccrual.objects.exists())
+
+    def test_error_list_is_capped(self):
+        rows = 'name,monthly_amount,tax_paid,currency,notes\n' + 'x,abc,0,AUD,\n' * 5
+        result = import_csv(io.StringIO(rows), self.user, 'pensions', max_errors=2)
+        self.assertEqual((result.error_count, len(result.errors)), (5, 2))
+        self.assertTrue(result.errors_truncated)
+        self.assertFalse(Pension.objects.exists())
+
+
+@override_settings(PERF_METRICS_ENABLED=False)
+class ImportViewTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(make_user())
+
+    def _upload(self, content):
+        return self.client.post(reverse('import_portfolio'), {
+            'kind': 'deposits', 'file': SimpleUploadedFile('deposits.csv', content),
+        })
+
+    def test_import(self):
+        response = self._upload(DEPOSIT_CSV.encode())
+        self.assertContains(response, 'Imported 2 of 4 deposits rows.')
+
+    def test_undecodable_file_is_a_form_error(self):
+        response = self._upload(DEPOSIT_CSV.encode('utf-16'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response.context['form'], 'file', [
+            'The file is not UTF-8 text. Batches before the error may have been imported.',
+        ])
+
+    def test_malformed_csv_is_a_form_error(self):
+        response = self._upload(b'name,notes\nx,"' + b'y' * (csv.field_size_limit() + 1) + b'"\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('not valid CSV', response.context['form'].errors['file'][0])
+
+
+@override_settings(PERF_METRICS_ENABLED=False)
+class ExportTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.deposits = create_deposits(self.user, 30)
+        self.client.force_login(self.user)
+
+    def _content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_deposit_csv(self):
+        response = self.client.get(reverse('export_data', args=['deposits', 'csv']))
+        rows = list(csv.DictReader(io.StringIO(self._content(response))))
+        self.assertEqual(len(rows), 30)
+        by_id = {deposit.pk: deposit for deposit in self.deposits}
+        for row in rows:
+            self.assertEqual(Decimal(row['interest_native']), by_id[int(row['id'])].gross_interest_native())
+
+    def test_tax_ndjson(self):
+        response = self.client.get(reverse('export_data', args=['tax', 'ndjson']) + '?from=2021&to=2023')
+        rows = [json.loads(line) for line in self._content(response).splitlines()]
+        self.assertEqual([(row['year'], row['country']) for row in rows],
+                         [(year, country) for year in (2021, 2022, 2023) for country in ('uk', 'au')])
+
+    def test_tax_years_are_validated(self):
+        url = reverse('export_data', args=['tax', 'csv'])
+        for query in ('?from=x', '?from=2023&to=2021', '?from=1900&to=2100', '?from=99999&to=99999'):
+            with self.subTest(query):
+                response = self.client.get(url + query)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('detail', response.json())
+        self.assertEqual(self.client.get(url + '?from=2000&to=2049').status_code, 200)
+
+    def test_unknown_export(self):
+        self.assertEqual(self.client.get(reverse('export_data', args=['deposits', 'xml'])).status_code, 404)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        create_deposits(self.user, 57)
+
+    def test_pages_cover_every_row_in_order(self):
+        queryset = Deposit.objects.filter(user=self.user)
+        expected = list(queryset.order_by('end_date', 'pk').values_list('pk', flat=True))
+        seen, cursor = [], None
+        while True:
+            page = keyset_paginate(queryset, cursor, 10)
+            seen += [deposit.pk for deposit in page]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+
+    def test_open_ended_pensions_sort_last(self):
+        create_pension(self.user, name='open')
+        create_pension(self.user, name='ends', end_date=date(2030, 1, 1))
+        create_pension(self.user, name='open too')
+        queryset = Pension.objects.filter(user=self.user)
+        first = keyset_paginate(queryset, None, 2)
+        second = keyset_paginate(queryset, first.next_cursor, 2)
+        self.assertEqual([p.name for p in first] + [p.name for p in second], ['ends', 'open', 'open too'])
+        self.assertFalse(second.has_next)
+
+    def test_cursors(self):
+        deposit = Deposit.objects.filter(user=self.user).first()
+        self.assertEqual(decode_cursor(encode_cursor(deposit)), (deposit.end_date, deposit.pk))
+        self.assertIsNone(decode_cursor('garbage'))
+        self.assertEqual(len(keyset_paginate(Deposit.objects.filter(user=self.user), 'garbage', 10)), 10)
+
+
+class FakeDate(date):
+    today_value = date(2024, 3, 1)
+
+    @classmethod
+    def today(cls):
+        return cls.today_value
+
+
+@override_settings(PERF_METRICS_ENABLED=False)
+class ApiTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.deposits = create_deposits(self.user, 5)
+        self.client.force_login(self.user)
+
+    def test_not_modified(self):
+        url = reverse('api_dashboard')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_deposits'], 5)
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_etag_changes_with_the_data(self):
+        url = reverse('api_deposits')
+        etag = self.client.get(url)['ETag']
+        self.deposits[0].principal += 1
+        self.deposits[0].save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etags_change_with_the_valuation_date(self):
+        for name in ('api_accruals', 'api_deposits', 'api_dashboard'):
+            url = reverse(name)
+            with self.subTest(name), mock.patch.object(api, 'date', FakeDate):
+                response = self.client.get(url)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+                with mock.patch.object(FakeDate, 'today_value', date(2024, 3, 2)):
+                    self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_history_etag_changes_with_the_default_window(self):
+        url = reverse('api_portfolio_history')
+        with mock.patch.object(api, 'date', FakeDate):
+            response = self.client.get(url)
+            self.assertEqual(response.json()['to'], '2024-03-01')
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+            with mock.patch.object(FakeDate, 'today_value', date(2024, 3, 2)):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_deposit_pages(self):
+        url = reverse('api_deposits')
+        first = self.client.get(url, {'limit': 3}).json()
+        second = self.client.get(url, {'limit': 3, 'after': first['next']}).json()
+        self.assertEqual(len(first['results']) + len(second['results']), 5)
+        self.assertIsNone(second['next'])
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_deposits')).status_code, 401)
+
+    def test_tax_obligations(self):
+        data = self.client.get(reverse('api_tax_obligations', args=[2023])).json()
+        self.assertEqual(data['year'], 2023)
+        self.assertEqual(set(data), {'year', 'uk', 'au'})
+        for year in (1899, 2201, 99999):
+            self.assertEqual(self.client.get(reverse('api_tax_obligations', args=[year])).status_code, 404)
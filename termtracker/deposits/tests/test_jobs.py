@@ -0,0 +1,161 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from deposits import jobs
+from deposits.models import Deposit, DepositAccrual, Job, PortfolioSnapshot
+from deposits.profiles import get_tax_profiles
+from deposits.reports import fleet_rows
+from deposits.snapshots import take_snapshots
+from deposits.utils import calculate_tax_obligations
+
+from .factories import TestCase, create_deposits, create_pension, make_user
+
+
+def run_next(worker='test'):
+    """Claim and run one due job in this process, as ``run_worker`` does."""
+    (claimed,) = jobs.claim(worker)
+    try:
+        return jobs.finish(claimed.pk, result=jobs.execute(claimed.pk))
+    except Exception as error:
+        return jobs.finish(claimed.pk, error=jobs.format_error(error))
+
+
+@jobs.job('test_fail')
+def _fail():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.deposits = create_deposits(self.user, 4)
+
+    def test_unique_jobs_are_not_queued_twice(self):
+        first = jobs.enqueue('rebuild_accruals', unique=True, user_id=self.user.pk)
+        self.assertEqual(jobs.enqueue('rebuild_accruals', unique=True, user_id=self.user.pk), first)
+        self.assertNotEqual(jobs.enqueue('rebuild_accruals', user_id=self.user.pk), first)
+        with self.assertRaises(ValueError):
+            jobs.enqueue('no_such_job')
+
+    def test_job_runs_once(self):
+        DepositAccrual.objects.all().delete()
+        jobs.enqueue('rebuild_accruals', user_id=self.user.pk, missing=True)
+        finished = run_next()
+        self.assertEqual((finished.status, finished.result), (Job.DONE, {'deposits': 4}))
+        self.assertEqual(jobs.claim('test'), [])
+        self.assertTrue(DepositAccrual.objects.filter(deposit=self.deposits[0]).exists())
+
+    @override_settings(JOB_RETRY_DELAY=0)
+    def test_failures_are_retried_then_failed(self):
+        queued = jobs.enqueue('test_fail')
+        for attempt in range(1, queued.max_attempts + 1):
+            finished = run_next()
+            self.assertEqual(finished.attempts, attempt)
+        self.assertEqual(finished.status, Job.FAILED)
+        self.assertIn('boom', finished.error)
+
+    def test_stale_jobs_are_requeued(self):
+        queued = jobs.enqueue('rebuild_accruals')
+        jobs.claim('dead worker')
+        Job.objects.filter(pk=queued.pk).update(started_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(Job.objects.get(pk=queued.pk).status, Job.QUEUED)
+
+
+class FleetReportTests(TestCase):
+    def test_rows_match_per_user_obligations(self):
+        users = [make_user(f'user{n}') for n in range(3)]
+        for n, user in enumerate(users[:2]):
+            create_deposits(user, 15, seed=n)
+            create_pension(user, start_date=date(2020, 5, 5))
+        rows = list(fleet_rows(users[0].pk, users[-1].pk, 2023))
+        self.assertEqual([row['user_id'] for row in rows], [user.pk for user in users])
+        for user, row in zip(users, rows):
+            deposits = list(Deposit.objects.filter(user=user))
+            obligations = calculate_tax_obligations(deposits, 2023, *get_tax_profiles(user))
+            self.assertEqual(row['estimated_tax_au'], obligations['au']['tax_owed'])
+            self.assertEqual(row['tax_year_interest_uk'], obligations['uk']['total_interest'])
+            self.assertEqual(row['interest_aud'], sum(
+                (d.gross_interest_native() for d in deposits if d.currency == Deposit.AUD), Decimal('0.00'),
+            ))
+
+
+@override_settings(PERF_METRICS_ENABLED=False)
+class AdminActionTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com')
+        self.client.force_login(self.admin)
+        self.deposits = create_deposits(make_user(), 5)
+
+    def _post(self, action, **values):
+        return self.client.post(reverse('admin:deposits_deposit_changelist'), {
+            'action': action, '_selected_action': [d.pk for d in self.deposits[:3]], **values,
+        }, follow=True)
+
+    def test_set_annual_rate(self):
+        self._post('set_annual_rate', annual_rate='7.25')
+        changed = Deposit.objects.filter(pk__in=[d.pk for d in self.deposits[:3]])
+        self.assertEqual(set(changed.values_list('annual_rate', flat=True)), {Decimal('7.25')})
+        self.assertFalse(changed.filter(interest_native__isnull=False).exists())
+        self.assertFalse(DepositAccrual.objects.filter(deposit__in=changed).exists())
+        self.assertEqual(set(Job.objects.values_list('kind', flat=True)), {'rebuild_interest_cache', 'rebuild_accruals'})
+
+        run_next()
+        run_next()
+        for deposit in changed:
+            self.assertEqual(deposit.interest_native, deposit._compute_gross_interest())
+
+    def test_invalid_rate_is_reported(self):
+        response = self._post('set_annual_rate', annual_rate='abc')
+        self.assertContains(response, 'Rate %')
+        self.assertFalse(Job.objects.exists())
+
+    def test_changelist(self):
+        response = self.client.get(reverse('admin:deposits_deposit_changelist'), {'maturity': 'matured'})
+        self.assertEqual(response.status_code, 200)
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.deposits = create_deposits(self.user, 20, seed=8)
+
+    def _expected(self, day):
+        values = dict.fromkeys(['principal_aud', 'principal_gbp', 'interest_aud', 'interest_gbp'], Decimal('0'))
+        for deposit in self.deposits:
+            if deposit.start_date <= day < deposit.end_date:
+                suffix = deposit.currency.lower()
+                values[f'principal_{suffix}'] += deposit.principal
+                share = deposit.gross_interest_native() * (day - deposit.start_date).days / deposit.days
+                values[f'interest_{suffix}'] += share.quantize(Decimal('0.01'))
+        return values
+
+    def test_snapshots_match_the_deposits(self):
+        on = date(2023, 6, 30)
+        result = take_snapshots(on, since=on - timedelta(days=400))
+        self.assertEqual((result['new'], result['rows']), (1, 401))
+        for snapshot in PortfolioSnapshot.objects.filter(user=self.user)[::37]:
+            for field, value in self._expected(snapshot.date).items():
+                self.assertEqual(getattr(snapshot, field), value, (snapshot.date, field))
+
+    def test_unchanged_users_are_extended_and_changed_ones_recomputed(self):
+        on = date(2023, 6, 30)
+        take_snapshots(on, since=on - timedelta(days=10))
+        self.assertEqual(take_snapshots(on + timedelta(days=2))['extended'], 1)
+        self.assertEqual(take_snapshots(on + timedelta(days=2))['rows'], 0)
+
+        deposit = self.deposits[0]
+        deposit.principal += 1000
+        deposit.save()
+        result = take_snapshots(on + timedelta(days=2))
+        self.assertEqual((result['recomputed'], result['rows']), (1, 13))
+        for snapshot in PortfolioSnapshot.objects.filter(user=self.user):
+            self.assertEqual(snapshot.principal_aud, self._expected(snapshot.date)['principal_aud'])
@@ -0,0 +1,76 @@
+import itertools
+import random
+from datetime import date
+from decimal import Decimal
+
+from deposits.ladder import Offer, _add_months, optimize_ladder
+from deposits.models import Deposit
+
+from .factories import TestCase, default_profiles
+
+
+START = date(2026, 1, 1)
+
+
+def brute_force(amount, offers, min_per_quarter, quarters, units, profile):
+    """Best after-tax interest over every split of ``amount`` into
+    ``units`` steps, or None when no split meets the limits."""
+    best = None
+    for steps in itertools.product(range(units + 1), repeat=len(offers)):
+        if sum(steps) != units:
+            continue
+        value, maturing = Decimal('0'), {}
+        for offer, k in zip(offers, steps):
+            principal = (amount * k / units).quantize(Decimal('0.01'))
+            if k and (principal < offer.min_amount or (offer.max_amount is not None and principal > offer.max_amount)):
+                break
+            maturing[offer.quarter] = maturing.get(offer.quarter, 0) + principal
+            if k:
+                deposit = Deposit(principal=principal, annual_rate=offer.annual_rate, compounding=offer.compounding,
+                                  currency=Deposit.AUD, start_date=START, end_date=_add_months(START, offer.term_months))
+                value += deposit.gross_interest_native() - deposit.estimated_tax(profile)
+        else:
+            if all(maturing.get(quarter, 0) >= min_per_quarter for quarter in range(1, quarters + 1)):
+                best = value if best is None else max(best, value)
+    return best
+
+
+class LadderTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.profile_au, self.profile_uk = default_profiles()
+
+    def _optimize(self, amount, offers, min_per_quarter, quarters, units=10):
+        return optimize_ladder(Decimal(amount), offers, self.profile_au, self.profile_uk,
+                               min_per_quarter=Decimal(min_per_quarter), quarters=quarters, start=START, units=units)
+
+    def test_matches_brute_force(self):
+        rng = random.Random(5)
+        for case in range(30):
+            offers = [
+                Offer(rng.choice([3, 6, 9, 12, 18, 24]), Decimal(rng.randrange(300, 600)) / 100,
+                      rng.choice([Deposit.SIMPLE, Deposit.MONTHLY, Deposit.ANNUAL]),
+                      min_amount=rng.choice([0, 0, 20000]), max_amount=rng.choice([None, None, 40000]))
+                for _ in range(4)
+            ]
+            min_per_quarter, quarters = rng.choice([0, 10000, 20000]), rng.choice([0, 2, 4])
+            expected = brute_force(Decimal('100000'), offers, min_per_quarter, quarters, 10, self.profile_au)
+            with self.subTest(case=case):
+                try:
+                    ladder = self._optimize('100000', offers, min_per_quarter, quarters)
+                except ValueError:
+                    ladder = None
+                got = ladder['after_tax'] if ladder and not ladder['uninvested'] else None
+                self.assertEqual(got, expected)
+
+    def test_infeasible_quarter_is_reported(self):
+        offers = [Offer(3, '4', max_amount=50), Offer(6, '5')]
+        with self.assertRaises(ValueError):
+            self._optimize('1000', offers, '100', 2)
+
+    def test_ladder_meets_the_quarterly_minimum(self):
+        offers = [Offer(3, '4.10', Deposit.MONTHLY), Offer(6, '4.60'), Offer(12, '5.00', max_amount=60000)]
+        ladder = self._optimize('200000', offers, '25000', 2, units=200)
+        self.assertEqual(sum(a['principal'] for a in ladder['allocations']) + ladder['uninvested'], Decimal('200000'))
+        for quarter in ladder['maturing'][:2]:
+            self.assertGreaterEqual(quarter['principal'], Decimal('25000'))
@@ -0,0 +1,214 @@
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from deposits import async_views, perf, views
+from deposits.db import atomic_write
+from deposits.interest import InterestBatch
+from deposits.perf import read_records, summarize
+
+from .factories import TestCase, TransactionTestCase, create_deposits, make_user
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.metrics = Path(directory.name) / 'metrics.jsonl'
+        self.user = make_user()
+        create_deposits(self.user, 3)
+        self.client.force_login(self.user)
+
+    def test_records_each_request(self):
+        with override_settings(PERF_METRICS_FILE=self.metrics):
+            self.client.get(reverse('dashboard'))
+            self.client.get(reverse('dashboard'))
+            self.client.get(reverse('deposit_list'))
+            perf.flush_records()
+            records = read_records()
+        self.assertEqual([record['view'] for record in records], ['dashboard', 'dashboard', 'deposit_list'])
+        self.assertGreater(records[0]['db_queries'], 0)
+        self.assertIn('deposits.utils.summarize_deposits', records[0]['functions'])
+        summary = summarize(records)
+        self.assertEqual(summary['dashboard']['requests'], 2)
+        self.assertLessEqual(summary['dashboard']['p50_ms'], summary['dashboard']['p95_ms'])
+
+    def test_records_rotate(self):
+        with override_settings(PERF_METRICS_FILE=self.metrics, PERF_METRICS_MAX_BYTES=10):
+            self.client.get(reverse('home'))
+            perf.flush_records()
+            self.client.get(reverse('home'))
+            perf.flush_records()
+            self.assertEqual(len(read_records()), 1)
+        self.assertTrue(self.metrics.with_suffix('.jsonl.1').exists())
+
+    def test_concurrent_writers_rotate_once(self):
+        with override_settings(PERF_METRICS_FILE=self.metrics):
+            for n in range(20):
+                perf.append_record({'view': 'old', 'ts': n, 'wall_ms': 1.0, 'functions': {}})
+        # The next record finds the file over the limit and rotates it
+        with override_settings(PERF_METRICS_FILE=self.metrics, PERF_METRICS_MAX_BYTES=self.metrics.stat().st_size - 1):
+            replace = os.replace
+
+            def slow_replace(*args):
+                time.sleep(0.05)
+                replace(*args)
+
+            with mock.patch('deposits.perf.os.replace', side_effect=slow_replace):
+                writers = [
+                    threading.Thread(target=perf.append_record, args=({'view': 'new', 'ts': n, 'wall_ms': 1.0, 'functions': {}},))
+                    for n in range(4)
+                ]
+                for writer in writers:
+                    writer.start()
+                for writer in writers:
+                    writer.join()
+            current = read_records()
+        rotated = self.metrics.with_suffix('.jsonl.1').read_text().splitlines()
+        self.assertEqual(len(rotated), 20)
+        self.assertEqual(sorted(record['ts'] for record in current), [0, 1, 2, 3])
+
+    def test_requests_only_queue_their_records(self):
+        writers = []
+
+        def append(records):
+            writers.append((threading.current_thread().name, len(records)))
+
+        async def get_async_response(request):
+            return HttpResponse('ok')
+
+        request = RequestFactory().get(reverse('home'))
+        with mock.patch('deposits.perf.append_records', side_effect=append):
+            perf.PerformanceMiddleware(lambda request: HttpResponse('ok'))(request)
+            async_to_sync(perf.PerformanceMiddleware(get_async_response))(request)
+            perf.flush_records()
+        self.assertEqual({name for name, _ in writers}, {'perf-writer'})
+        self.assertEqual(sum(count for _, count in writers), 2)
+
+    def test_disabled(self):
+        with override_settings(PERF_METRICS_FILE=self.metrics, PERF_METRICS_ENABLED=False):
+            self.client.get(reverse('home'))
+        self.assertFalse(self.metrics.exists())
+
+
+@override_settings(PERF_METRICS_ENABLED=False)
+class PerfReportViewTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com'))
+
+    def test_since(self):
+        self.assertEqual(self.client.get(reverse('perf_report'), {'since': '1700000000'}).status_code, 200)
+        self.assertEqual(self.client.get(reverse('perf_report'), {'since': 'x'}).status_code, 400)
+
+
+@override_settings(PERF_METRICS_ENABLED=False)
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.deposits = create_deposits(self.user, 5)
+        self.client.force_login(self.user)
+
+    def test_cards_are_served_from_the_cache(self):
+        first = self.client.get(reverse('dashboard')).content
+        hits = perf.cache_stats()['hits']
+        second = self.client.get(reverse('dashboard')).content
+        self.assertEqual(first, second)
+        self.assertGreaterEqual(perf.cache_stats()['hits'] - hits, len(self.deposits))
+
+    def test_cache_hits_do_no_interest_work(self):
+        with mock.patch.object(InterestBatch, 'prime', autospec=True, side_effect=InterestBatch.prime) as prime:
+            first = self.client.get(reverse('dashboard')).content
+            self.assertEqual(prime.call_count, 1)
+            self.assertEqual(self.client.get(reverse('dashboard')).content, first)
+            self.assertEqual(prime.call_count, 1)
+
+    def test_edited_deposit_is_rendered_again(self):
+        self.client.get(reverse('dashboard'))
+        deposit = self.deposits[0]
+        deposit.name = 'Renamed deposit'
+        deposit.save()
+        self.assertContains(self.client.get(reverse('dashboard')), 'Renamed deposit')
+
+
+def _without_csrf(content):
+    return re.sub(rb'name="csrfmiddlewaretoken" value="[^"]*"', b'', content)
+
+
+@override_settings(PERF_METRICS_ENABLED=False)
+class AsyncViewTests(TransactionTestCase):
+    """The async views render the same pages as the sync ones."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        create_deposits(self.user, 30)
+
+    def _request(self, path):
+        request = RequestFactory().get(path)
+        request.user = self.user
+
+        async def auser():
+            return self.user
+        request.auser = auser
+        return request
+
+    def test_bad_years_fall_back_to_the_current_year(self):
+        from django.utils import timezone
+
+        for query in ('?year=abc', '?year=99999', '?year=1066'):
+            with self.subTest(query):
+                path = reverse('tax_obligations') + query
+                sync = views.tax_obligations(self._request(path))
+                asynchronous = async_to_sync(async_views.tax_obligations)(self._request(path))
+                self.assertEqual(sync.status_code, 200)
+                self.assertIn(f'value="{timezone.now().year}" selected'.encode(), sync.content)
+                self.assertEqual(_without_csrf(asynchronous.content), _without_csrf(sync.content))
+
+    def test_same_output(self):
+        for name, query in (('dashboard', '?page=2'), ('tax_obligations', '?year=2023'), ('deposit_list', '')):
+            with self.subTest(name):
+                sync = getattr(views, name)(self._request(reverse(name) + query))
+                asynchronous = async_to_sync(getattr(async_views, name))(self._request(reverse(name) + query))
+                self.assertEqual(_without_csrf(asynchronous.content), _without_csrf(sync.content))
+
+    def test_dashboard_is_paginated_from_the_summary_count(self):
+        from django.db.models.query import QuerySet
+
+        with mock.patch.object(QuerySet, 'count', side_effect=AssertionError('extra COUNT query')):
+            response = async_to_sync(async_views.dashboard)(self._request(reverse('dashboard') + '?page=2'))
+        self.assertEqual(response.status_code, 200)
+
+
+class AtomicWriteTests(TransactionTestCase):
+    @override_settings(DB_BUSY_RETRY_DELAY=0)
+    def test_retries_while_the_database_is_locked(self):
+        calls = []
+
+        def write():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'written'
+
+        self.assertEqual(atomic_write(write), 'written')
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_are_not_retried(self):
+        write = mock.Mock(side_effect=OperationalError('no such table: x'))
+        with self.assertRaises(OperationalError):
+            atomic_write(write)
+        self.assertEqual(write.call_count, 1)
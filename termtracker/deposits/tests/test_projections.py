@@ -0,0 +1,37 @@
+from datetime import date
+
+from deposits.models import Deposit
+from deposits.projections import Scenario, project_portfolio
+
+from .factories import TestCase, create_deposits, create_pension, default_profiles, make_user
+
+
+class ProjectionTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        user = make_user()
+        create_deposits(user, 20, seed=9)
+        self.deposits = list(Deposit.objects.filter(user=user, end_date__gt=date(2024, 1, 1)))
+        self.pensions = [create_pension(user, start_date=date(2023, 1, 15))]
+        self.profiles = default_profiles(user)
+
+    def _run(self, **options):
+        return project_portfolio(self.deposits, *self.profiles, pensions=self.pensions, years=3, paths=400,
+                                 today=date(2024, 1, 1), time_budget=60, **options)
+
+    def test_seeded_runs_are_reproducible(self):
+        first, second = self._run(seed=11), self._run(seed=11)
+        self.assertEqual(first['value'], second['value'])
+        self.assertEqual(first['after_tax_income'], second['after_tax_income'])
+        self.assertEqual(first['paths'], 400)
+
+    def test_bands_are_ordered(self):
+        result = self._run(seed=12, scenario=Scenario(rate_volatility=0.02, fx_volatility=0.2))
+        self.assertEqual([point['date'] for point in result['value']][:1], [date(2025, 1, 1)])
+        for point in result['value']:
+            self.assertEqual(point['bands'], sorted(point['bands']))
+
+    def test_without_volatility_every_path_agrees(self):
+        result = self._run(seed=13, scenario=Scenario(rate_volatility=0, fx_volatility=0))
+        for point in result['value']:
+            self.assertAlmostEqual(point['bands'][0], point['bands'][-1], places=2)
@@ -0,0 +1,227 @@
+import calendar
+import os
+import random
+import subprocess
+import sys
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from deposits.cashflows import PensionCashflows
+from deposits.models import Deposit, Pension, TaxProfile
+from deposits import profiles
+from deposits.profiles import create_tax_profiles, get_tax_profiles
+from deposits.utils import (
+    calculate_tax_obligations, calculate_tax_obligations_for_years, deposits_in_tax_years, get_tax_year_period,
+    summarize_deposits,
+)
+
+from .factories import TestCase, create_deposits, create_pension, make_user
+
+
+class SummarizeDepositsTests(TestCase):
+    def test_totals_match_per_deposit_values(self):
+        user = make_user()
+        deposits = create_deposits(user, 60)
+        profile_au, profile_uk = get_tax_profiles(user)
+        totals = summarize_deposits(Deposit.objects.filter(user=user), profile_au, profile_uk)
+        self.assertEqual(totals['total_deposits'], 60)
+        for currency in (Deposit.AUD, Deposit.GBP):
+            key = currency.lower()
+            self.assertEqual(
+                totals[f'total_principal_{key}'], sum(d.principal for d in deposits if d.currency == currency),
+            )
+            self.assertEqual(totals[f'total_interest_{key}'], sum(d.interest_in(currency) for d in deposits))
+        self.assertEqual(totals['total_interest_native'], sum(d.gross_interest_native() for d in deposits))
+        self.assertEqual(
+            totals['total_tax_au'], (totals['total_interest_aud'] * profile_au.marginal_rate / 100).quantize(Decimal('0.01')),
+        )
+
+    def test_uncached_rows_are_computed_without_writing(self):
+        user = make_user()
+        create_deposits(user, 30)
+        deposits = Deposit.objects.filter(user=user)
+        profiles = get_tax_profiles(user)
+        expected = summarize_deposits(deposits, *profiles)
+        deposits.filter(pk__in=list(deposits.values_list('pk', flat=True)[:10])).update(
+            interest_native=None, interest_aud=None, interest_gbp=None,
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(summarize_deposits(deposits, *profiles), expected)
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in queries))
+        self.assertEqual(deposits.filter(interest_native__isnull=True).count(), 10)
+
+    def test_empty_portfolio(self):
+        user = make_user()
+        totals = summarize_deposits(Deposit.objects.filter(user=user), *get_tax_profiles(user))
+        self.assertEqual(totals['total_deposits'], 0)
+        self.assertEqual(totals['total_interest_aud'], Decimal('0.00'))
+
+
+class TaxObligationsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.deposits = create_deposits(self.user, 80, seed=6)
+        create_pension(self.user, start_date=date(2021, 3, 10), end_date=date(2024, 9, 9))
+        create_pension(self.user, currency=Deposit.GBP, monthly_amount=Decimal('800.00'), tax_paid=Decimal('90.00'))
+        self.profile_au, self.profile_uk = get_tax_profiles(self.user)
+
+    def test_sweep_matches_per_year_results(self):
+        years = range(2018, 2030)
+        swept = calculate_tax_obligations_for_years(
+            Deposit.objects.filter(user=self.user), years, self.profile_au, self.profile_uk,
+        )
+        for year in years:
+            self.assertEqual(
+                swept[year],
+                calculate_tax_obligations(self.deposits, year, self.profile_au, self.profile_uk),
+            )
+
+    def test_interest_matches_scalar_proration(self):
+        from deposits.utils import calculate_interest_in_period
+
+        year = 2023
+        obligations = calculate_tax_obligations(self.deposits, year, self.profile_au, self.profile_uk)
+        for country, key, currency in (('AU', 'au', Deposit.AUD), ('GB', 'uk', Deposit.GBP)):
+            start, end = get_tax_year_period(year, country)
+            expected = sum(
+                (calculate_interest_in_period(d, start, end) for d in self.deposits if d.currency == currency),
+                Decimal('0.00'),
+            )
+            self.assertEqual(obligations[key]['total_interest'], expected)
+
+    def test_overlap_filter_keeps_every_contributing_deposit(self):
+        years = [2022, 2023]
+        kept = set(deposits_in_tax_years(Deposit.objects.filter(user=self.user), years).values_list('pk', flat=True))
+        for deposit in self.deposits:
+            country = 'AU' if deposit.currency == Deposit.AUD else 'GB'
+            start, end = get_tax_year_period(years[0], country)[0], get_tax_year_period(years[-1], country)[1]
+            self.assertEqual(deposit.pk in kept, deposit.end_date >= start and deposit.start_date <= end)
+
+    def test_tax_owed(self):
+        obligations = calculate_tax_obligations([], 2022, self.profile_au, self.profile_uk)
+        au = obligations['au']
+        # 12 payments of 1000.00 under the 18,500 threshold
+        self.assertEqual(au['total_pension'], Decimal('12000.00'))
+        self.assertEqual(au['total_tax_paid'], Decimal('1800.00'))
+        self.assertEqual(au['taxable_income'], Decimal('0.00'))
+        self.assertEqual(au['tax_owed'], Decimal('0.00'))
+
+
+def scheduled_payments(pension, period_start, period_end):
+    """Payments made in a period, by walking the monthly schedule."""
+    paid_on = pension.start_date or pension.end_date
+    anchor = paid_on.day if paid_on else 1
+    count = 0
+    year, month = period_start.year, period_start.month
+    while date(year, month, 1) <= period_end:
+        day = date(year, month, min(anchor, calendar.monthrange(year, month)[1]))
+        if (period_start <= day <= period_end and (pension.start_date is None or day >= pension.start_date)
+                and (pension.end_date is None or day <= pension.end_date)):
+            count += 1
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return count
+
+
+class PensionCashflowsTests(TestCase):
+    def test_payment_counts_match_schedule(self):
+        rng = random.Random(7)
+
+        def random_day():
+            return date(2015, 1, 1) + timedelta(days=rng.randrange(5000))
+
+        pensions = []
+        for _ in range(100):
+            start = random_day() if rng.random() < 0.8 else None
+            end = random_day() if rng.random() < 0.7 else None
+            if start and end and end < start:
+                start, end = end, start
+            if start and rng.random() < 0.3:
+                # Month-end anchors are clamped in shorter months
+                start = start.replace(day=calendar.monthrange(start.year, start.month)[1])
+            pensions.append(Pension(monthly_amount=Decimal('1000.10'), tax_paid=Decimal('5.05'), currency='AUD',
+                                    start_date=start, end_date=end))
+        periods = []
+        for _ in range(30):
+            start = random_day()
+            periods.append((start, start + timedelta(days=rng.randrange(800))))
+
+        counts = PensionCashflows(pensions).payment_counts(periods)
+        for i, pension in enumerate(pensions):
+            for j, (start, end) in enumerate(periods):
+                self.assertEqual(counts[i, j], scheduled_payments(pension, start, end), (pension.start_date,
+                                                                                        pension.end_date, start, end))
+
+    def test_totals_by_period(self):
+        pensions = [
+            Pension(monthly_amount=Decimal('1000.10'), tax_paid=Decimal('5.05'), currency='AUD',
+                    start_date=date(2022, 1, 31), end_date=date(2022, 6, 29)),
+            Pension(monthly_amount=Decimal('50.00'), tax_paid=Decimal('0'), currency='GBP'),
+        ]
+        cashflows = PensionCashflows(pensions)
+        # Jan 31, Feb 28, Mar 31, Apr 30, May 31; the June payment is after the end date
+        self.assertEqual(
+            cashflows.totals_in_period(date(2022, 1, 1), date(2022, 12, 31), 'AUD'),
+            (Decimal('5000.50'), Decimal('25.25')),
+        )
+        self.assertEqual(cashflows.totals_in_period(date(2022, 1, 1), date(2022, 12, 31), 'GBP')[0], Decimal('600.00'))
+        self.assertEqual(PensionCashflows([]).totals_by_period([], 'AUD'), [])
+
+
+class TaxProfileTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+
+    def test_created_once_then_cached(self):
+        profile_au, profile_uk = get_tax_profiles(self.user)
+        self.assertEqual((profile_au.country, profile_uk.country), (TaxProfile.AU, TaxProfile.GB))
+        self.assertEqual(TaxProfile.objects.filter(user=self.user).count(), 2)
+        with CaptureQueriesContext(connection) as queries:
+            get_tax_profiles(self.user)
+        self.assertEqual(len(queries), 0)
+
+    def test_created_with_the_user(self):
+        countries = TaxProfile.objects.filter(user=self.user).values_list('country', flat=True)
+        self.assertEqual(sorted(countries), [TaxProfile.AU, TaxProfile.GB])
+        with transaction.atomic(), self.assertRaises(IntegrityError):
+            TaxProfile.objects.create(user=self.user, country=TaxProfile.AU)
+
+    def test_missing_profiles_are_recreated_without_duplicates(self):
+        TaxProfile.objects.filter(user=self.user, country=TaxProfile.GB).delete()
+        TaxProfile.objects.filter(user=self.user).update(marginal_rate=Decimal('45.00'))
+        profile_au, profile_uk = get_tax_profiles(self.user)
+        self.assertEqual((profile_au.marginal_rate, profile_uk.country), (Decimal('45.00'), TaxProfile.GB))
+        # A second request that also saw them missing changes nothing
+        create_tax_profiles(self.user)
+        self.assertEqual(TaxProfile.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(get_tax_profiles(self.user)[0].marginal_rate, Decimal('45.00'))
+
+    def test_saving_a_profile_invalidates_the_cache(self):
+        profile_au, _ = get_tax_profiles(self.user)
+        profile_au.marginal_rate = Decimal('45.00')
+        profile_au.save()
+        self.assertEqual(get_tax_profiles(self.user)[0].marginal_rate, Decimal('45.00'))
+
+    def test_invalidation_is_seen_by_other_processes(self):
+        key = profiles._cache_key(self.user.pk)
+        location = str(settings.CACHES[settings.TAX_PROFILE_CACHE]['LOCATION'])
+        # Another process opening the same cache, as a second server worker would
+        cached_elsewhere = [
+            sys.executable, '-c',
+            'import django, sys; django.setup(); '
+            'from django.core.cache.backends.filebased import FileBasedCache; '
+            f'sys.exit(FileBasedCache({location!r}, {{}}).get({key!r}) is None)',
+        ]
+        env = {**os.environ}
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'termtracker.settings')
+        get_tax_profiles(self.user)
+        self.assertEqual(subprocess.run(cached_elsewhere, cwd=settings.BASE_DIR, env=env).returncode, 0)
+        profile_au = get_tax_profiles(self.user)[0]
+        profile_au.marginal_rate = Decimal('45.00')
+        profile_au.save()
+        self.assertEqual(subprocess.run(cached_elsewhere, cwd=settings.BASE_DIR, env=env).returncode, 1)
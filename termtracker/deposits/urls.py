@@ -1,28 +1,61 @@
+from django.conf import settings
 from django.contrib.auth import views as auth_views
 from django.urls import path
-from . import views
+from . import api, views
+
+if settings.ASYNC_VIEWS:
+    from . import async_views as page_views
+else:
+    page_views = views
 
 urlpatterns = [
     # Deposits
-    path('deposits/', views.deposit_list, name='deposit_list'),
+    path('deposits/', page_views.deposit_list, name='deposit_list'),
     path('deposits/new/', views.deposit_create, name='deposit_create'),
     path('deposits/<int:pk>/edit/', views.deposit_edit, name='deposit_edit'),
     path('deposits/<int:pk>/delete/', views.deposit_delete, name='deposit_delete'),
 
     # Pensions
-    path('pensions/', views.pension_list, name='pension_list'),
+    path('pensions/', page_views.pension_list, name='pension_list'),
     path('pensions/new/', views.pension_create, name='pension_create'),
     path('pensions/<int:pk>/edit/', views.pension_edit, name='pension_edit'),
     path('pensions/<int:pk>/delete/', views.pension_delete, name='pension_delete'),
 
+    # Bulk import
+    path('import/', views.import_portfolio, name='import_portfolio'),
+
+    # Exports
+    path('export/<str:dataset>.<str:fmt>', views.export_data, name='export_data'),
+
+    # JSON API
+    path('api/deposits/', api.deposits, name='api_deposits'),
+    path('api/pensions/', api.pensions, name='api_pensions'),
+    path('api/dashboard/', api.dashboard, name='api_dashboard'),
+    path('api/tax-obligations/<int:year>/', api.tax_obligations, name='api_tax_obligations'),
+    path('api/accruals/', api.accruals, name='api_accruals'),
+    path('api/portfolio-history/', api.portfolio_history, name='api_portfolio_history'),
+
     # Registration
     path('accounts/register/', views.register_view, name='register'),
 
     # Dashboard
-    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/', page_views.dashboard, name='dashboard'),
     
     # Tax Obligations
-    path('tax-obligations/', views.tax_obligations, name='tax_obligations'),
+    path('tax-obligations/', page_views.tax_obligations, name='tax_obligations'),
+
+    # Monte Carlo projections
+    path('projections/', views.projections, name='projections'),
+
+    # Term-deposit ladder optimizer
+    path('ladder/', views.ladder, name='ladder'),
+
+    # Performance metrics (staff only)
+    path('perf/', views.perf_report, name='perf_report'),
+
+    # Background jobs (staff only)
+    path('jobs/', views.job_status, name='job_status'),
+    path('jobs/<int:pk>/retry/', views.job_retry, name='job_retry'),
 
     # Logout
     path('logout/', views.logout_view, name='logout'),
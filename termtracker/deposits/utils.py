@@ -1,6 +1,18 @@
 from datetime import date, datetime
 from decimal import Decimal
-from .models import Deposit, Pension
+
+from django.db.models import BigIntegerField, Case, Count, ExpressionWrapper, F, Q, Sum, Value, When
+from django.db.models.functions import Cast, Round
+from django.db.models.lookups import Exact, GreaterThan
+from .accruals import ACCRUAL_ERROR, accrued_in_periods
+from .cashflows import PensionCashflows
+from .interest import FX_SCALE, InterestBatch, _fixed_point, _to_decimal
+from .models import Deposit, DepositQuerySet, Pension
+from .perf import timed
+
+
+# Tax years the app accepts from requests; get_tax_year_period works far beyond
+TAX_YEARS = range(1900, 2201)
 
 
 def get_tax_year_period(year, country):
@@ -19,117 +31,238 @@ def get_tax_year_period(year, country):
 def calculate_interest_in_period(deposit, period_start, period_end):
     """Calculate interest earned by a deposit within a specific period.
     
-    Returns the interest amount earned during the period.
+    Returns the interest amount earned during the period, summed from the
+    deposit's accrual schedule when it has one.
     """
-    # If deposit doesn't overlap with period, return 0
-    if deposit.end_date < period_start or deposit.start_date > period_end:
-        return Decimal('0.00')
-    
-    # Calculate the overlapping period
-    overlap_start = max(deposit.start_date, period_start)
-    overlap_end = min(deposit.end_date, period_end)
-    
-    # Calculate days in overlap period
-    overlap_days = (overlap_end - overlap_start).days
-    
-    # If no overlap, return 0
-    if overlap_days <= 0:
-        return Decimal('0.00')
-    
-    # Calculate total days in deposit period
-    total_deposit_days = (deposit.end_date - deposit.start_date).days
-    
-    # Calculate prorated interest
-    if total_deposit_days > 0:
+    return calculate_interest_in_periods([deposit], period_start, period_end)[deposit.pk]
+
+
+@timed()
+def calculate_interest_in_periods(deposits, period_start, period_end):
+    """``calculate_interest_in_period`` for a list of deposits, keyed by pk.
+
+    The accrual schedules of all the deposits are read with one query.
+    """
+    overlapping = []
+    for deposit in deposits:
+        # Deposits that don't overlap the period earn nothing in it
+        overlap_days = (min(deposit.end_date, period_end) - max(deposit.start_date, period_start)).days
+        if deposit.end_date < period_start or deposit.start_date > period_end or overlap_days <= 0:
+            overlap_days = None
+        overlapping.append((deposit, overlap_days))
+    saved = [deposit.pk for deposit, days in overlapping if days and deposit.pk is not None]
+    accrued = accrued_in_periods(saved, period_start, period_end) if saved else {}
+
+    interest = {}
+    for deposit, overlap_days in overlapping:
+        total_deposit_days = (deposit.end_date - deposit.start_date).days
+        if overlap_days is None or total_deposit_days <= 0:
+            interest[deposit.pk] = Decimal('0.00')
+            continue
+        # Sum the accrual schedule rows for the overlap. The sum is within
+        # ACCRUAL_ERROR of exact proration, so unless it is that close to a
+        # half-cent it rounds to the same cent; prorate the rare ones that are
+        schedule = accrued.get(deposit.pk)
+        if schedule is not None and abs(abs(schedule * 100) % 1 - Decimal('0.5')) > ACCRUAL_ERROR * 100:
+            interest[deposit.pk] = schedule.quantize(Decimal('0.01'))
+            continue
+
+        # No schedule yet: prorate the gross interest
         total_interest = deposit.gross_interest_native()
         prorated_interest = (Decimal(overlap_days) / Decimal(total_deposit_days)) * total_interest
-        return prorated_interest.quantize(Decimal('0.01'))
-    
-    return Decimal('0.00')
+        interest[deposit.pk] = prorated_interest.quantize(Decimal('0.01'))
+    return interest
 
 
-def calculate_tax_obligations(deposits, year, profile_au, profile_uk):
-    """Calculate tax obligations for a specific year for both countries."""
-    # Get user's pensions
-    pensions = Pension.objects.filter(user=profile_au.user)
-    
-    # Calculate UK tax obligations
-    uk_start, uk_end = get_tax_year_period(year, 'GB')
-    uk_total_interest = Decimal('0.00')
-    
-    # Calculate interest for UK tax year from deposits
-    for deposit in deposits:
-        if deposit.currency == Deposit.GBP:
-            uk_total_interest += calculate_interest_in_period(deposit, uk_start, uk_end)
-    
-    # Calculate pension amounts for UK tax year
-    uk_total_pension = Decimal('0.00')
-    uk_total_tax_paid = Decimal('0.00')
-    for pension in pensions:
-        if pension.currency == 'GBP':
-            # For pensions, we add the annual amount (12 months of monthly payments)
-            uk_total_pension += pension.annual_amount()
-            # Add up the annual tax paid
-            uk_total_tax_paid += pension.annual_tax_paid()
-    
-    # Total UK income is interest + pension
-    uk_total_income = uk_total_interest + uk_total_pension
-    
-    # Apply UK tax threshold
-    uk_taxable_income = max(Decimal('0.00'), uk_total_income - profile_uk.tax_threshold)
-    uk_tax_owed = (uk_taxable_income * profile_uk.marginal_rate / 100).quantize(Decimal('0.01'))
-    # Subtract already paid tax
-    uk_tax_owed = max(Decimal('0.00'), uk_tax_owed - uk_total_tax_paid)
-    
-    # Calculate Australian tax obligations
-    au_start, au_end = get_tax_year_period(year, 'AU')
-    au_total_interest = Decimal('0.00')
-    
-    # Calculate interest for Australian tax year
-    for deposit in deposits:
-        if deposit.currency == Deposit.AUD:
-            au_total_interest += calculate_interest_in_period(deposit, au_start, au_end)
-    
-    # Calculate pension amounts for Australian tax year
-    au_total_pension = Decimal('0.00')
-    au_total_tax_paid = Decimal('0.00')
-    for pension in pensions:
-        if pension.currency == 'AUD':
-            # For pensions, we add the annual amount (12 months of monthly payments)
-            au_total_pension += pension.annual_amount()
-            # Add up the annual tax paid
-            au_total_tax_paid += pension.annual_tax_paid()
+@timed()
+def summarize_deposits(deposits, profile_au, profile_uk, rates=None, on=None):
+    """Dashboard totals for a deposit queryset, computed in one aggregate query.
+
+    Interest totals are sums of the cached per-deposit values; estimated tax
+    is the marginal rate applied to those totals. With ``rates`` each row's
+    native interest is converted inside the aggregate at the central rate as
+    of ``on``, rounded exactly as the deposit cards round it, so no deposit
+    row has to be fetched or rewritten when rates change.
+
+    Rows without cached interest (saved before the cache existed, or cleared
+    by an admin bulk action until the ``rebuild_interest_cache`` job runs)
+    are computed in memory; this never writes to the database.
+    """
+    zero = Decimal('0.00')
+    aggregates = {
+        'total_deposits': Count('pk'),
+        'total_principal_aud': Sum('principal', filter=Q(currency=Deposit.AUD), default=zero),
+        'total_principal_gbp': Sum('principal', filter=Q(currency=Deposit.GBP), default=zero),
+        'total_interest_native': Sum('interest_native', default=zero),
+        'total_interest_aud': Sum('interest_aud', default=zero),
+        'total_interest_gbp': Sum('interest_gbp', default=zero),
+    }
+    conversions = _table_conversions(rates, on) if rates else {}
+    for (currency, target), (factor, in_range) in conversions.items():
+        key = f'{currency}_{target}'.lower()
+        aggregates[f'native_{key}'] = Sum('interest_native', filter=Q(currency=target), default=zero)
+        rows = Q(currency=currency, interest_native__isnull=False)
+        aggregates[f'converted_{key}'] = Sum(_converted_cents(factor), filter=rows & in_range, default=0)
+        aggregates[f'outside_{key}'] = Count('pk', filter=rows & ~in_range)
+    totals = deposits.aggregate(**aggregates)
+    # SQLite sums decimals as floats; bring the totals back to cents
+    for key, value in totals.items():
+        if key.startswith('total_') and key != 'total_deposits':
+            totals[key] = Decimal(value).quantize(Decimal('0.01'))
+
+    for (currency, target), (factor, in_range) in conversions.items():
+        key = f'{currency}_{target}'.lower()
+        cents = totals.pop(f'converted_{key}')
+        if totals.pop(f'outside_{key}'):
+            # Too large to convert in 64-bit SQL arithmetic
+            outside = deposits.filter(~in_range, currency=currency, interest_native__isnull=False)
+            native = _fixed_point(outside.values_list('interest_native', flat=True), 100)
+            cents += int(rates.convert_cents(native, [currency] * len(native), target, on)[0].sum())
+        native = Decimal(totals.pop(f'native_{key}')).quantize(Decimal('0.01'))
+        totals[f'total_interest_{target.lower()}'] = native + _to_decimal(cents)
+
+    uncached = InterestBatch(deposits.filter(interest_native__isnull=True), use_cached=False, rates=rates, on=on)
+    if len(uncached):
+        totals['total_interest_native'] += uncached.total_interest_native()
+        totals['total_interest_aud'] += uncached.total_interest_in(Deposit.AUD)
+        totals['total_interest_gbp'] += uncached.total_interest_in(Deposit.GBP)
+    rate_au = (profile_au.marginal_rate or Decimal('0')) / Decimal('100')
+    rate_uk = (profile_uk.marginal_rate or Decimal('0')) / Decimal('100')
+    totals['total_tax_au'] = (totals['total_interest_aud'] * rate_au).quantize(Decimal('0.01'))
+    totals['total_tax_uk'] = (totals['total_interest_gbp'] * rate_uk).quantize(Decimal('0.01'))
+    return totals
+
+
+MAX_SQL_INTEGER = 2 ** 63 - 1
+
+
+def _table_conversions(rates, on):
+    """``{(currency, target): (factor, in_range)}`` for the currency pairs
+    the rate table covers as of ``on``. ``in_range`` matches the rows whose
+    cents times ``factor`` fit in a 64-bit SQL integer."""
+    conversions = {}
+    for currency, target in ((Deposit.AUD, Deposit.GBP), (Deposit.GBP, Deposit.AUD)):
+        factors, found = rates.factors(currency, target, on)
+        if found[0]:
+            factor = int(factors[0])
+            limit = Decimal(MAX_SQL_INTEGER // max(factor, 1)).scaleb(-2)
+            in_range = Q(interest_native__gte=0, interest_native__lte=limit)
+            conversions[currency, target] = (factor, in_range)
+    return conversions
+
+
+def _converted_cents(factor):
+    """SQL for a row's ``interest_native`` in cents times ``factor`` (scaled by
+    ``FX_SCALE``), rounded half-even like ``FxRates.convert_cents``."""
+    cents = Cast(Round(F('interest_native') * 100), BigIntegerField())
+    product = ExpressionWrapper(cents * Value(factor), output_field=BigIntegerField())
+    quotient = ExpressionWrapper(product / Value(FX_SCALE), output_field=BigIntegerField())
+    twice_remainder = ExpressionWrapper(product % Value(FX_SCALE) * 2, output_field=BigIntegerField())
+    return quotient + Case(
+        When(GreaterThan(twice_remainder, FX_SCALE), then=Value(1)),
+        When(Exact(twice_remainder, FX_SCALE), then=quotient % Value(2)),
+        default=Value(0),
+        output_field=BigIntegerField(),
+    )
+
+
+def _country_obligations(period, total_interest, pension_totals, profile):
+    """Tax figures for one country and tax year; ``pension_totals`` is the
+    pension income and tax paid within it."""
+    start, end = period
+    total_pension, total_tax_paid = pension_totals
     
-    # Total Australian income is interest + pension
-    au_total_income = au_total_interest + au_total_pension
+    # Total income is interest + pension
+    total_income = total_interest + total_pension
     
-    # Apply Australian tax threshold
-    au_taxable_income = max(Decimal('0.00'), au_total_income - profile_au.tax_threshold)
-    au_tax_owed = (au_taxable_income * profile_au.marginal_rate / 100).quantize(Decimal('0.01'))
+    # Apply the country's tax threshold
+    taxable_income = max(Decimal('0.00'), total_income - profile.tax_threshold)
+    tax_owed = (taxable_income * profile.marginal_rate / 100).quantize(Decimal('0.01'))
     # Subtract already paid tax
-    au_tax_owed = max(Decimal('0.00'), au_tax_owed - au_total_tax_paid)
+    tax_owed = max(Decimal('0.00'), tax_owed - total_tax_paid)
     
     return {
-        'uk': {
-            'tax_year_start': uk_start.strftime('%d/%m/%Y'),
-            'tax_year_end': uk_end.strftime('%d/%m/%Y'),
-            'total_interest': uk_total_interest,
-            'total_pension': uk_total_pension,
-            'total_tax_paid': uk_total_tax_paid,
-            'total_income': uk_total_income,
-            'threshold': profile_uk.tax_threshold,
-            'taxable_income': uk_taxable_income,
-            'tax_owed': uk_tax_owed,
-        },
-        'au': {
-            'tax_year_start': au_start.strftime('%d/%m/%Y'),
-            'tax_year_end': au_end.strftime('%d/%m/%Y'),
-            'total_interest': au_total_interest,
-            'total_pension': au_total_pension,
-            'total_tax_paid': au_total_tax_paid,
-            'total_income': au_total_income,
-            'threshold': profile_au.tax_threshold,
-            'taxable_income': au_taxable_income,
-            'tax_owed': au_tax_owed,
+        'tax_year_start': start.strftime('%d/%m/%Y'),
+        'tax_year_end': end.strftime('%d/%m/%Y'),
+        'total_interest': total_interest,
+        'total_pension': total_pension,
+        'total_tax_paid': total_tax_paid,
+        'total_income': total_income,
+        'threshold': profile.tax_threshold,
+        'taxable_income': taxable_income,
+        'tax_owed': tax_owed,
+    }
+
+
+def deposits_in_tax_years(deposits, years):
+    """Narrow a deposit queryset to those overlapping the given tax years of
+    the country that taxes their currency."""
+    uk_start, uk_end = get_tax_year_period(min(years), 'GB')[0], get_tax_year_period(max(years), 'GB')[1]
+    au_start, au_end = get_tax_year_period(min(years), 'AU')[0], get_tax_year_period(max(years), 'AU')[1]
+    return (
+        deposits.overlapping(uk_start, uk_end, Deposit.GBP)
+        | deposits.overlapping(au_start, au_end, Deposit.AUD)
+    )
+
+
+def pensions_in_tax_years(pensions, years):
+    """Narrow a pension queryset to those paying in any of the given tax
+    years of either country."""
+    periods = [get_tax_year_period(year, country) for year in (min(years), max(years)) for country in ('AU', 'GB')]
+    first, last = min(start for start, _ in periods), max(end for _, end in periods)
+    return pensions.filter(
+        Q(start_date__isnull=True) | Q(start_date__lte=last),
+        Q(end_date__isnull=True) | Q(end_date__gte=first),
+    )
+
+
+@timed()
+def calculate_tax_obligations_for_years(deposits, years, profile_au, profile_uk, pensions=None):
+    """Calculate tax obligations for several years in one pass.
+
+    Each deposit is placed between the tax-year boundaries once per country
+    rather than being tested against every period. Returns a dict mapping
+    each year to the structure returned by ``calculate_tax_obligations``.
+    Pension income counts the payments made inside each tax year.
+    ``pensions`` may be a list, a queryset or a ``PensionCashflows``; with a
+    list of deposits and a list of pensions given, no queries are made.
+    """
+    years = sorted(set(years))
+    if not years:
+        return {}
+    uk_periods = [get_tax_year_period(year, 'GB') for year in years]
+    au_periods = [get_tax_year_period(year, 'AU') for year in years]
+
+    # Only deposits overlapping the requested tax years leave the database
+    if isinstance(deposits, DepositQuerySet):
+        deposits = deposits_in_tax_years(deposits, years)
+    batch = deposits if isinstance(deposits, InterestBatch) else InterestBatch(deposits)
+
+    # Pension payments in every UK and Australian tax year
+    if pensions is None:
+        pensions = pensions_in_tax_years(Pension.objects.filter(user_id=profile_au.user_id), years)
+    cashflows = pensions if isinstance(pensions, PensionCashflows) else PensionCashflows(pensions)
+    uk_pensions = cashflows.totals_by_period(uk_periods, Deposit.GBP)
+    au_pensions = cashflows.totals_by_period(au_periods, Deposit.AUD)
+
+    # Interest earned in every UK and Australian tax year
+    uk_interest = batch.interest_by_period(uk_periods, Deposit.GBP)
+    au_interest = batch.interest_by_period(au_periods, Deposit.AUD)
+
+    return {
+        year: {
+            'uk': _country_obligations(uk_periods[i], uk_interest[i], uk_pensions[i], profile_uk),
+            'au': _country_obligations(au_periods[i], au_interest[i], au_pensions[i], profile_au),
         }
-    }
\ No newline at end of file
+        for i, year in enumerate(years)
+    }
+
+
+def calculate_tax_obligations(deposits, year, profile_au, profile_uk, pensions=None):
+    """Calculate tax obligations for a specific year for both countries.
+
+    ``deposits`` may be an iterable of deposits or an ``InterestBatch``
+    already computed for them, and ``pensions`` likewise a list or a
+    ``PensionCashflows``.
+    """
+    return calculate_tax_obligations_for_years(deposits, [year], profile_au, profile_uk, pensions)[year]
@@ -1,11 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db import transaction
+from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
-from .forms import DepositForm, PensionForm, RegisterForm
-from .models import Deposit, Pension, TaxProfile
+from .db import atomic_write
+from .forms import (
+    DepositFilterForm, DepositForm, ImportForm, LadderForm, MaturityFilterForm, PensionForm, ProjectionForm,
+    RegisterForm, TaxYearRangeForm,
+)
+from .interest import LazyBatch
+from .models import Deposit, Pension
+from .pagination import keyset_paginate
+from .profiles import get_tax_profiles
+from .utils import TAX_YEARS, summarize_deposits
+
+
+DASHBOARD_PAGE_SIZE = 12
+DASHBOARD_CARD_CACHE_SECONDS = 24 * 60 * 60
+LIST_PAGE_SIZE = 24
+JOB_PAGE_SIZE = 50
 
 
 def register_view(request):
@@ -22,11 +38,37 @@ def register_view(request):
     return render(request, 'registration/register.html', {'form': form})
 
 
+def _selected_year(request, default):
+    """The ``year`` query parameter, or ``default`` when it is missing or
+    not one of ``TAX_YEARS``."""
+    try:
+        year = int(request.GET.get('year', default))
+    except ValueError:
+        return default
+    return year if year in TAX_YEARS else default
+
+
+def _next_page_query(request, page):
+    """Query string for the page after ``page``, keeping the current filters."""
+    if not page.has_next:
+        return None
+    query = request.GET.copy()
+    query['after'] = page.next_cursor
+    return query.urlencode()
+
+
 @login_required
 def deposit_list(request):
-    """Display a list of deposits for the current user."""
-    deposits = Deposit.objects.filter(user=request.user)
-    return render(request, 'deposits/deposit_list.html', {'deposits': deposits})
+    """Display a page of deposits for the current user, soonest maturity first."""
+    filter_form = DepositFilterForm(request.GET)
+    deposits = filter_form.filter(Deposit.objects.filter(user=request.user))
+    page = keyset_paginate(deposits, request.GET.get('after'), LIST_PAGE_SIZE)
+    return render(request, 'deposits/deposit_list.html', {
+        'deposits': page,
+        'page': page,
+        'filter_form': filter_form,
+        'next_query': _next_page_query(request, page),
+    })
 
 
 @login_required
@@ -35,10 +77,9 @@ def deposit_create(request):
     if request.method == 'POST':
         form = DepositForm(request.POST)
         if form.is_valid():
-            with transaction.atomic():
-                deposit = form.save(commit=False)
-                deposit.user = request.user
-                deposit.save()
+            deposit = form.save(commit=False)
+            deposit.user = request.user
+            atomic_write(deposit.save)
             messages.success(request, 'Deposit created successfully!')
             return redirect('deposit_list')
     else:
@@ -53,7 +94,7 @@ def deposit_edit(request, pk):
     if request.method == 'POST':
         form = DepositForm(request.POST, instance=deposit)
         if form.is_valid():
-            form.save()
+            atomic_write(form.save)
             messages.success(request, 'Deposit updated successfully!')
             return redirect('deposit_list')
     else:
@@ -66,16 +107,23 @@ def deposit_edit(request, pk):
 def deposit_delete(request, pk):
     """Delete a deposit."""
     deposit = get_object_or_404(Deposit, pk=pk, user=request.user)
-    deposit.delete()
+    atomic_write(deposit.delete)
     messages.success(request, 'Deposit deleted successfully!')
     return redirect('deposit_list')
 
 
 @login_required
 def pension_list(request):
-    """Display a list of pensions for the current user."""
-    pensions = Pension.objects.filter(user=request.user)
-    return render(request, 'pensions/pension_list.html', {'pensions': pensions})
+    """Display a page of pensions for the current user, soonest end date first."""
+    filter_form = MaturityFilterForm(request.GET)
+    pensions = filter_form.filter(Pension.objects.filter(user=request.user))
+    page = keyset_paginate(pensions, request.GET.get('after'), LIST_PAGE_SIZE)
+    return render(request, 'pensions/pension_list.html', {
+        'pensions': page,
+        'page': page,
+        'filter_form': filter_form,
+        'next_query': _next_page_query(request, page),
+    })
 
 
 @login_required
@@ -84,10 +132,9 @@ def pension_create(request):
     if request.method == 'POST':
         form = PensionForm(request.POST)
         if form.is_valid():
-            with transaction.atomic():
-                pension = form.save(commit=False)
-                pension.user = request.user
-                pension.save()
+            pension = form.save(commit=False)
+            pension.user = request.user
+            atomic_write(pension.save)
             messages.success(request, 'Pension created successfully!')
             return redirect('pension_list')
     else:
@@ -102,7 +149,7 @@ def pension_edit(request, pk):
     if request.method == 'POST':
         form = PensionForm(request.POST, instance=pension)
         if form.is_valid():
-            form.save()
+            atomic_write(form.save)
             messages.success(request, 'Pension updated successfully!')
             return redirect('pension_list')
     else:
@@ -115,11 +162,81 @@ def pension_edit(request, pk):
 def pension_delete(request, pk):
     """Delete a pension."""
     pension = get_object_or_404(Pension, pk=pk, user=request.user)
-    pension.delete()
+    atomic_write(pension.delete)
     messages.success(request, 'Pension deleted successfully!')
     return redirect('pension_list')
 
 
+@login_required
+def import_portfolio(request):
+    """Bulk import deposits or pensions from an uploaded CSV file."""
+    import csv
+    import io
+    from .importers import import_csv
+
+    result = None
+    if request.method == 'POST':
+        form = ImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            try:
+                # Accrual schedules are built by the background worker
+                result = import_csv(
+                    stream, request.user, form.cleaned_data['kind'], form.cleaned_data['dry_run'], defer_accruals=True,
+                )
+            except UnicodeDecodeError:
+                form.add_error('file', 'The file is not UTF-8 text. Batches before the error may have been imported.')
+            except csv.Error as error:
+                form.add_error('file', f'The file is not valid CSV ({error}). '
+                                       'Batches before the error may have been imported.')
+            else:
+                if result.dry_run:
+                    messages.info(request, f'Dry run: {result.valid} of {result.rows} rows are valid.')
+                else:
+                    messages.success(request, f'Imported {result.created} of {result.rows} rows.')
+    else:
+        form = ImportForm()
+    return render(request, 'deposits/import.html', {'form': form, 'result': result})
+
+
+@login_required
+def export_data(request, dataset, fmt):
+    """Stream deposits, pensions or tax obligations as CSV or NDJSON."""
+    from django.utils import timezone
+    from . import exports, fx
+
+    if fmt not in ('csv', 'ndjson'):
+        raise Http404('Unknown export format')
+
+    profile_au, profile_uk = get_tax_profiles(request.user)
+    deposits = Deposit.objects.filter(user=request.user)
+
+    if dataset == 'deposits':
+        fields, rows = exports.DEPOSIT_FIELDS, exports.deposit_rows(deposits, profile_au, profile_uk, fx.get_rates())
+    elif dataset == 'pensions':
+        pensions = Pension.objects.filter(user=request.user)
+        fields, rows = exports.PENSION_FIELDS, exports.pension_rows(pensions, profile_au, profile_uk)
+    elif dataset == 'tax':
+        current_year = timezone.now().year
+        form = TaxYearRangeForm({
+            'from_year': request.GET.get('from', current_year - 2),
+            'to_year': request.GET.get('to', current_year + 2),
+        })
+        if not form.is_valid():
+            return JsonResponse({'detail': form.errors.get_json_data()}, status=400)
+        fields, rows = exports.TAX_FIELDS, exports.tax_rows(deposits, form.years(), profile_au, profile_uk)
+    else:
+        raise Http404('Unknown export')
+
+    if fmt == 'csv':
+        response = StreamingHttpResponse(exports.stream_csv(fields, rows), content_type='text/csv')
+    else:
+        response = StreamingHttpResponse(exports.stream_ndjson(rows), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
+
+
 def home(request):
     """Display the home page."""
     return render(request, 'home.html')
@@ -128,52 +245,33 @@ def home(request):
 @login_required
 def dashboard(request):
     """Display the user dashboard with deposits and tax profiles."""
+    from datetime import date
+    from . import fx
     deposits = Deposit.objects.filter(user=request.user)
     
-    # Get or create tax profiles for the user
-    profile_au, _ = TaxProfile.objects.get_or_create(
-        user=request.user,
-        country=TaxProfile.AU,
-        defaults={'marginal_rate': 30}
-    )
-    profile_uk, _ = TaxProfile.objects.get_or_create(
-        user=request.user,
-        country=TaxProfile.GB,
-        defaults={'marginal_rate': 20}
-    )
+    profile_au, profile_uk = get_tax_profiles(request.user)
     
-    # Calculate summary statistics
-    total_deposits = deposits.count()
+    # Summary totals come from a single aggregate query
+    rates = fx.get_rates()
+    summary = summarize_deposits(deposits, profile_au, profile_uk, rates)
     
-    # Calculate total principal by currency
-    total_principal_aud = sum(
-        deposit.principal_in('AUD') for deposit in deposits if deposit.currency == 'AUD'
-    )
-    total_principal_gbp = sum(
-        deposit.principal_in('GBP') for deposit in deposits if deposit.currency == 'GBP'
-    )
-    
-    # Calculate total interest by currency
-    total_interest_native = sum(deposit.gross_interest_native() for deposit in deposits)
-    total_interest_aud = sum(deposit.interest_in('AUD') for deposit in deposits)
-    total_interest_gbp = sum(deposit.interest_in('GBP') for deposit in deposits)
-    
-    # Calculate total estimated tax
-    total_tax_au = sum(deposit.estimated_tax(profile_au) for deposit in deposits)
-    total_tax_uk = sum(deposit.estimated_tax(profile_uk) for deposit in deposits)
+    # Deposit cards are fetched separately, one page at a time
+    paginator = Paginator(deposits.order_by('end_date', 'pk'), DASHBOARD_PAGE_SIZE)
+    paginator.count = summary['total_deposits']
+    page_obj = paginator.get_page(request.GET.get('page'))
     
+    # Each card is a cached fragment; conversions depend on the rate table
+    # version and the valuation date, so both are part of the cache key.
+    # The page's interest is only computed when a fragment misses.
     return render(request, 'dashboard.html', {
-        'deposits': deposits,
+        'deposits': page_obj.object_list,
+        'page_obj': page_obj,
+        'interest': LazyBatch(page_obj.object_list, (profile_au, profile_uk), rates=rates),
         'profile_au': profile_au,
         'profile_uk': profile_uk,
-        'total_deposits': total_deposits,
-        'total_principal_aud': total_principal_aud,
-        'total_principal_gbp': total_principal_gbp,
-        'total_interest_native': total_interest_native,
-        'total_interest_aud': total_interest_aud,
-        'total_interest_gbp': total_interest_gbp,
-        'total_tax_au': total_tax_au,
-        'total_tax_uk': total_tax_uk,
+        'card_cache_seconds': DASHBOARD_CARD_CACHE_SECONDS,
+        'rates_key': f"{rates.version}@{date.today().isoformat()}",
+        **summary,
     })
 
 
@@ -181,35 +279,30 @@ def dashboard(request):
 def tax_obligations(request):
     """Display tax obligations for the user's deposits."""
     from django.utils import timezone
-    from .utils import calculate_tax_obligations
+    from .utils import calculate_tax_obligations_for_years
     
     # Get user's deposits and pensions
     deposits = Deposit.objects.filter(user=request.user)
     pensions = Pension.objects.filter(user=request.user)
     
-    # Get or create tax profiles
-    profile_au, _ = TaxProfile.objects.get_or_create(
-        user=request.user,
-        country=TaxProfile.AU,
-        defaults={'marginal_rate': 30, 'tax_threshold': 18500}
-    )
-    profile_uk, _ = TaxProfile.objects.get_or_create(
-        user=request.user,
-        country=TaxProfile.GB,
-        defaults={'marginal_rate': 20, 'tax_threshold': 12900}
-    )
+    profile_au, profile_uk = get_tax_profiles(request.user)
     
     # Handle year selection
     current_year = timezone.now().year
     available_years = list(range(current_year - 2, current_year + 3))  # prev 2 + current + next 2
     
-    selected_year = int(request.GET.get('year', current_year))
+    selected_year = _selected_year(request, current_year)
     
-    # Calculate tax obligations for each year
-    tax_data = calculate_tax_obligations(deposits, selected_year, profile_au, profile_uk)
+    # Calculate tax obligations for every listed year in one sweep
+    obligations_by_year = calculate_tax_obligations_for_years(
+        deposits, available_years + [selected_year], profile_au, profile_uk
+    )
+    tax_data = obligations_by_year[selected_year]
+    year_comparison = [(year, obligations_by_year[year]) for year in available_years]
     
     return render(request, 'tax_obligations.html', {
         'tax_data': tax_data,
+        'year_comparison': year_comparison,
         'pensions': pensions,
         'available_years': available_years,
         'selected_year': selected_year,
@@ -218,6 +311,118 @@ def tax_obligations(request):
     })
 
 
+@login_required
+def projections(request):
+    """Monte Carlo projection of portfolio value and after-tax income."""
+    from django.utils import timezone
+    from . import fx
+    from .projections import Scenario, project_portfolio
+
+    profile_au, profile_uk = get_tax_profiles(request.user)
+
+    # Run with the defaults until the form has been submitted
+    form = ProjectionForm(request.GET or None)
+    settings = form.cleaned_data if form.is_valid() else None
+    if settings is None and not form.is_bound:
+        settings = {name: field.initial for name, field in form.fields.items()}
+
+    result = None
+    if settings is not None:
+        result = project_portfolio(
+            Deposit.objects.filter(user=request.user, end_date__gt=timezone.localdate()),
+            profile_au,
+            profile_uk,
+            pensions=Pension.objects.filter(user=request.user),
+            years=settings['years'],
+            paths=settings['paths'],
+            seed=settings['seed'],
+            scenario=Scenario(
+                rate_volatility=float(settings['rate_volatility']) / 100,
+                fx_volatility=float(settings['fx_volatility']) / 100,
+            ),
+            fx_rates=fx.get_rates(),
+        )
+    return render(request, 'deposits/projections.html', {'form': form, 'result': result})
+
+
+@login_required
+def ladder(request):
+    """Split an amount across term-deposit offers for the most after-tax
+    interest, keeping a minimum maturing each quarter."""
+    from .ladder import optimize_ladder
+
+    profile_au, profile_uk = get_tax_profiles(request.user)
+
+    # Solve the example until the form has been submitted
+    form = LadderForm(request.GET or None)
+    settings = form.cleaned_data if form.is_valid() else None
+    if settings is None and not form.is_bound:
+        form = LadderForm({name: field.initial for name, field in form.fields.items()})
+        settings = form.cleaned_data if form.is_valid() else None
+
+    result = None
+    if settings is not None:
+        try:
+            result = optimize_ladder(
+                settings['amount'], settings['offers'], profile_au, profile_uk,
+                currency=settings['currency'],
+                min_per_quarter=settings['min_per_quarter'],
+                quarters=settings['quarters'],
+            )
+        except ValueError as error:
+            form.add_error(None, str(error))
+    return render(request, 'deposits/ladder.html', {'form': form, 'result': result})
+
+
+@staff_member_required
+def perf_report(request):
+    """Per-view latency percentiles from the performance middleware (staff only)."""
+    from .perf import cache_stats, flush_records, read_records, summarize
+
+    since = request.GET.get('since')
+    if since:
+        try:
+            since = float(since)
+        except ValueError:
+            return JsonResponse({'detail': "'since' must be a Unix timestamp."}, status=400)
+    flush_records()  # include this process's queued requests
+    records = read_records(since or None)
+    return JsonResponse({'views': summarize(records), 'cache': cache_stats()})
+
+
+@staff_member_required
+def job_status(request):
+    """Background job queue: counts per status and the latest jobs (staff only)."""
+    from .jobs import queue_stats
+    from .models import Job
+
+    status = request.GET.get('status')
+    recent = Job.objects.order_by('-id')
+    if status in dict(Job.STATUS_CHOICES):
+        recent = recent.filter(status=status)
+    return render(request, 'deposits/jobs.html', {
+        'stats': queue_stats(),
+        'jobs': recent[:JOB_PAGE_SIZE],
+        'statuses': Job.STATUS_CHOICES,
+        'selected_status': status,
+    })
+
+
+@staff_member_required
+@require_POST
+def job_retry(request, pk):
+    """Queue a failed job again with a fresh set of attempts (staff only)."""
+    from django.utils import timezone
+    from .models import Job
+
+    updated = Job.objects.filter(pk=pk, status=Job.FAILED).update(
+        status=Job.QUEUED, attempts=0, run_after=timezone.now(), error='',
+    )
+    if updated:
+        messages.success(request, f'Job #{pk} queued again.')
+    return redirect('job_status')
+
+
 def logout_view(request):
     """Handle user logout."""
     logout(request)
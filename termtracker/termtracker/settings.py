@@ -18,6 +18,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+'deposits.perf.PerformanceMiddleware',
 'django.middleware.security.SecurityMiddleware',
 'django.contrib.sessions.middleware.SessionMiddleware',
 'django.middleware.common.CommonMiddleware',
@@ -33,7 +34,7 @@ ROOT_URLCONF = 'termtracker.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'deposits.perf.TimedDjangoTemplates',  # DjangoTemplates + render timing
         'DIRS': [BASE_DIR / "templates"],  # looks in project-level /templates
         'APP_DIRS': True,                  # also looks in app/templates/appname/
         'OPTIONS': {
@@ -51,13 +52,38 @@ TEMPLATES = [
 WSGI_APPLICATION = 'termtracker.wsgi.application'
 
 
+# SQLite tuned for concurrent use: WAL lets readers run alongside the one
+# writer, IMMEDIATE transactions take the write lock up front (waiting up
+# to `timeout` seconds) so they never fail half way, and connections are
+# kept open between requests. Writes go through deposits.db.atomic_write,
+# which retries a transaction that still finds the database locked.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # durable in WAL mode except on power loss
+    'cache_size': -64000,  # 64 MB page cache per connection
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 20000,  # ms
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
 DATABASES = {
 'default': {
 'ENGINE': 'django.db.backends.sqlite3',
 'NAME': BASE_DIR / 'db.sqlite3',
+'CONN_MAX_AGE': 600,
+'CONN_HEALTH_CHECKS': True,
+'OPTIONS': {
+    'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,
+},
 }
 }
 
+DB_BUSY_RETRIES = 5  # extra attempts for a write that finds the database locked
+DB_BUSY_RETRY_DELAY = 0.05  # seconds before the first retry, doubling each time
+
 
 AUTH_PASSWORD_VALIDATORS = [
 {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -80,7 +106,62 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+CACHES = {
+    'default': {
+        'BACKEND': 'deposits.perf.InstrumentedLocMemCache',  # LocMemCache + hit/miss counts
+        'LOCATION': 'termtracker',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Seen by every process, so invalidations reach all of them at once. Point
+    # it at Redis or Memcached when the site runs on more than one host.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'cache',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Cache alias and lifetime of the per-user tax profiles (deposits.profiles).
+# Saves and deletes invalidate them, so the alias must be shared by every
+# process serving the site; a process-local cache would serve stale profiles.
+TAX_PROFILE_CACHE = 'shared'
+TAX_PROFILE_CACHE_SECONDS = 300
+
+# Route the dashboard, tax and list pages to deposits.async_views. Turn on
+# when serving through an ASGI server (see README); under WSGI each async
+# view would need its own event loop.
+ASYNC_VIEWS = False
+ASYNC_DB_WORKERS = 8  # threads (and database connections) for queries in async views
+ASYNC_COMPUTE_WORKERS = 4  # threads for interest maths in async views
+
+# Background jobs (deposits.jobs, `manage.py run_worker`)
+JOB_WORKER_PROCESSES = 2  # jobs run at the same time per worker
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY = 30  # seconds before the first retry, doubling each time
+JOB_STALE_SECONDS = 60 * 60  # running this long without finishing: worker died
+
+# Admin changelists (deposits.pagination.CachedCountPaginator): exact
+# totals are cached this long; on PostgreSQL an unfiltered table larger than
+# ADMIN_ESTIMATED_COUNT_MIN rows shows the planner's estimate instead.
+ADMIN_COUNT_CACHE_SECONDS = 60
+ADMIN_ESTIMATED_COUNT_MIN = 100_000
+
+# Granularity of the DepositAccrual schedule: 'month' or 'day'.
+# Run `manage.py rebuild_accruals` after changing it.
+DEPOSIT_ACCRUAL_GRANULARITY = 'month'
+
 # Auth pages
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home' # after logout, send to home
-LOGIN_URL = 'register' # unauthenticated users are sent to register (has a Login link)
\ No newline at end of file
+LOGIN_URL = 'register' # unauthenticated users are sent to register (has a Login link)
+
+
+# Performance instrumentation (deposits.perf.PerformanceMiddleware)
+PERF_METRICS_ENABLED = True
+PERF_METRICS_FILE = BASE_DIR / 'var' / 'perf' / 'metrics.jsonl'
+PERF_METRICS_MAX_BYTES = 20 * 1024 * 1024
+PERF_PROFILE_DIR = BASE_DIR / 'var' / 'profiles'  # cProfile dumps of slow sampled requests
+PERF_PROFILE_SAMPLE_RATE = 0.0  # fraction of requests to profile, e.g. 0.01
+PERF_SLOW_REQUEST_MS = 500